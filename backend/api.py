@@ -14,18 +14,22 @@
 import json
 import traceback
 from io import BytesIO
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Request, Response, g, request, send_file, jsonify, stream_with_context
 from flask_cors import CORS  # Import CORS
 
 # --- Import all your backend "brain" functions ---
 try:
-    from image_converter import convert_to_image
-    from engine import (
-        run_ocr_on_image, 
-        find_sensitive_entities, 
-        redact_image_with_labels, 
-        export_image_to_pdf
-    )
+    from pipeline import redact_file, detect_file, render_reviewed_pages
+    from encoder import encode_png
+    from sessions import SESSIONS, ReviewError
+    from engine import warmup_models
+    from models import MODELS, MODEL_LOADING
+    from workers import WorkerPool, SERVING_MODE
+    from jobs import JobManager, QueueFullError
+    from batch import BatchInputError, list_zip_members, iter_zip_files, stream_batch_zip
+    from telemetry import CACHE_LOOKUPS, METRICS, current_request_id, get_logger, request_context
+    from uploads import (MemoryBudgetError, discard_upload, receive_stream, spool_stream, wipe_file,
+                         wipe_orphaned_spool_files)
 except ImportError as e:
     print("="*50)
     print(f"ERROR: Could not import modules: {e}")
@@ -38,107 +42,515 @@ except Exception as e:
     exit()
 
 # --- 1. Setup the Flask App ---
+class SpoolingRequest(Request):
+    """
+    Writes large uploads straight into REDACT_SPOOL_DIR while the
+    body is parsed, instead of into Werkzeug's own temp files (which
+    ignore the spool folder and are never wiped). spool_stream()
+    takes those files over; the rest are wiped when the request ends.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        stream = receive_stream(total_content_length)
+        if not isinstance(stream, BytesIO):
+            self.__dict__.setdefault("_spool_paths", []).append(stream.name)
+        return stream
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            for path in self.__dict__.pop("_spool_paths", []):
+                wipe_file(path)
+
+
 app = Flask(__name__)
+app.request_class = SpoolingRequest
 # Enable CORS to allow your React app (on http://localhost:5173)
 # to talk to this server (on http://127.0.0.1:5000)
 CORS(app) 
 
-print("Backend API server is starting...")
+log = get_logger("api")
+log.info("Backend API server is starting...")
 
-# --- 2. Define the "/redact" Endpoint ---
-@app.route('/redact', methods=['POST'])
-def redact_document():
+# Uploads spooled by a server that crashed still hold PHI
+_orphans = wipe_orphaned_spool_files()
+if _orphans:
+    log.warning(f"Wiped {_orphans} spooled upload(s) left by a previous run.")
+
+# Seconds a client should wait before retrying when the queue is full
+RETRY_AFTER_SECONDS = 5
+
+# "prefork" (REDACT_SERVING): models are loaded once here and the
+# pipeline runs in N forked worker processes (see workers.py).
+# Otherwise the job threads run it in this process. Either way it
+# starts in the background so /healthz and /readyz answer right away.
+if SERVING_MODE == "prefork":
+    WORKER_POOL = WorkerPool()
+    WORKER_POOL.start_background()
+    # One job thread per worker process: they only wait on the workers
+    JOBS = JobManager(workers=WORKER_POOL.workers)
+else:
+    WORKER_POOL = None
+    JOBS = JobManager()
+    if MODEL_LOADING == "background":
+        MODELS.start_background_loading(warmup_fn=warmup_models)
+
+
+# --- Request IDs ---
+# Taken from the X-Request-ID header (or made up), put on every log
+# line of the request, its job and its worker, and sent back.
+
+@app.before_request
+def _start_request_context():
+    g.request_context = request_context(request.headers.get("X-Request-ID") or None)
+    g.request_context.__enter__()
+
+
+@app.after_request
+def _add_request_id_header(response):
+    request_id = current_request_id()
+    if request_id:
+        response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.teardown_request
+def _end_request_context(error=None):
+    context = g.pop("request_context", None)
+    if context is not None:
+        context.__exit__(None, None, None)
+
+
+def run_redaction(file_bytes, filename, categories_to_find, progress=None, block=False,
+                  **options):
     """
-    This is the main API endpoint that the frontend will call.
-    It expects a file and a list of categories.
+    Runs redact_file() here, or on a prefork worker. 'block=False'
+    gives up with QueueFullError when all workers stay busy.
+    """
+    if WORKER_POOL is None:
+        return redact_file(file_bytes, filename, categories_to_find, progress=progress, **options)
+    return WORKER_POOL.redact(file_bytes, filename, categories_to_find, progress=progress,
+                              block=block, **options)
+
+
+def run_detection(file_bytes, filename, categories_to_find, block=False, **options):
+    """
+    Runs detect_file() here, or on a prefork worker (the pages come
+    back to this process, which keeps them for /render).
+    """
+    if WORKER_POOL is None:
+        return detect_file(file_bytes, filename, categories_to_find, **options)
+    return WORKER_POOL.detect(file_bytes, filename, categories_to_find, block=block, **options)
+
+
+def _too_large_response(e):
+    return jsonify({"error": str(e)}), 413
+
+
+def _queue_full_response(e):
+    response = jsonify({"error": str(e)})
+    response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response, 429
+
+
+def _parse_categories():
+    """
+    Reads the 'categories' form field (a JSON string).
+    Returns (categories, None) or (None, error_response).
+    """
+    try:
+        categories_json = request.form.get('categories', '[]')
+        categories_to_find = json.loads(categories_json)
+        log.info(f"Categories: {categories_to_find}")
+        return categories_to_find, None
+    except json.JSONDecodeError:
+        log.warning("Invalid categories JSON.")
+        return None, (jsonify({"error": "Invalid categories format"}), 400)
+    except Exception as e:
+        log.warning(f"Error parsing form data: {e}")
+        return None, (jsonify({"error": "Error parsing request"}), 500)
+
+
+def _parse_output_options():
+    """Reads the optional 'all_pages' and 'output_format' form fields."""
+    return {
+        # Multi-page mode (PDF only): redact every page, not just the first
+        "all_pages": request.form.get('all_pages', 'false').lower() in ('1', 'true', 'yes'),
+        # "pdf" (default, redacted page images) or "document": redacted
+        # DOCX/TXT/PNG back, or for PDFs the original PDF with true redactions
+        "output_format": request.form.get('output_format', 'pdf').lower()
+    }
+
+
+def _parse_redact_request():
+    """
+    Reads the upload and options shared by /redact and /jobs.
+    Returns (options, None) or (None, error_response). A large
+    upload is spooled to disk: the caller must discard_upload()
+    options["file_bytes"] when it is done.
     """
-    print("\n--- Received new /redact request ---")
-    
-    # --- A. Get Data from Frontend ---
-    
     # Check if a file was sent
     if 'file' not in request.files:
-        print("Error: No file part in request.")
-        return jsonify({"error": "No file part"}), 400
+        log.warning("No file part in request.")
+        return None, (jsonify({"error": "No file part"}), 400)
         
     file = request.files['file']
     
     # Check if the filename is empty
     if file.filename == '':
-        print("Error: No file selected.")
-        return jsonify({"error": "No selected file"}), 400
+        log.warning("No file selected.")
+        return None, (jsonify({"error": "No selected file"}), 400)
+    log.info(f"File: {file.filename}")
 
     # Get the list of categories (sent as a JSON string)
+    categories_to_find, error_response = _parse_categories()
+    if error_response:
+        return None, error_response
+
+    options = {
+        "file_bytes": spool_stream(file.stream),
+        "filename": file.filename,
+        "categories_to_find": categories_to_find
+    }
+    options.update(_parse_output_options())
+    return options, None
+
+
+# --- 2. Define the "/redact" Endpoint ---
+@app.route('/redact', methods=['POST'])
+def redact_document():
+    """
+    This is the main API endpoint that the frontend will call.
+    It expects a file and a list of categories.
+    (Blocking: for long documents prefer POST /jobs.)
+    """
+    log.info("Received new /redact request.")
+
+    # --- A. Get Data from Frontend ---
+    options, error_response = _parse_redact_request()
+    if error_response:
+        return error_response
+
+    # --- B. Run Your Full Backend Pipeline ---
     try:
-        categories_json = request.form.get('categories', '[]')
-        categories_to_find = json.loads(categories_json)
-        print(f"File: {file.filename}")
-        print(f"Categories: {categories_to_find}")
-    except json.JSONDecodeError:
-        print("Error: Invalid categories JSON.")
-        return jsonify({"error": "Invalid categories format"}), 400
+        output_bytes, mimetype, download_name = run_redaction(**options)
+    except QueueFullError as e:
+        log.warning("All workers are busy, rejecting request.")
+        return _queue_full_response(e)
+    except MemoryBudgetError as e:
+        log.warning(str(e))
+        return _too_large_response(e)
     except Exception as e:
-        print(f"Error parsing form data: {e}")
-        return jsonify({"error": "Error parsing request"}), 500
+        log.error(f"Pipeline failed: {e}")
+        return jsonify({"error": str(e)}), 500
+    finally:
+        discard_upload(options["file_bytes"])
+
+    # --- C. Send the Redacted File Back ---
+    log.info(f"Sending {download_name} back to frontend.")
+    return send_file(
+        BytesIO(output_bytes),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name
+    )
+
+
+# --- 3. Job API (non-blocking) ---
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Same input as /redact, but returns a job id straight away.
+    The pipeline runs on the worker pool; poll GET /jobs/<id>.
+    """
+    log.info("Received new /jobs request.")
+    options, error_response = _parse_redact_request()
+    if error_response:
+        return error_response
+
+    def run(progress):
+        try:
+            return run_redaction(progress=progress, block=True, **options)
+        finally:
+            discard_upload(options["file_bytes"])
 
-    # --- B. Run Your Full Backend Pipeline ---
-    
     try:
-        # Step 1: Convert uploaded file to a single image
-        # (We use file.read() to get the bytes)
-        # We also create a "mock" file object for your function
-        class MockFile:
-            def __init__(self, name, data):
-                self.name = name
-                self.file_data = data
-            def getvalue(self):
-                return self.file_data
-
-        mock_file = MockFile(file.filename, file.read())
-        image_bytes = convert_to_image(mock_file)
-        if image_bytes is None:
-            raise Exception("File conversion failed (unsupported format or corrupt file).")
-        print(f"[Step 1] Converted {file.filename} to image.")
-
-        # Step 2: Run OCR on the image
-        ocr_results = run_ocr_on_image(image_bytes)
-        if ocr_results is None:
-            raise Exception("OCR process failed.")
-        print(f"[Step 2] OCR found {len(ocr_results)} text blocks.")
-
-        # Step 3: Find sensitive entities (The "Brain")
-        entities_to_redact = find_sensitive_entities(ocr_results, categories_to_find)
-        print(f"[Step 3] Found {len(entities_to_redact)} sensitive items.")
-
-        # Step 4: Redact the image
-        redacted_image_bytes = redact_image_with_labels(image_bytes, entities_to_redact)
-        if redacted_image_bytes is None:
-            raise Exception("Redaction drawing failed.")
-        print("[Step 4] Image redacted successfully.")
-
-        # Step 5: Export the final image as a PDF
-        pdf_bytes = export_image_to_pdf(redacted_image_bytes)
-        if pdf_bytes is None:
-            raise Exception("PDF export failed.")
-        print("[Step 5] Final PDF created.")
-        
+        job = JOBS.submit(run, options["filename"])
+    except QueueFullError as e:
+        discard_upload(options["file_bytes"])
+        log.warning("Job queue is full, rejecting request.")
+        return _queue_full_response(e)
+
+    log.info(f"Queued job {job.id}.")
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result"
+    }), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and per-stage progress of a job."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    Streams the redacted file once the job is done. The job is
+    forgotten once the file has been sent (later calls get 404).
+    """
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    if job.status == "failed":
+        return jsonify({"error": job.error, "status": job.status}), \
+            413 if job.error_type == "MemoryBudgetError" else 500
+    if job.status != "done":
+        return jsonify({"error": "Job not finished yet", "status": job.status}), 409
+
+    output_bytes, mimetype, download_name = job.result
+    response = send_file(
+        BytesIO(output_bytes),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name
+    )
+    # The result holds PHI: forget it once it has been sent
+    response.call_on_close(lambda: JOBS.discard(job_id))
+    return response
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Forgets a finished job and its result without downloading it."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    if job.finished_at is None:
+        return jsonify({"error": "Job not finished yet", "status": job.status}), 409
+    JOBS.discard(job_id)
+    return "", 204
+
+
+# --- 4. Health checks ---
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up. Also reports per-model load state."""
+    return jsonify(_health())
+
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 once the models are loaded and warmed up, else 503."""
+    health = _health()
+    return jsonify(health), (200 if health["ready"] else 503)
+
+
+def _health():
+    health = MODELS.health()
+    if WORKER_POOL is not None:
+        # The workers warm up after the fork; the parent never does
+        health["ready"] = MODELS.required_ready() and WORKER_POOL.ready()
+        health["pool"] = WORKER_POOL.health()
+    return health
+
+
+# --- 5. Metrics ---
+
+def _cache_hit_ratio():
+    lookups = dict(CACHE_LOOKUPS.values)
+    total = sum(lookups.values())
+    if not total:
+        return {}
+    hits = total - lookups.get(("miss",), 0)
+    return {(): round(hits / total, 4)}
+
+
+def _model_states():
+    return {(name, model["state"]): 1 for name, model in MODELS.health()["models"].items()}
+
+
+def _worker_states():
+    if WORKER_POOL is None:
+        return {}
+    states = {}
+    for worker in WORKER_POOL.health()["workers"]:
+        states[(worker["state"],)] = states.get((worker["state"],), 0) + 1
+    return states
+
+
+METRICS.gauge("redact_queue_depth", "Jobs waiting for a job thread.",
+              read=lambda: {(): JOBS.queue_depth()})
+METRICS.gauge("redact_model_state", "1 for the current load state of each model.",
+              ["model", "state"], read=_model_states)
+METRICS.gauge("redact_workers", "Prefork workers by state.", ["state"], read=_worker_states)
+METRICS.gauge("redact_workers_idle", "Prefork workers waiting for a request.",
+              read=lambda: {(): WORKER_POOL.health()["idle"]} if WORKER_POOL is not None else {})
+METRICS.gauge("redact_review_sessions", "Review sessions waiting for /render.",
+              read=lambda: {(): len(SESSIONS)})
+METRICS.gauge("redact_review_session_bytes", "Page memory held by review sessions.",
+              read=lambda: {(): SESSIONS.total_bytes()})
+METRICS.gauge("redact_cache_hit_ratio", "Share of result cache lookups that hit (since start).",
+              read=_cache_hit_ratio)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics of this process and its workers."""
+    return Response(METRICS.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# --- 6. Review (detect, then render) ---
+# POST /detect runs OCR and NER once and keeps the pages in a
+# session (sessions.py). The reviewer then sends accepted, rejected
+# or added boxes to POST /render, which only draws and encodes.
+
+@app.route('/detect', methods=['POST'])
+def detect_document():
+    """
+    Same input as /redact. Returns the detected entities (boxes in
+    page pixels, labels, confidences) and a session_id for /render.
+    """
+    log.info("Received new /detect request.")
+    options, error_response = _parse_redact_request()
+    if error_response:
+        return error_response
+    # The review always renders page images
+    options.pop("output_format")
+
+    try:
+        pages = run_detection(**options)
+        session = SESSIONS.create(options["filename"], options["categories_to_find"], pages)
+    except QueueFullError as e:
+        log.warning("All workers are busy, rejecting request.")
+        return _queue_full_response(e)
+    except MemoryBudgetError as e:
+        log.warning(str(e))
+        return _too_large_response(e)
     except Exception as e:
-        print(f"--- PIPELINE FAILED ---")
-        print(f"Error: {e}")
-        print("-------------------------")
+        log.error(f"Detection failed: {e}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        discard_upload(options["file_bytes"])
 
-    # --- C. Send the Redacted PDF Back ---
-    
-    print("Sending redacted PDF back to frontend.")
+    log.info(f"Review session {session.id}: {len(pages)} page(s).")
+    return jsonify(session.to_dict())
+
+
+@app.route('/detect/<session_id>/pages/<int:page_number>', methods=['GET'])
+def get_review_page(session_id, page_number):
+    """The rendered page as PNG, for drawing the boxes over it."""
+    session = SESSIONS.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired session id"}), 404
+    if not 0 <= page_number < len(session.pages):
+        return jsonify({"error": "Unknown page"}), 404
+    page = session.pages[page_number]["page"]
+    return Response(encode_png(page.array, dpi=page.dpi, compress_level=1), mimetype="image/png")
+
+
+@app.route('/render', methods=['POST'])
+def render_document():
+    """
+    Draws a reviewed session: JSON {"session_id", "accepted"?,
+    "rejected"?, "added"?} (see Session.reviewed_pages()). Returns
+    the redacted PDF. The session stays usable for another pass.
+    """
+    review = request.get_json(silent=True)
+    if not isinstance(review, dict) or "session_id" not in review:
+        return jsonify({"error": "Expected a JSON body with a session_id"}), 400
+    session = SESSIONS.get(review["session_id"])
+    if session is None:
+        return jsonify({"error": "Unknown or expired session id"}), 404
+
+    try:
+        pages = session.reviewed_pages(review.get("accepted"), review.get("rejected") or (),
+                                       review.get("added") or ())
+        output_bytes = render_reviewed_pages(pages)
+    except ReviewError as e:
+        log.warning(f"Bad review: {e}")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        log.error(f"Render failed: {e}")
+        return jsonify({"error": str(e)}), 500
+    session.renders += 1
+
+    log.info(f"Rendered review session {session.id} (pass {session.renders}).")
     return send_file(
-        BytesIO(pdf_bytes),
+        BytesIO(output_bytes),
         mimetype='application/pdf',
         as_attachment=True,
-        download_name='REDACTED_OUTPUT.pdf'
+        download_name="REDACTED_OUTPUT.pdf"
     )
 
-# --- 3. Start the Server ---
+
+@app.route('/detect/<session_id>', methods=['DELETE'])
+def delete_review_session(session_id):
+    """Drops a session (and its pages) before its TTL runs out."""
+    if not SESSIONS.discard(session_id):
+        return jsonify({"error": "Unknown or expired session id"}), 404
+    return "", 204
+
+
+# --- 7. Bulk endpoint ---
+@app.route('/redact/batch', methods=['POST'])
+def redact_batch():
+    """
+    Redacts many files at once. Send either one ZIP as 'archive'
+    or several files as 'files', plus 'categories'. Streams back a
+    ZIP of redacted files (as they finish) with a manifest.json.
+    """
+    log.info("Received new /redact/batch request.")
+
+    categories_to_find, error_response = _parse_categories()
+    if error_response:
+        return error_response
+
+    archive_upload = None
+    try:
+        if 'archive' in request.files and request.files['archive'].filename != '':
+            archive_upload = spool_stream(request.files['archive'].stream)
+            archive, members = list_zip_members(archive_upload)
+            files = iter_zip_files(archive, members)
+            log.info(f"Batch archive with {len(members)} files.")
+        else:
+            uploads = [f for f in request.files.getlist('files') if f.filename != '']
+            if not uploads:
+                return jsonify({"error": "No files in batch"}), 400
+            files = ((f.filename, spool_stream(f.stream)) for f in uploads)
+            log.info(f"Batch upload with {len(uploads)} files.")
+    except BatchInputError as e:
+        discard_upload(archive_upload)
+        log.warning(f"Bad batch input: {e}")
+        return jsonify({"error": str(e)}), 400
+
+    body = stream_batch_zip(files, categories_to_find, JOBS,
+                            redact=lambda *args, **kwargs: run_redaction(*args, block=True, **kwargs),
+                            **_parse_output_options())
+
+    def body_then_wipe():
+        try:
+            yield from body
+        finally:
+            body.close()
+            discard_upload(archive_upload)
+
+    return Response(
+        stream_with_context(body_then_wipe()),
+        mimetype='application/zip',
+        headers={"Content-Disposition": "attachment; filename=REDACTED_BATCH.zip"}
+    )
+
+
+# --- 8. Start the Server ---
 if __name__ == '__main__':
     # We run on port 5000
     print("="*50)
@@ -146,4 +558,6 @@ if __name__ == '__main__':
     print("Your React frontend can now send requests to this address.")
     print("Press CTRL+C to stop the server.")
     print("="*50)
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # The reloader runs this file twice (parent and child): with
+    # prefork that would load the models and fork a pool in both
+    app.run(debug=True, port=5000, threaded=True, use_reloader=WORKER_POOL is None)
@@ -0,0 +1,226 @@
+# -----------------------------------------------------------------
+# batch.py
+#
+# Bulk redaction for /redact/batch.
+# - Input is a ZIP archive or several uploaded files, plus one
+#   category list for all of them.
+# - Files are spread over the job workers (jobs.py).
+# - The response is a ZIP that is streamed out as each file
+#   finishes, ending with a manifest.json (status, entity counts
+#   and timings per file). A bad file is marked "failed" in the
+#   manifest; it does not fail the batch.
+# - Large archives and members are spooled to disk (uploads.py)
+#   and wiped once their file is done.
+# -----------------------------------------------------------------
+
+import json
+import os
+import posixpath
+import queue
+import time
+import zipfile
+from io import BytesIO
+
+from pipeline import redact_file
+from uploads import SpooledUpload, discard_upload, spool_stream
+
+# Limits for uploaded archives (protects against zip bombs)
+BATCH_MAX_FILES = int(os.environ.get("REDACT_BATCH_MAX_FILES", 1000))
+BATCH_MAX_FILE_BYTES = int(os.environ.get("REDACT_BATCH_MAX_FILE_BYTES", 200 * 1024 * 1024))
+
+# How many files of one batch may be queued/running at once
+BATCH_MAX_IN_FLIGHT = int(os.environ.get("REDACT_BATCH_MAX_IN_FLIGHT", 8))
+
+SUPPORTED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg", "docx", "txt"}
+
+
+class BatchInputError(Exception):
+    """The uploaded batch itself is unusable (bad ZIP, too many files...)."""
+
+
+# --- 1. READING THE INPUT ---
+
+def list_zip_members(archive_bytes):
+    """
+    Checks an uploaded ZIP (bytes or a SpooledUpload) and returns
+    the member names to process. Directories and macOS metadata are
+    skipped.
+    """
+    try:
+        archive = zipfile.ZipFile(archive_bytes.path if isinstance(archive_bytes, SpooledUpload)
+                                  else BytesIO(archive_bytes))
+    except zipfile.BadZipFile:
+        raise BatchInputError("Uploaded archive is not a valid ZIP file.")
+
+    members = []
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith("__MACOSX/") or posixpath.basename(name).startswith("."):
+            continue
+        if info.file_size > BATCH_MAX_FILE_BYTES:
+            raise BatchInputError(f"'{name}' is larger than the per-file limit.")
+        members.append(name)
+
+    if len(members) > BATCH_MAX_FILES:
+        raise BatchInputError(f"Batch has {len(members)} files; the limit is {BATCH_MAX_FILES}.")
+    return archive, members
+
+
+def iter_zip_files(archive, members):
+    """
+    Yields (name, file_bytes) for each member, reading them lazily.
+    Large members come as a SpooledUpload.
+    """
+    for name in members:
+        try:
+            with archive.open(name) as member:
+                file_bytes = spool_stream(member, size=archive.getinfo(name).file_size)
+            yield name, file_bytes
+        except Exception as e:
+            # Corrupt member: hand it on with the error so the
+            # manifest can record it.
+            yield name, e
+
+
+# --- 2. STREAMING THE OUTPUT ---
+
+class _ZipStream:
+    """
+    Write-only file object for zipfile. Whatever has been written
+    so far can be taken out with take() and sent to the client.
+    (No tell()/seek(), so zipfile writes a streamable archive.)
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _output_name(input_name, download_name, used_names):
+    """'scans/a.png' -> 'scans/a.pdf' (kept unique inside the ZIP)."""
+    output_ext = download_name.rsplit(".", 1)[-1]
+    stem = input_name.rsplit(".", 1)[0] if "." in posixpath.basename(input_name) else input_name
+    candidate = f"{stem}.{output_ext}"
+    counter = 1
+    while candidate in used_names:
+        candidate = f"{stem} ({counter}).{output_ext}"
+        counter += 1
+    used_names.add(candidate)
+    return candidate
+
+
+def stream_batch_zip(files, categories_to_find, job_manager, all_pages=False,
+                     output_format="pdf", redact=redact_file):
+    """
+    Generator for the /redact/batch response body.
+    'files' yields (name, file_bytes or Exception). Each file becomes
+    a job on 'job_manager'; finished files are written into the ZIP
+    (and streamed out) in the order they complete.
+    'redact' runs one file (redact_file, or the prefork pool's).
+    """
+    done_queue = queue.Queue()
+    batch_files = {}  # job id -> (input name, stats dict)
+    stream = _ZipStream()
+    manifest = []
+    used_names = set()
+    batch_start = time.time()
+
+    try:
+        with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            files = iter(files)
+            in_flight = 0
+            inputs_left = True
+
+            while True:
+                # Keep up to BATCH_MAX_IN_FLIGHT files of this batch queued
+                while inputs_left and in_flight < BATCH_MAX_IN_FLIGHT:
+                    try:
+                        name, file_bytes = next(files)
+                    except StopIteration:
+                        inputs_left = False
+                        break
+
+                    ext = name.rsplit(".", 1)[-1].lower()
+                    if isinstance(file_bytes, Exception) or ext not in SUPPORTED_EXTENSIONS:
+                        error = str(file_bytes) if isinstance(file_bytes, Exception) else \
+                            f"Unsupported file type: {ext}"
+                        manifest.append({"file": name, "status": "failed", "error": error})
+                        if not isinstance(file_bytes, Exception):
+                            discard_upload(file_bytes)
+                        continue
+
+                    stats = {}
+                    def run(progress, file_bytes=file_bytes, name=name, stats=stats):
+                        try:
+                            return redact(file_bytes, posixpath.basename(name), categories_to_find,
+                                          all_pages=all_pages, output_format=output_format,
+                                          progress=progress, stats=stats)
+                        finally:
+                            discard_upload(file_bytes)
+
+                    job = job_manager.submit(run, name, block=True, on_done=done_queue.put)
+                    batch_files[job.id] = (name, stats)
+                    in_flight += 1
+
+                if in_flight == 0:
+                    break
+
+                job = done_queue.get()
+                in_flight -= 1
+                name, stats = batch_files.pop(job.id)
+
+                entry = {
+                    "file": name,
+                    "status": job.status,
+                    "entities": dict(stats.get("entities", {})),
+                    "timings": {
+                        "queued_seconds": round(job.started_at - job.created_at, 3),
+                        "run_seconds": round(job.finished_at - job.started_at, 3),
+                        "stages": job.stages,
+                        "stage_seconds": {stage: round(seconds, 3)
+                                        for stage, seconds in stats.get("timings", {}).items()}
+                    }
+                }
+                if "encoding" in stats:
+                    entry["encoding"] = {encoding: dict(counts)
+                                         for encoding, counts in stats["encoding"].items()}
+                if "redaction" in stats:
+                    entry["redaction"] = stats["redaction"]
+                if job.status == "done":
+                    output_bytes, mimetype, download_name = job.result
+                    entry["output"] = _output_name(name, download_name, used_names)
+                    archive.writestr(entry["output"], output_bytes)
+                else:
+                    entry["error"] = job.error
+                manifest.append(entry)
+                job_manager.discard(job.id)
+
+                yield stream.take()
+
+            archive.writestr("manifest.json", json.dumps({
+                "files": manifest,
+                "total": len(manifest),
+                "succeeded": sum(1 for entry in manifest if entry["status"] == "done"),
+                "failed": sum(1 for entry in manifest if entry["status"] != "done"),
+                "elapsed_seconds": round(time.time() - batch_start, 3)
+            }, indent=2))
+
+        yield stream.take()
+    finally:
+        # The client may stop reading (or the batch fail) with files
+        # still in the job store: drop their results (redacted output,
+        # entity stats) now instead of at the result TTL
+        for job_id in batch_files:
+            job_manager.discard(job_id)
+        while not done_queue.empty():
+            done_queue.get_nowait().result = None
@@ -0,0 +1,7 @@
+# -----------------------------------------------------------------
+# benchmarks/
+#
+# Small, self-contained timing scripts for the backend.
+# Run them from the backend folder, e.g.:
+#   python -m benchmarks.page_stages
+# -----------------------------------------------------------------
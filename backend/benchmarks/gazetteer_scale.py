@@ -0,0 +1,160 @@
+# -----------------------------------------------------------------
+# benchmarks/gazetteer_scale.py
+#
+# Build time, memory and scan throughput of the gazetteer
+# (gazetteer.py) for a large name list.
+# - The list is --entries synthetic names ("Given [Middle] Surname"
+#   from made-up syllables, about 90% persons, 10% addresses),
+#   written to a temp file and wiped afterwards.
+# - "build" builds from the text file and pickles it, "load" loads
+#   the pickle. Each runs in its own process so the RSS growth is
+#   fair.
+# - The scan runs over synthetic OCR lines (one in ten holds a
+#   listed name), with the full list and with a 1,000-entry one, to
+#   show the scan cost doesn't grow with the list.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.gazetteer_scale [--entries 1000000] [--lines 20000]
+# -----------------------------------------------------------------
+
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.page_stages import current_rss_mb
+
+SYLLABLES = ["ah", "bo", "chen", "da", "el", "fa", "gan", "hui", "in", "ja", "ko", "li", "ma",
+             "na", "on", "pe", "qi", "ra", "si", "ta", "un", "vi", "wei", "xi", "ya", "zu"]
+FILLER = ("Patient was seen at the clinic on review and the results were discussed with "
+          "the family who agreed to follow up in two weeks time").split()
+
+
+def synthetic_names(count, seed=0):
+    rng = random.Random(seed)
+    given = sorted({(rng.choice(SYLLABLES) + rng.choice(SYLLABLES)).title() for _ in range(5000)})
+    surnames = sorted({(rng.choice(SYLLABLES) + rng.choice(SYLLABLES) + rng.choice(SYLLABLES)).title()
+                       for _ in range(20000)})
+    names = set()
+    while len(names) < count:
+        parts = [rng.choice(given)]
+        if rng.random() < 0.5:
+            parts.append(rng.choice(given))
+        parts.append(rng.choice(surnames))
+        names.add(" ".join(parts))
+    return sorted(names)
+
+
+def synthetic_lines(names, count, seed=1):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        words = rng.sample(FILLER, 8)
+        if i % 10 == 0:
+            words.insert(rng.randrange(len(words)), rng.choice(names).upper())
+        lines.append(" ".join(words))
+    return lines
+
+
+def write_lists(directory, entries):
+    names = synthetic_names(entries)
+    split = len(names) * 9 // 10
+    person_path = os.path.join(directory, "persons.txt")
+    address_path = os.path.join(directory, "addresses.txt")
+    with open(person_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(names[:split]) + "\n")
+    with open(address_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(f"{i % 999 + 1} {name} Road" for i, name in enumerate(names[split:])) + "\n")
+    return person_path, address_path, names[:split]
+
+
+def run_mode(mode, directory):
+    """Builds or loads in this process and returns the report."""
+    from gazetteer import Gazetteer, build_from_files
+
+    person_path = os.path.join(directory, "persons.txt")
+    address_path = os.path.join(directory, "addresses.txt")
+    compiled = os.path.join(directory, "gazetteer.pkl")
+    gc.collect()
+    baseline_rss = current_rss_mb()
+    start = time.perf_counter()
+    if mode == "build":
+        gazetteer = build_from_files([person_path], [address_path], [])
+        seconds = time.perf_counter() - start
+        gazetteer.save(compiled)
+    else:
+        gazetteer = Gazetteer.load(compiled)
+        seconds = time.perf_counter() - start
+    gc.collect()
+    return {
+        "mode": mode,
+        "entries": len(gazetteer),
+        "states": gazetteer.states,
+        "words": len(gazetteer.vocab),
+        "seconds": round(seconds, 2),
+        "rss_growth_mb": round(current_rss_mb() - baseline_rss, 1)
+    }
+
+
+def scan_report(gazetteer, lines, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = sum(len(gazetteer.find_all(line, ["PERSON", "ADDRESS"])) for line in lines)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    chars = sum(len(line) for line in lines)
+    return {
+        "entries": len(gazetteer),
+        "matches": found,
+        "lines_per_s": round(len(lines) / best),
+        "mb_per_s": round(chars / best / 2 ** 20, 2),
+        "us_per_line": round(best / len(lines) * 1e6, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gazetteer build, memory and scan throughput.")
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mode", choices=["build", "load"], help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.dir)))
+        return
+
+    from gazetteer import Gazetteer
+    from uploads import wipe_file
+
+    with tempfile.TemporaryDirectory() as directory:
+        _, _, persons = write_lists(directory, args.entries)
+        reports = []
+        try:
+            for mode in ["build", "load"]:
+                cmd = [sys.executable, "-m", "benchmarks.gazetteer_scale", "--mode", mode, "--dir", directory]
+                output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+                reports.append(json.loads(output.strip().splitlines()[-1]))
+            compiled_mb = os.path.getsize(os.path.join(directory, "gazetteer.pkl")) / 2 ** 20
+
+            lines = synthetic_lines(persons, args.lines)
+            full = Gazetteer.load(os.path.join(directory, "gazetteer.pkl"))
+            small = Gazetteer([("PERSON", name) for name in persons[:1000]])
+            scans = [scan_report(full, lines, args.repeat), scan_report(small, lines, args.repeat)]
+        finally:
+            for name in os.listdir(directory):
+                wipe_file(os.path.join(directory, name))
+
+    print(json.dumps({"entries": args.entries, "compiled_mb": round(compiled_mb, 1),
+                      "lines": args.lines, "results": reports, "scan": scans}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+# -----------------------------------------------------------------
+# benchmarks/ner_cascade.py
+#
+# Evaluates the NER cascade (engine.NER_CASCADES) on a labeled
+# sample of lines:
+# - share of lines the first stage sends to the transformer,
+# - end-to-end NER time and speedup vs "trf" (no cascade),
+# - recall of the labeled PERSON/ADDRESS spans, and how many of
+#   the "trf" findings the cascade still finds.
+#
+# The sample is a JSONL file, one line per OCR line:
+#   {"text": "Patient: John Tan", "entities": [[9, 17, "PERSON"]]}
+# Without --sample a synthetic report sample is generated; run it
+# on real (de-identified) OCR output before changing the default.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.ner_cascade [--sample lines.jsonl] [--lines 2000]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import random
+import time
+
+from engine import find_line_findings, select_ner_lines, NER_CASCADES
+from models import MODELS
+
+CATEGORIES = ["PERSON", "ADDRESS"]
+
+NAMES = ["John Tan", "Mary Lim", "Ahmad Yusof", "Priya Nair", "Wong Mei Ling"]
+STREETS = ["Harmony Street", "Sunnyville Road", "Orchard Avenue", "Jurong West Street 42"]
+
+# {name} / {street} become labeled spans
+LABELED_TEMPLATES = [
+    ("Patient Name: {name}", "PERSON"),
+    ("Doctor: Dr {name}", "PERSON"),
+    ("Dear {name},", "PERSON"),
+    ("Referred by {name} from the polyclinic", "PERSON"),
+    ("Next of kin: {name} (daughter)", "PERSON"),
+    ("Blk 123 {street} #04-56", "ADDRESS"),
+    ("Lives at 8 {street} with family", "ADDRESS"),
+]
+
+UNLABELED_LINES = [
+    "Medical Report",
+    "Visit Date: 12/03/2024",
+    "NRIC: S1234567D   Tel: 9123 4567",
+    "The patient presented with a two day history of fever and cough.",
+    "No known drug allergies. Continue current medications.",
+    "Impression: community acquired pneumonia, mild severity",
+    "Diagnosis: hypertension, follow up in 2 weeks",
+    "Thank you for seeing this patient.",
+    "Yours sincerely,",
+    "Discharge Summary",
+    "Blood pressure 130/85, pulse 72, afebrile",
+    "Plan: oral antibiotics, review in 1 week",
+]
+
+
+def synthetic_sample(count, labeled_fraction, rng):
+    sample = []
+    for _ in range(count):
+        if rng.random() >= labeled_fraction:
+            sample.append({"text": rng.choice(UNLABELED_LINES), "entities": []})
+            continue
+        template, label = rng.choice(LABELED_TEMPLATES)
+        value = rng.choice(NAMES if label == "PERSON" else STREETS)
+        placeholder = "{name}" if label == "PERSON" else "{street}"
+        start = template.index(placeholder)
+        text = template.replace(placeholder, value)
+        sample.append({"text": text, "entities": [[start, start + len(value), label]]})
+    return sample
+
+
+def load_sample(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _overlaps(finding, start, end, label):
+    return (finding["label"] == f"<{label}>"
+            and finding["start_char"] < end and start < finding["end_char"])
+
+
+def evaluate(sample, cascade):
+    lines = [(None, item["text"], 1.0) for item in sample]
+    eligible = [i for i, (_, text, _) in enumerate(lines) if "@" not in text]
+
+    start = time.perf_counter()
+    escalated = select_ner_lines(lines, eligible, cascade)
+    stage_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    findings = find_line_findings(lines, CATEGORIES, ner_mode="line", cascade=cascade)
+    total_seconds = time.perf_counter() - start
+
+    labeled = found = 0
+    for item, line_findings in zip(sample, findings):
+        for (span_start, span_end, label) in item["entities"]:
+            labeled += 1
+            if any(_overlaps(f, span_start, span_end, label) for f in line_findings):
+                found += 1
+
+    return {
+        "cascade": cascade,
+        "lines_escalated": round(len(escalated) / max(len(eligible), 1), 3),
+        "first_stage_ms": round(stage_seconds * 1000, 2),
+        "ner_ms": round(total_seconds * 1000, 2),
+        "recall": round(found / labeled, 3) if labeled else None,
+    }, findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lines escalated, speedup and recall of the NER cascade.")
+    parser.add_argument("--sample", help="labeled JSONL sample (default: synthetic)")
+    parser.add_argument("--lines", type=int, default=2000, help="synthetic sample size")
+    parser.add_argument("--labeled-fraction", type=float, default=0.25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if MODELS.get("ner") is None:
+        raise SystemExit("The transformer NER model is not loaded; nothing to compare against.")
+
+    if args.sample:
+        sample = load_sample(args.sample)
+    else:
+        sample = synthetic_sample(args.lines, args.labeled_fraction, random.Random(args.seed))
+
+    # Warm up both models so loading isn't timed
+    warmup = [(None, "Patient Name: John Tan", 1.0)]
+    for cascade in NER_CASCADES:
+        find_line_findings(warmup, CATEGORIES, ner_mode="line", cascade=cascade)
+
+    reports = []
+    trf_findings = None
+    for cascade in NER_CASCADES:
+        report, findings = evaluate(sample, cascade)
+        if cascade == "trf":
+            trf_findings = findings
+        else:
+            kept = total = 0
+            for trf_line, line in zip(trf_findings, findings):
+                total += len(trf_line)
+                kept += sum(1 for f in trf_line if f in line)
+            report["trf_findings_kept"] = round(kept / total, 3) if total else None
+            report["speedup"] = round(reports[0]["ner_ms"] / max(report["ner_ms"], 1e-6), 2)
+        reports.append(report)
+
+    print(json.dumps({"lines": len(sample), "results": reports}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
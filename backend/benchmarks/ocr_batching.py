@@ -0,0 +1,84 @@
+# -----------------------------------------------------------------
+# benchmarks/ocr_batching.py
+#
+# Tunes the OCR recognition batch size on this machine.
+# - Renders a few synthetic form pages (200 DPI).
+# - Baseline: EasyOCR readtext() page by page (the old path).
+# - Then run_ocr_on_images() over all pages together for each
+#   --batch-sizes value: detection per page, recognition of all
+#   crops in batches of similar width.
+# - Reports detection vs recognition seconds and how many lines
+#   read the same as the baseline.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.ocr_batching [--pages 4] [--batch-sizes 1,8,16,32,64]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import time
+from collections import Counter
+
+import fitz  # PyMuPDF
+
+from benchmarks.page_stages import build_synthetic_pdf, DPI
+from engine import preprocess_image_for_ocr, run_ocr_on_images
+from image_converter import pixmap_to_array
+from models import MODELS
+
+
+def render_pages(count):
+    """'count' copies of the synthetic page as RGB arrays."""
+    with fitz.open(stream=build_synthetic_pdf(), filetype="pdf") as doc:
+        page = pixmap_to_array(doc.load_page(0).get_pixmap(dpi=DPI))
+    return [page.copy() for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR detection vs batched recognition timings.")
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--batch-sizes", default="1,8,16,32,64")
+    args = parser.parse_args()
+
+    reader = MODELS.get("ocr")
+    if reader is None:
+        raise SystemExit("EasyOCR model is not loaded.")
+
+    pages = render_pages(args.pages)
+    run_ocr_on_images(pages[:1])  # warm up
+
+    start = time.perf_counter()
+    baseline = [reader.readtext(preprocess_image_for_ocr(page), paragraph=False, detail=1)
+                for page in pages]
+    baseline_seconds = time.perf_counter() - start
+    baseline_texts = Counter(text for page in baseline for (_, text, _) in page)
+
+    results = []
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        timings = {}
+        start = time.perf_counter()
+        pages_results = run_ocr_on_images(pages, batch_size=batch_size, timings=timings)
+        total_seconds = time.perf_counter() - start
+        texts = Counter(text for page in pages_results for (_, text, _) in page)
+        same = sum((baseline_texts & texts).values())
+        results.append({
+            "batch_size": batch_size,
+            "detect_s": round(timings["ocr_detect"], 3),
+            "recognize_s": round(timings["ocr_recognize"], 3),
+            "total_s": round(total_seconds, 3),
+            "speedup_vs_readtext": round(baseline_seconds / total_seconds, 2),
+            "lines": sum(texts.values()),
+            "lines_same_as_readtext": round(same / max(sum(baseline_texts.values()), 1), 3)
+        })
+
+    print(json.dumps({
+        "pages": args.pages,
+        "dpi": DPI,
+        "readtext_per_page_s": round(baseline_seconds, 3),
+        "baseline_lines": sum(baseline_texts.values()),
+        "results": results
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
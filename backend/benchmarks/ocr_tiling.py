@@ -0,0 +1,121 @@
+# -----------------------------------------------------------------
+# benchmarks/ocr_tiling.py
+#
+# Tiled OCR (tiling.py) on oversized pages: wall time, peak memory
+# and what was read, untiled vs tiled with 1..N detection threads.
+# - "tall_text": a long synthetic TXT rasterized like the pipeline
+#   does (1200 px wide, --lines lines tall).
+# - "large_scan": a synthetic form page rendered at --scan-dpi and
+#   thresholded at full size (REDACT_PREPROCESS=otsu), as a
+#   large-format scan that is not downscaled would be.
+# - Each setting runs in its own process (models loaded there), so
+#   the peak RSS growth over the loaded baseline is fair.
+# - "lines_read" is the share of the source lines found verbatim
+#   (case and spacing aside) in the OCR output.
+#
+# Usage (from the backend folder, needs the OCR model):
+#   python -m benchmarks.ocr_tiling [--lines 600] [--scan-dpi 400] [--max-workers 4]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+from benchmarks.page_stages import current_rss_mb
+from benchmarks.synthetic_docs import _text_pdf, page_lines
+
+
+def source_lines(count, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    while len(lines) < count:
+        lines.extend(text for (text, _) in page_lines(rng, 0.5))
+    return lines[:count]
+
+
+def build_page(kind, lines, scan_dpi):
+    """(RGB array, the text lines on it)."""
+    from image_converter import pil_to_page_image, pixmap_to_array, rasterize_text
+
+    if kind == "tall_text":
+        texts = source_lines(lines)
+        image, _ = rasterize_text("\n".join(texts))
+        return pil_to_page_image(image).array, texts
+    pages = [page_lines(random.Random(1), 0.5)]
+    data, _ = _text_pdf(pages)
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        array = pixmap_to_array(doc.load_page(0).get_pixmap(dpi=scan_dpi))
+    return array, [text for (text, _) in pages[0]]
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+
+def run_setting(kind, tiled, workers, lines, scan_dpi):
+    """OCRs the page in this process and returns the report."""
+    import engine
+    import preprocess
+    import tiling
+    from models import MODELS
+
+    MODELS.load_required()
+    if not tiled:
+        tiling.OCR_TILE_PX = 10 ** 9
+    engine.OCR_TILE_WORKERS = workers
+    if kind == "large_scan":
+        preprocess.PREPROCESS_MODE = "otsu"
+    array, texts = build_page(kind, lines, scan_dpi)
+    engine.run_ocr_on_images([array[:600, :1200].copy()])  # warm up
+    baseline_rss = current_rss_mb()
+
+    start = time.perf_counter()
+    results = engine.run_ocr_on_images([array])[0]
+    seconds = time.perf_counter() - start
+
+    read = " | ".join(_normalize(text) for (_, text, _) in results)
+    return {
+        "page": kind,
+        "size": list(array.shape[:2]),
+        "tiles": len(tiling.page_tiles(*array.shape[:2])),
+        "tiled": tiled,
+        "workers": workers,
+        "seconds": round(seconds, 2),
+        "peak_rss_growth_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline_rss, 1),
+        "text_boxes": len(results),
+        "lines_read": round(sum(_normalize(text) in read for text in texts) / len(texts), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Untiled vs tiled OCR on oversized pages.")
+    parser.add_argument("--lines", type=int, default=600)
+    parser.add_argument("--scan-dpi", type=int, default=400)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--setting", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setting:
+        kind, tiled, workers = args.setting.split(",")
+        print(json.dumps(run_setting(kind, tiled == "1", int(workers), args.lines, args.scan_dpi)))
+        return
+
+    reports = []
+    for kind in ["tall_text", "large_scan"]:
+        settings = [(0, 1)] + [(1, workers) for workers in range(1, args.max_workers + 1)]
+        for tiled, workers in settings:
+            cmd = [sys.executable, "-m", "benchmarks.ocr_tiling", "--setting", f"{kind},{tiled},{workers}",
+                   "--lines", str(args.lines), "--scan-dpi", str(args.scan_dpi)]
+            output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            reports.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# -----------------------------------------------------------------
+# benchmarks/output_encoding.py
+#
+# Bytes per page and encode time for each output encoding
+# (encoder.py) on two synthetic 200-DPI pages:
+# - "form": the black-and-white form page of page_stages.py with a
+#   few redaction boxes stamped on it.
+# - "photo": a smooth colour gradient with noise.
+# Also shows the old path (PIL's default PDF save) and PNG sizes
+# at a few compress levels, and which encoding "auto" picks.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.output_encoding [--repeat 5]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import time
+from io import BytesIO
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from benchmarks.page_stages import build_synthetic_pdf, synthetic_entities, DPI
+from encoder import HAS_LIBTIFF, choose_encoding, encode_page_pdf, encode_png
+from engine import redact_image_with_labels
+from image_converter import pixmap_to_array
+
+
+def form_page():
+    with fitz.open(stream=build_synthetic_pdf(), filetype="pdf") as doc:
+        page = pixmap_to_array(doc.load_page(0).get_pixmap(dpi=DPI))
+    return redact_image_with_labels(page, synthetic_entities(20))
+
+
+def photo_page(shape):
+    height, width = shape[:2]
+    y, x = np.mgrid[0:height, 0:width]
+    gradient = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=2)
+    noise = np.random.default_rng(0).normal(0, 12, gradient.shape)
+    return (gradient + noise).clip(0, 255).astype(np.uint8)
+
+
+def legacy_pdf(pixels):
+    """The old export: PIL's default PDF save of the RGB page."""
+    output_stream = BytesIO()
+    Image.fromarray(pixels).save(output_stream, format="PDF", resolution=DPI)
+    return output_stream.getvalue()
+
+
+def timed(fn, repeat):
+    """(result, best seconds) over 'repeat' runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per page and encode time per output encoding.")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    form = form_page()
+    pages = {"form": form, "photo": photo_page(form.shape)}
+    report = {"dpi": DPI, "ccitt_g4": HAS_LIBTIFF, "pages": {}}
+
+    for name, pixels in pages.items():
+        results = {}
+        output, seconds = timed(lambda: legacy_pdf(pixels), args.repeat)
+        results["legacy_pdf"] = {"kb": round(len(output) / 1024, 1), "ms": round(seconds * 1000, 1)}
+        for encoding in ("bilevel", "jpeg", "flate"):
+            (output, _), seconds = timed(lambda: encode_page_pdf(pixels, DPI, encoding), args.repeat)
+            results[encoding] = {"kb": round(len(output) / 1024, 1), "ms": round(seconds * 1000, 1)}
+        for level in (1, 6, 9):
+            output, seconds = timed(lambda: encode_png(pixels, DPI, level), args.repeat)
+            results[f"png_{level}"] = {"kb": round(len(output) / 1024, 1), "ms": round(seconds * 1000, 1)}
+        report["pages"][name] = {"auto_picks": choose_encoding(pixels, "auto"), "results": results}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# -----------------------------------------------------------------
+# benchmarks/page_stages.py
+#
+# Compares the old "PNG bytes between every stage" path with the
+# in-memory PageImage path on one 200-DPI A4 page.
+# - Reports per-stage timings (convert, preprocess, [ocr],
+#   redact, export) for both modes.
+# - Each mode runs in its own process so peak RSS is fair.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.page_stages            # no OCR stage
+#   python -m benchmarks.page_stages --with-ocr # include EasyOCR
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+DPI = 200
+A4_POINTS = (595, 842)
+
+
+def build_synthetic_pdf():
+    """One A4 page full of form-like text lines."""
+    doc = fitz.open()
+    page = doc.new_page(width=A4_POINTS[0], height=A4_POINTS[1])
+    y = 50
+    row = 0
+    while y < A4_POINTS[1] - 40:
+        page.insert_text((40, y), f"Patient Name: John Tan {row}   NRIC: S1234567D   Tel: 9123 4567",
+                         fontsize=10)
+        y += 16
+        row += 1
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def synthetic_entities(count=60):
+    """Boxes spread over the page, in 200-DPI pixels."""
+    entities = []
+    for i in range(count):
+        x0 = 100 + (i % 3) * 450
+        y0 = 120 + (i // 3) * 100
+        entities.append(([[x0, y0], [x0 + 300, y0], [x0 + 300, y0 + 30], [x0, y0 + 30]], "<PERSON>"))
+    return entities
+
+
+def current_rss_mb():
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * resource.getpagesize() / (1024 * 1024)
+
+
+def run_mode(mode, with_ocr):
+    """Runs one mode in this process and returns its report."""
+    import engine
+    from image_converter import pixmap_to_array
+
+    pdf_bytes = build_synthetic_pdf()
+    entities = synthetic_entities()
+    baseline_rss = current_rss_mb()
+    timings = {}
+
+    def timed(stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    pix = doc.load_page(0).get_pixmap(dpi=DPI)
+
+    if mode == "bytes":
+        page = timed("convert", pix.tobytes, "png")
+    else:
+        page = timed("convert", pixmap_to_array, pix)
+    pix = None
+    doc.close()
+
+    timed("preprocess", engine.preprocess_image_for_ocr, page)
+    if with_ocr:
+        timed("ocr", engine.run_ocr_on_image, page)
+
+    redacted = timed("redact", engine.redact_image_with_labels, page, entities)
+    if mode == "bytes":
+        timed("export", engine.export_image_to_pdf, redacted)
+    else:
+        timed("export", engine.export_image_to_pdf, redacted, dpi=DPI)
+
+    timings["total"] = round(sum(timings.values()), 2)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "mode": mode,
+        "stage_ms": timings,
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage timings: PNG bytes vs in-memory pages.")
+    parser.add_argument("--with-ocr", action="store_true", help="include the EasyOCR stage")
+    parser.add_argument("--mode", choices=["bytes", "array"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.with_ocr)))
+        return
+
+    reports = []
+    for mode in ["bytes", "array"]:
+        cmd = [sys.executable, "-m", "benchmarks.page_stages", "--mode", mode]
+        if args.with_ocr:
+            cmd.append("--with-ocr")
+        output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        # The engine prints while loading; the report is the last line
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(json.dumps({"dpi": DPI, "page": "A4", "results": reports}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
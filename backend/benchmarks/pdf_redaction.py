@@ -0,0 +1,90 @@
+# -----------------------------------------------------------------
+# benchmarks/pdf_redaction.py
+#
+# Rasterized output (output_format="pdf") vs true redaction of the
+# original PDF (output_format="document") on a synthetic multi-page
+# text PDF.
+# - Output size and time for each path.
+# - How many words are still searchable in each output (true
+#   redaction keeps the text outside the boxes).
+# - Leak check: none of the redacted values may still be
+#   extractable from the in-place output.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.pdf_redaction [--pages 5]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import time
+
+import fitz  # PyMuPDF
+
+from benchmarks.page_stages import A4_POINTS
+from pipeline import redact_file
+
+CATEGORIES = ["PERSON", "NRIC/FIN", "PHONE"]
+SECRETS = ["S1234567D", "9123 4567"]
+
+
+def build_pdf(pages):
+    """'pages' A4 pages of form-like lines with names, NRICs, phones."""
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page(width=A4_POINTS[0], height=A4_POINTS[1])
+        y = 50
+        row = 0
+        while y < A4_POINTS[1] - 40:
+            page.insert_text((40, y), f"Ward {page_number}-{row} visit notes for Patient Name: "
+                             f"John Tan  NRIC: S1234567D  Tel: 9123 4567", fontsize=10)
+            y += 16
+            row += 1
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def searchable_words(pdf_bytes):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [word[4] for page in doc for word in page.get_text("words")]
+
+
+def run(pdf_bytes, output_format):
+    stats = {}
+    start = time.perf_counter()
+    output_bytes, _, _ = redact_file(pdf_bytes, "bench.pdf", CATEGORIES, all_pages=True,
+                                     output_format=output_format, stats=stats)
+    elapsed = time.perf_counter() - start
+    words = searchable_words(output_bytes)
+    text = " ".join(words)
+    return {
+        "seconds": round(elapsed, 2),
+        "output_kb": round(len(output_bytes) / 1024, 1),
+        "searchable_words": len(words),
+        "leaked_values": [secret for secret in SECRETS if secret in text],
+        "entities": dict(stats.get("entities", {}))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rasterized vs in-place PDF redaction.")
+    parser.add_argument("--pages", type=int, default=5)
+    args = parser.parse_args()
+
+    pdf_bytes = build_pdf(args.pages)
+    raster = run(pdf_bytes, "pdf")
+    in_place = run(pdf_bytes, "document")
+    print(json.dumps({
+        "pages": args.pages,
+        "input_kb": round(len(pdf_bytes) / 1024, 1),
+        "rasterized": raster,
+        "in_place": in_place,
+        "size_ratio": round(raster["output_kb"] / max(in_place["output_kb"], 0.1), 1),
+        "speedup": round(raster["seconds"] / max(in_place["seconds"], 0.001), 2)
+    }, indent=2))
+    if in_place["leaked_values"]:
+        raise SystemExit(f"In-place output still contains {in_place['leaked_values']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# -----------------------------------------------------------------
+# benchmarks/prefork_scaling.py
+#
+# Memory and throughput of the prefork serving mode (workers.py)
+# for 1..N workers.
+# - Memory per process from /proc/<pid>/smaps_rollup: RSS, PSS
+#   (shared pages split between the processes that map them) and
+#   private (pages only that process holds, i.e. what one more
+#   worker really costs).
+# - Throughput: --files synthetic one-page PDFs pushed through the
+#   pool from as many threads as there are workers.
+# - Each worker count runs in its own process so the models are
+#   loaded fresh every time.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.prefork_scaling [--max-workers 4] [--files 16]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+CATEGORIES = ["PERSON", "NRIC/FIN", "PHONE", "ADDRESS"]
+
+
+def memory_mb(pid):
+    """RSS, PSS and private memory of one process, in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    private_kb = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "private_mb": round(private_kb / 1024, 1)
+    }
+
+
+def run_workers(workers, files):
+    """Starts a pool of 'workers', pushes 'files' PDFs through it."""
+    from benchmarks.page_stages import build_synthetic_pdf
+    from workers import WorkerPool
+
+    pool = WorkerPool(workers=workers)
+    start = time.perf_counter()
+    pool.start()
+    startup_seconds = time.perf_counter() - start
+    if not pool.ready():
+        raise SystemExit(f"Workers failed to start: {pool.health()}")
+
+    pdf_bytes = build_synthetic_pdf()
+    remaining = list(range(files))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                if not remaining:
+                    return
+                remaining.pop()
+            pool.redact(pdf_bytes, "bench.pdf", CATEGORIES, block=True)
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(workers)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # Measured after the run: buffers allocated, weights touched
+    worker_memory = [memory_mb(handle.process.pid) for handle in pool._handles]
+    parent_memory = memory_mb(os.getpid())
+    return {
+        "workers": workers,
+        "threads_per_worker": pool.threads_per_worker,
+        "startup_seconds": round(startup_seconds, 2),
+        "files": files,
+        "files_per_second": round(files / elapsed, 3),
+        "parent": parent_memory,
+        "worker_private_mb_avg": round(sum(m["private_mb"] for m in worker_memory) / workers, 1),
+        "worker_pss_mb_avg": round(sum(m["pss_mb"] for m in worker_memory) / workers, 1),
+        "total_pss_mb": round(parent_memory["pss_mb"] + sum(m["pss_mb"] for m in worker_memory), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per worker and throughput of prefork serving.")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--workers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.workers:
+        print(json.dumps(run_workers(args.workers, args.files)))
+        return
+
+    reports = []
+    for workers in range(1, args.max_workers + 1):
+        cmd = [sys.executable, "-m", "benchmarks.prefork_scaling",
+               "--workers", str(workers), "--files", str(args.files)]
+        output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        # The pool prints while starting; the report is the last line
+        report = json.loads(output.strip().splitlines()[-1])
+        report["speedup"] = round(report["files_per_second"] / reports[0]["files_per_second"], 2) \
+            if reports else 1.0
+        reports.append(report)
+
+    print(json.dumps({"results": reports}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
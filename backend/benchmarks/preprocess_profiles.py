@@ -0,0 +1,98 @@
+# -----------------------------------------------------------------
+# benchmarks/preprocess_profiles.py
+#
+# The OCR preprocessing profiles (preprocess.py) on the synthetic
+# corpus (benchmarks/synthetic_docs.py): "legacy" (invert +
+# threshold 127 on every page) against "auto" (a profile per page).
+# - Per format: which profiles ran, preprocessing ms per page
+#   (p50) and the megapixels handed to EasyOCR.
+# - With --ocr (needs the models): OCR seconds per page and the
+#   detection recall per format, scored against the ground truth
+#   like benchmarks/suite.py does.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.preprocess_profiles [--docs-per-format 2] [--ocr]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import time
+from collections import defaultdict
+
+import preprocess
+from benchmarks.scoring import CategoryScores, coords_to_box
+from benchmarks.suite import latency_summary, page_truth_boxes, rendered_pages
+from benchmarks.synthetic_docs import FORMATS, build_corpus
+from engine import ALL_CATEGORIES, find_line_findings, findings_to_coordinates, run_ocr_on_images
+from models import MODELS
+
+MODES = ["legacy", "auto"]
+
+
+def corpus_pages(corpus):
+    """[(document, PageImage, text_layer), ...] rendered once for every mode."""
+    return [(document, page, text_layer)
+            for document in corpus for page, text_layer in rendered_pages(document)]
+
+
+def run_mode(mode, pages, with_ocr):
+    preprocess.PREPROCESS_MODE = mode
+    by_format = defaultdict(lambda: {"profiles": defaultdict(int), "preprocess_s": [],
+                                     "megapixels": 0.0, "ocr_s": [], "scores": CategoryScores()})
+    for document, page, text_layer in pages:
+        totals = by_format[document["format"]]
+        start = time.perf_counter()
+        prepared, profile, _ = preprocess.prepare_for_ocr(page.array)
+        totals["preprocess_s"].append(time.perf_counter() - start)
+        totals["profiles"][profile] += 1
+        totals["megapixels"] += prepared.shape[0] * prepared.shape[1] / 1e6
+
+        # Pages with a text layer never reach OCR in the pipeline
+        if with_ocr and text_layer is None:
+            start = time.perf_counter()
+            lines = run_ocr_on_images([page.array])[0]
+            totals["ocr_s"].append(time.perf_counter() - start)
+            entities = findings_to_coordinates(lines, find_line_findings(lines, ALL_CATEGORIES))
+            totals["scores"].add_page(
+                page_truth_boxes(document, page, None),
+                [(label.strip("<>"), coords_to_box(coords)) for (coords, label) in entities])
+
+    report = {}
+    for file_format, totals in by_format.items():
+        entry = {
+            "profiles": dict(totals["profiles"]),
+            "preprocess_p50_ms": latency_summary(totals["preprocess_s"])["p50_ms"],
+            "ocr_megapixels": round(totals["megapixels"], 1)
+        }
+        if totals["ocr_s"]:
+            entry["ocr"] = latency_summary(totals["ocr_s"])
+            entry["accuracy"] = totals["scores"].report()["_all"]
+        report[file_format] = entry
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR preprocessing profiles on the synthetic corpus.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--docs-per-format", type=int, default=2)
+    parser.add_argument("--pages", default="1,3", help="page counts for PDFs, cycled")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--ocr", action="store_true", help="also run OCR and score recall")
+    args = parser.parse_args()
+
+    if args.ocr:
+        MODELS.load_required()
+        if not MODELS.required_ready():
+            raise SystemExit(f"Models failed to load: {MODELS.health()}")
+
+    corpus = build_corpus(args.seed, args.docs_per_format, args.formats.split(","),
+                          [int(count) for count in args.pages.split(",")])
+    pages = corpus_pages(corpus)
+    report = {"documents": len(corpus), "pages": len(pages)}
+    for mode in MODES:
+        report[mode] = run_mode(mode, pages, args.ocr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
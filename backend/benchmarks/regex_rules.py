@@ -0,0 +1,143 @@
+# -----------------------------------------------------------------
+# benchmarks/regex_rules.py
+#
+# Microbenchmark: the old per-rule regex loop from
+# find_sensitive_entities vs the single-pass RuleMatcher.
+# - Generates a few thousand OCR-like lines: a share of them
+#   carry identifiers, the rest is ordinary report text.
+# - Checks both give exactly the same findings, then times them.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.regex_rules [--lines 5000] [--phi-fraction 0.3]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import random
+import re
+import time
+
+from rules import REDACTION_RULES, RULE_MATCHER
+
+ALL_LABELS = [rule["label"] for rule in REDACTION_RULES]
+
+# The rules exactly as the old loop compiled them
+LEGACY_RULES = {
+    rule["label"]: re.compile(rule["pattern"], re.IGNORECASE if rule.get("ignore_case") else 0)
+    for rule in REDACTION_RULES
+}
+
+
+def legacy_find_all(text, categories_to_find):
+    """The pre-RuleMatcher loop, kept here for comparison."""
+    lower_text = text.lower()
+    found = []
+    for label, pattern in LEGACY_RULES.items():
+        if label not in categories_to_find:
+            continue
+        if label == "MCR no." and "mcr" not in lower_text:
+            continue
+        if label == "NRIC/FIN" and not re.search(r'\b(nric|fin|passport)\b', lower_text):
+            continue
+        if label == "DATE" and not re.search(r'\b(date|birth|dob)\b', lower_text):
+            continue
+        if label == "ID_NUMBER" and not re.search(r'\b(med\. number|ihi|id)\b', lower_text):
+            continue
+        for match in pattern.finditer(text):
+            found.append((label, match.start(), match.end()))
+    return found
+
+
+PROSE_LINES = [
+    "Medical Report",
+    "The patient presented with a two day history of fever and cough.",
+    "No known drug allergies. Continue current medications.",
+    "Chest is clear on auscultation, heart sounds dual with no murmur.",
+    "Impression: community acquired pneumonia, mild severity",
+    "Plan: oral antibiotics and review at the specialist clinic",
+    "Thank you for seeing this patient.",
+    "Yours sincerely,",
+    "Discharge Summary",
+    "History of Presenting Illness",
+]
+
+LINE_TEMPLATES = [
+    "Patient Name: {name}",
+    "NRIC: {nric}   Passport: {passport}",
+    "MCR no. {mcr}  Doctor: Dr {name}",
+    "Tel: {phone}  Fax: +65 {phone}",
+    "Email: {email}",
+    "DOB: {date}   Visit Date: {date}",
+    "Date of birth: {month} {day}, {year}",
+    "Med. Number {idnum}   IHI {idnum2}",
+    "Address: Blk {block} Harmony Street #0{floor}-{unit} Singapore {postal}",
+    "Medical Report",
+    "Diagnosis: hypertension, follow up in 2 weeks",
+    "Ward {block}  Bed {floor}  Team A",
+    "Reference {mcr} for FIN {nric}",
+]
+
+
+def _random_line(rng, phi_fraction=1.0):
+    if rng.random() >= phi_fraction:
+        return rng.choice(PROSE_LINES)
+    template = rng.choice(LINE_TEMPLATES)
+    return template.format(
+        name=rng.choice(["John Tan", "Mary Lim", "Ahmad Yusof", "Priya Nair"]),
+        nric=f"{rng.choice('STFG')}{rng.randint(0, 9999999):07d}{rng.choice('ABCDEFGHIZJ')}",
+        passport=f"E{rng.randint(0, 9999999):07d}K",
+        mcr=f"{rng.randint(0, 999999):06d}",
+        phone=f"{rng.choice('689')}{rng.randint(0, 999):03d} {rng.randint(0, 9999):04d}",
+        email=f"user{rng.randint(1, 999)}@hospital.com.sg",
+        date=f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1940, 2024)}",
+        month=rng.choice(["Jan", "March", "Sep", "December"]),
+        day=rng.randint(1, 28), year=rng.randint(1940, 2024),
+        idnum=f"{rng.randint(0, 9999):04d}-{rng.randint(0, 9999):04d}-{rng.randint(0, 9999):04d}-{rng.randint(0, 999):03d}",
+        idnum2=f"AB{rng.randint(0, 999999):06d}",
+        block=rng.randint(1, 999), floor=rng.randint(1, 9), unit=rng.randint(10, 99),
+        postal=rng.randint(100000, 999999)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-rule regex loop vs single-pass RuleMatcher.")
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--phi-fraction", type=float, default=0.3,
+                        help="share of lines that contain identifiers")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lines = [_random_line(rng, args.phi_fraction) for _ in range(args.lines)]
+
+    # Same results first
+    for line in lines:
+        expected = legacy_find_all(line, ALL_LABELS)
+        actual = RULE_MATCHER.find_all(line, ALL_LABELS)
+        if expected != actual:
+            raise SystemExit(f"Mismatch on {line!r}:\n  legacy  {expected}\n  matcher {actual}")
+
+    def best_of(fn):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for line in lines:
+                fn(line, ALL_LABELS)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    legacy_seconds = best_of(legacy_find_all)
+    matcher_seconds = best_of(RULE_MATCHER.find_all)
+    print(json.dumps({
+        "lines": args.lines,
+        "phi_fraction": args.phi_fraction,
+        "legacy_ms": round(legacy_seconds * 1000, 2),
+        "matcher_ms": round(matcher_seconds * 1000, 2),
+        "speedup": round(legacy_seconds / matcher_seconds, 2)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# -----------------------------------------------------------------
+# benchmarks/renderer.py
+#
+# The old PIL redaction loop (draw.rectangle + draw.text per
+# entity) vs redact_image_with_labels() with array fills and
+# cached label sprites, on a 200-DPI A4 page full of hits (e.g. a
+# lab table of IDs and dates).
+# - Checks that every pixel the old rectangles covered is also
+#   covered by the new renderer (with and without box merging).
+# - Reports time per page for each.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.renderer [--entities 400] [--repeat 5]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from engine import redact_image_with_labels
+
+A4_200_DPI = (1654, 2339)
+LABELS = ["<PERSON>", "<PHONE>", "<DATE>", "<ID_NUMBER>", "<NRIC/FIN>", "<ADDRESS>"]
+
+
+def legacy_redact(image, entities_to_redact):
+    """The per-entity PIL loop this replaced, kept for comparison."""
+    pil_image = Image.fromarray(image)
+    draw = ImageDraw.Draw(pil_image)
+    font = ImageFont.load_default(size=18)
+    for (coordinates, label_text) in entities_to_redact:
+        x0, y0 = coordinates[0]
+        x1, y1 = coordinates[2]
+        draw.rectangle([(x0, y0), (x1, y1)], fill="white")
+        draw.text((x0 + 2, y0 + 2), label_text, fill="red", font=font)
+    return np.asarray(pil_image)
+
+
+def legacy_coverage(shape, entities_to_redact):
+    """Mask of the pixels the old rectangles whited out."""
+    mask = Image.new("L", (shape[1], shape[0]), 0)
+    draw = ImageDraw.Draw(mask)
+    for (coordinates, _) in entities_to_redact:
+        draw.rectangle([tuple(coordinates[0]), tuple(coordinates[2])], fill=255)
+    return np.asarray(mask) > 0
+
+
+def synthetic_table(count, rng):
+    """Rows of cells with sub-pixel box edges, some cells touching."""
+    entities = []
+    width, height = A4_200_DPI
+    for i in range(count):
+        row, column = divmod(i, 6)
+        x0 = 60 + column * 260 + rng.uniform(0, 3)
+        y0 = 80 + (row % 70) * 32 + rng.uniform(0, 2)
+        x1 = min(x0 + rng.uniform(80, 262), width - 1)
+        y1 = min(y0 + 26.5, height - 1)
+        entities.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], rng.choice(LABELS)))
+    return entities
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PIL per-entity drawing vs array fills + label sprites.")
+    parser.add_argument("--entities", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    page = np.random.default_rng(args.seed).integers(0, 256, (A4_200_DPI[1], A4_200_DPI[0], 3),
+                                                     dtype=np.uint8)
+    entities = synthetic_table(args.entities, rng)
+
+    covered = legacy_coverage(page.shape, entities)
+    for merge in (False, True):
+        redacted = redact_image_with_labels(page, entities, merge=merge)
+        # White-out and red labels blended over it: R == 255, G == B
+        whited = (redacted[..., 0] == 255) & (redacted[..., 1] == redacted[..., 2])
+        if not np.all(whited[covered]):
+            raise SystemExit(f"merge={merge}: {int(np.sum(covered & ~whited))} covered pixels left as-is")
+
+    def best_of(fn, **kwargs):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn(page, entities, **kwargs)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    legacy_seconds = best_of(legacy_redact)
+    new_seconds = best_of(redact_image_with_labels, merge=False)
+    merged_seconds = best_of(redact_image_with_labels, merge=True)
+    print(json.dumps({
+        "entities": args.entities,
+        "page": "A4 @ 200 DPI",
+        "legacy_ms": round(legacy_seconds * 1000, 2),
+        "sprites_ms": round(new_seconds * 1000, 2),
+        "sprites_merged_ms": round(merged_seconds * 1000, 2),
+        "speedup": round(legacy_seconds / new_seconds, 2)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
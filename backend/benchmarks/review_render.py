@@ -0,0 +1,68 @@
+# -----------------------------------------------------------------
+# benchmarks/review_render.py
+#
+# Cost of one /render pass after a review (sessions.py +
+# pipeline.render_reviewed_pages): the detected pages are already
+# in the session, so only drawing and encoding run.
+# - The session is --pages synthetic 200-DPI form pages with 20
+#   detected entities each. The review rejects one entity per page
+#   and adds one box, like a reviewer's correction.
+# - Also reports the size of the /detect JSON and the page memory
+#   the session holds.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.review_render [--pages 5] [--repeat 5]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import time
+
+from benchmarks.output_encoding import form_page
+from benchmarks.page_stages import synthetic_entities, DPI
+from image_converter import PageImage
+from pipeline import render_reviewed_pages
+from sessions import SessionStore
+
+
+def build_session(store, pages):
+    array = form_page()
+    detected = []
+    for page_number in range(pages):
+        entities = [(coords, label, 0.9) for coords, label in synthetic_entities(20)]
+        detected.append({"page": PageImage(array.copy(), DPI, page_number), "lines": [],
+                         "entities": entities})
+    return store.create("bench.pdf", ["PERSON"], detected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time of a /render pass over a review session.")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    session = build_session(SessionStore(), args.pages)
+    rejected = [session.entity_id(page_number, 0) for page_number in range(args.pages)]
+    added = [{"page": page_number, "box": [100, 1500, 600, 1540], "label": "PERSON"}
+             for page_number in range(args.pages)]
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        output_bytes = render_reviewed_pages(session.reviewed_pages(rejected=rejected, added=added))
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(json.dumps({
+        "pages": args.pages,
+        "dpi": DPI,
+        "session_mb": round(session.nbytes / 2 ** 20, 1),
+        "detect_json_kb": round(len(json.dumps(session.to_dict())) / 1024, 1),
+        "render_ms": round(best * 1000, 1),
+        "render_ms_per_page": round(best / args.pages * 1000, 1),
+        "output_kb": round(len(output_bytes) / 1024, 1)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# -----------------------------------------------------------------
+# benchmarks/scoring.py
+#
+# Scores predicted redaction boxes against ground-truth boxes, per
+# category, for the benchmark suite.
+# - Recall: a truth box counts as found if at least MIN_COVERAGE of
+#   its area is covered by predicted boxes of the same category.
+# - Precision: a predicted box counts as correct if at least
+#   MIN_PRECISION_OVERLAP of its area lies on truth boxes of the
+#   same category.
+# - "any_label_recall" ignores the category: what matters for
+#   privacy is that the value is covered at all.
+# -----------------------------------------------------------------
+
+MIN_COVERAGE = 0.8
+MIN_PRECISION_OVERLAP = 0.5
+
+
+def box_area(box):
+    return max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1])
+
+
+def union_area(boxes):
+    """
+    Area covered by the union of 'boxes', where they overlap counted
+    once: a sweep over the x edges, merging the y spans per strip.
+    """
+    boxes = [b for b in boxes if box_area(b) > 0]
+    xs = sorted({x for b in boxes for x in (b[0], b[2])})
+    area = 0.0
+    for left, right in zip(xs, xs[1:]):
+        spans = sorted((b[1], b[3]) for b in boxes if b[0] <= left and b[2] >= right)
+        covered, top, bottom = 0.0, None, None
+        for (y0, y1) in spans:
+            if bottom is None or y0 > bottom:
+                if bottom is not None:
+                    covered += bottom - top
+                top, bottom = y0, y1
+            else:
+                bottom = max(bottom, y1)
+        if bottom is not None:
+            covered += bottom - top
+        area += covered * (right - left)
+    return area
+
+
+def covered_share(box, others):
+    """Share of 'box' covered by the union of 'others' (overlapping or duplicate boxes count once)."""
+    area = box_area(box)
+    if area == 0:
+        return 0.0
+    clipped = [(max(box[0], o[0]), max(box[1], o[1]), min(box[2], o[2]), min(box[3], o[3]))
+               for o in others]
+    return min(1.0, union_area(clipped) / area)
+
+
+def coords_to_box(coordinates):
+    """[[x0, y0], _, [x1, y1], _] -> (x0, y0, x1, y1)."""
+    (x0, y0), (x1, y1) = coordinates[0], coordinates[2]
+    return (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+
+class CategoryScores:
+    """Running precision/recall counts per category."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def _category(self, category):
+        return self.counts.setdefault(category, {
+            "truth": 0, "found": 0, "found_any_label": 0, "predicted": 0, "correct": 0})
+
+    def add_page(self, truth, predicted):
+        """
+        truth: [(category, box), ...]; predicted: [(category, box), ...],
+        all boxes (x0, y0, x1, y1) in the same page coordinates.
+        """
+        all_predicted = [box for (_, box) in predicted]
+        for (category, box) in truth:
+            counts = self._category(category)
+            counts["truth"] += 1
+            same = [p_box for (p_category, p_box) in predicted if p_category == category]
+            if covered_share(box, same) >= MIN_COVERAGE:
+                counts["found"] += 1
+            if covered_share(box, all_predicted) >= MIN_COVERAGE:
+                counts["found_any_label"] += 1
+        for (category, box) in predicted:
+            counts = self._category(category)
+            counts["predicted"] += 1
+            same = [t_box for (t_category, t_box) in truth if t_category == category]
+            if covered_share(box, same) >= MIN_PRECISION_OVERLAP:
+                counts["correct"] += 1
+
+    def report(self):
+        """{category: {"precision", "recall", "any_label_recall", counts...}, "_all": ...}."""
+        def summarize(counts):
+            return dict(counts,
+                        precision=round(counts["correct"] / counts["predicted"], 4) if counts["predicted"] else None,
+                        recall=round(counts["found"] / counts["truth"], 4) if counts["truth"] else None,
+                        any_label_recall=round(counts["found_any_label"] / counts["truth"], 4)
+                        if counts["truth"] else None)
+
+        totals = {key: sum(counts[key] for counts in self.counts.values())
+                  for key in ("truth", "found", "found_any_label", "predicted", "correct")}
+        report = {category: summarize(counts) for category, counts in sorted(self.counts.items())}
+        report["_all"] = summarize(totals)
+        return report
@@ -0,0 +1,301 @@
+# -----------------------------------------------------------------
+# benchmarks/suite.py
+#
+# End-to-end benchmark on a synthetic PHI corpus
+# (benchmarks/synthetic_docs.py), with ground-truth scoring.
+# - Stage pass: every page goes through render, OCR (only pages
+#   without a text layer), detect, redact and encode, each timed
+#   on its own. The predicted boxes are scored per category
+#   (benchmarks/scoring.py).
+# - Pipeline pass: every document goes through
+#   pipeline.redact_file() as the API runs it. Reports
+#   per-document latency and pages/sec, overall and per format.
+# - Reports p50/p90/p99 per stage and peak RSS, as one JSON
+#   report. The result cache is off so both passes run the models.
+# - --compare old.json prints how the headline numbers moved
+#   since a previous report.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.suite [--docs-per-format 2] [--pages 1,3]
+#       [--phi-density 0.5] [--out report.json] [--compare old.json]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import resource
+import time
+from collections import defaultdict
+
+from benchmarks.page_stages import DPI
+from benchmarks.scoring import CategoryScores, coords_to_box
+from benchmarks.synthetic_docs import FORMATS, build_corpus
+from cache import RESULT_CACHE
+from encoder import OUTPUT_ENCODING, encode_page_pdf
+from engine import (
+    ALL_CATEGORIES,
+    NER_CASCADE,
+    NER_MODE,
+    OCR_BATCH_SIZE,
+    find_line_findings,
+    findings_to_coordinates,
+    redact_image_with_labels,
+    run_ocr_on_images
+)
+from image_converter import (
+    extract_document_paragraphs,
+    iter_pdf_pages,
+    load_image_page,
+    pil_to_page_image,
+    rasterize_text,
+    text_layout_to_lines
+)
+from models import MODELS
+from pipeline import redact_file
+from preprocess import PREPROCESS_MODE
+from telemetry import PREPROCESS_PAGES
+
+STAGES = ["render", "ocr", "detect", "redact", "encode"]
+# Numbers --compare reports, by the end of their dotted key
+COMPARED_SUFFIXES = ("p50_ms", "p90_ms", "pages_per_second", "peak_rss_mb", "precision", "recall",
+                     "any_label_recall")
+
+
+# --- 1. STATS ---
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list (q in 0..100)."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds):
+    return {
+        "count": len(seconds),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 2),
+        "p90_ms": round(percentile(seconds, 90) * 1000, 2),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 2),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 2),
+        "total_s": round(sum(seconds), 3)
+    }
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+# --- 2. STAGE PASS ---
+
+def rendered_pages(document):
+    """Yields (PageImage, text_layer) like the pipeline sees them."""
+    file_format = document["format"]
+    if file_format in ("txt", "docx"):
+        paragraphs = extract_document_paragraphs(document["bytes"], file_format)
+        image, layout = rasterize_text("\n".join(paragraphs))
+        yield pil_to_page_image(image), text_layout_to_lines(layout)
+    elif file_format in ("png", "scan_noisy", "scan_hires"):
+        yield load_image_page(document["bytes"]), None
+    else:
+        yield from iter_pdf_pages(document["bytes"], dpi=DPI)
+
+
+def text_truth_boxes(truth, lines, glyph_boxes):
+    """Truth boxes of a rasterized txt/docx, found on its lines."""
+    boxes = []
+    used = set()
+    for entry in truth:
+        for line_index, (coords, text, _) in enumerate(lines):
+            start = text.find(entry["value"])
+            while start != -1 and (line_index, start) in used:
+                start = text.find(entry["value"], start + 1)
+            if start == -1:
+                continue
+            used.add((line_index, start))
+            glyphs = glyph_boxes[line_index]
+            end = start + len(entry["value"])
+            boxes.append((entry["category"],
+                          (glyphs[start][2], coords[0][1], glyphs[end - 1][3], coords[2][1])))
+            break
+    return boxes
+
+
+def page_truth_boxes(document, page, text_layer):
+    """[(category, (x0, y0, x1, y1)), ...] in the page's pixels."""
+    if document["format"] in ("txt", "docx"):
+        return text_truth_boxes(document["truth"], *text_layer)
+    scale = page.dpi / 72.0
+    return [(entry["category"], tuple(value * scale for value in entry["box"]))
+            for entry in document["truth"] if entry["page"] == page.page_number]
+
+
+def run_stage_pass(corpus, categories):
+    """Times each stage per page and scores the predicted boxes."""
+    stage_seconds = defaultdict(list)
+    scores = CategoryScores()
+    scores_by_format = defaultdict(CategoryScores)
+
+    def timed(stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        stage_seconds[stage].append(time.perf_counter() - start)
+        return result
+
+    for document in corpus:
+        pages = rendered_pages(document)
+        while True:
+            start = time.perf_counter()
+            item = next(pages, None)
+            if item is None:
+                break
+            stage_seconds["render"].append(time.perf_counter() - start)
+            page, text_layer = item
+
+            if text_layer is not None:
+                lines, char_boxes = text_layer
+            else:
+                lines, char_boxes = timed("ocr", run_ocr_on_images, [page.array])[0], None
+
+            def detect():
+                findings_per_line = find_line_findings(lines, categories)
+                return findings_to_coordinates(lines, findings_per_line, char_boxes)
+
+            entities = timed("detect", detect)
+            redacted = timed("redact", redact_image_with_labels, page.array, entities)
+            timed("encode", encode_page_pdf, redacted, page.dpi)
+
+            truth = page_truth_boxes(document, page, text_layer)
+            predicted = [(label.strip("<>"), coords_to_box(coords)) for (coords, label) in entities]
+            scores.add_page(truth, predicted)
+            scores_by_format[document["format"]].add_page(truth, predicted)
+
+    return {
+        "stages": {stage: latency_summary(stage_seconds[stage]) for stage in STAGES
+                   if stage_seconds[stage]},
+        "accuracy": scores.report(),
+        "accuracy_by_format": {file_format: format_scores.report()["_all"]
+                               for file_format, format_scores in scores_by_format.items()}
+    }
+
+
+# --- 3. PIPELINE PASS ---
+
+def run_pipeline_pass(corpus, categories):
+    """Runs every document through redact_file(), as the API does."""
+    latencies = []
+    by_format = defaultdict(lambda: {"documents": 0, "pages": 0, "seconds": 0.0})
+    for document in corpus:
+        start = time.perf_counter()
+        redact_file(document["bytes"], document["name"], categories, all_pages=True, stats={})
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        totals = by_format[document["format"]]
+        totals["documents"] += 1
+        totals["pages"] += document["pages"]
+        totals["seconds"] += elapsed
+
+    for totals in by_format.values():
+        totals["pages_per_second"] = round(totals["pages"] / totals["seconds"], 3)
+        totals["seconds"] = round(totals["seconds"], 3)
+    pages = sum(document["pages"] for document in corpus)
+    return {
+        "documents": len(corpus),
+        "pages": pages,
+        "seconds": round(sum(latencies), 3),
+        "pages_per_second": round(pages / sum(latencies), 3),
+        "document_latency": latency_summary(latencies),
+        "by_format": dict(by_format)
+    }
+
+
+# --- 4. REPORT ---
+
+def _flatten(report, prefix=""):
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare_reports(baseline, current):
+    """{dotted key: {"baseline", "current", "change"}} for the headline numbers."""
+    old = dict(_flatten({key: value for key, value in baseline.items() if key != "compared_with"}))
+    changes = {}
+    for key, value in _flatten(current):
+        if key.endswith(COMPARED_SUFFIXES) and key in old:
+            changes[key] = {
+                "baseline": old[key],
+                "current": value,
+                "change": round(value / old[key] - 1, 4) if old[key] else None
+            }
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, throughput, memory and accuracy on synthetic PHI documents.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--docs-per-format", type=int, default=2)
+    parser.add_argument("--pages", default="1,3", help="page counts for PDFs, cycled")
+    parser.add_argument("--phi-density", type=float, default=0.5)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--out", help="also write the report to this file")
+    parser.add_argument("--compare", help="a previous report to compare with")
+    args = parser.parse_args()
+
+    # Both passes must run the models, not hit the cache
+    RESULT_CACHE.max_entries = 0
+    RESULT_CACHE.disk_dir = None
+
+    start = time.perf_counter()
+    MODELS.load_required()
+    if not MODELS.required_ready():
+        raise SystemExit(f"Models failed to load: {MODELS.health()}")
+    load_seconds = time.perf_counter() - start
+
+    formats = args.formats.split(",")
+    corpus = build_corpus(args.seed, args.docs_per_format, formats,
+                          [int(count) for count in args.pages.split(",")], args.phi_density)
+    categories = list(ALL_CATEGORIES)
+
+    report = {
+        "run": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": args.seed,
+            "docs_per_format": args.docs_per_format,
+            "page_counts": args.pages,
+            "phi_density": args.phi_density,
+            "formats": formats,
+            "ner_mode": NER_MODE,
+            "ner_cascade": NER_CASCADE,
+            "ocr_batch_size": OCR_BATCH_SIZE,
+            "output_encoding": OUTPUT_ENCODING,
+            "preprocess": PREPROCESS_MODE
+        },
+        "corpus": {
+            "documents": len(corpus),
+            "pages": sum(document["pages"] for document in corpus),
+            "truth_values": sum(len(document["truth"]) for document in corpus)
+        },
+        "model_load_seconds": round(load_seconds, 2)
+    }
+    report.update(run_stage_pass(corpus, categories))
+    report["preprocess_profiles"] = {labels[0]: count for labels, count in PREPROCESS_PAGES.values.items()}
+    report["memory"] = {"peak_rss_mb_after_stages": peak_rss_mb()}
+    report["pipeline"] = run_pipeline_pass(corpus, categories)
+    report["memory"]["peak_rss_mb"] = peak_rss_mb()
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["compared_with"] = {"file": args.compare,
+                                       "changes": compare_reports(json.load(f), report)}
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
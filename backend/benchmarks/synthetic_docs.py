@@ -0,0 +1,270 @@
+# -----------------------------------------------------------------
+# benchmarks/synthetic_docs.py
+#
+# Generates fake hospital documents with known PHI, for the
+# benchmark suite (benchmarks/suite.py).
+# - Formats: "txt", "docx", "pdf" (text layer), "pdf_scan"
+#   (image-only pages, needs OCR), "png" (one scanned page), and
+#   two poor scans as PNG: "scan_noisy" (grey, unevenly lit, noisy
+#   paper at 200 DPI) and "scan_hires" (the same at 400 DPI).
+# - Lines are either PHI lines (patient name, NRIC, MCR, phone,
+#   email, address, date of birth, medical ID) or clinical filler
+#   with no PHI. 'phi_density' is the share of PHI lines.
+# - Every document comes with its ground truth: one entry per PHI
+#   value with its category, and for PDF/PNG pages its box in
+#   points (txt/docx boxes are found on the rasterized lines).
+# - All values are made up; NRICs get a valid check letter so they
+#   look like the real thing.
+#
+# Usage (from the backend folder), to look at a corpus:
+#   python -m benchmarks.synthetic_docs --out /tmp/phi_corpus
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import os
+import random
+from io import BytesIO
+
+import docx
+import fitz  # PyMuPDF
+import numpy as np
+
+from benchmarks.page_stages import A4_POINTS, DPI
+
+FORMATS = ["txt", "docx", "pdf", "pdf_scan", "png", "scan_noisy", "scan_hires"]
+HIRES_DPI = 400
+LINES_PER_PAGE = 40
+FONT_SIZE = 10
+LINE_STEP = 18
+MARGIN = 40
+
+FIRST_NAMES = ["Wei Ming", "Sarah", "Muhammad Hafiz", "Priya", "Jun Jie", "Nurul Aisyah",
+               "Rajesh", "Mei Ling", "Daniel", "Siti Rahmah", "Arjun", "Hui Min"]
+LAST_NAMES = ["Tan", "Lim", "Lee", "Ng", "Wong", "Rahman", "Nair", "Chua", "Goh", "Kumar",
+              "Ong", "Teo"]
+STREETS = ["Ang Mo Kio Avenue 3", "Bedok North Road", "Jurong West Street 42",
+           "Tampines Street 21", "Clementi Avenue 2", "Yishun Ring Road", "Toa Payoh Lorong 1"]
+EMAIL_DOMAINS = ["mail.example.sg", "example.com", "inbox.example.org"]
+FILLER = [
+    "Blood pressure 120/80 mmHg, pulse regular, afebrile.",
+    "Presented with two days of cough and mild shortness of breath.",
+    "Chest clear on auscultation, no added sounds.",
+    "Full blood count and renal panel within normal limits.",
+    "Continue current medication and review in four weeks.",
+    "Advised on fluid intake, rest and when to return.",
+    "No known drug allergies documented at this visit.",
+    "Wound clean and dry, dressing changed today.",
+    "Plan discussed and agreed with the family.",
+    "ECG shows sinus rhythm without acute changes."
+]
+
+
+# --- 1. FAKE VALUES ---
+
+def fake_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def fake_nric(rng):
+    """S/T + 7 digits + the check letter the real scheme would give."""
+    prefix = rng.choice("ST")
+    digits = [rng.randint(0, 9) for _ in range(7)]
+    total = sum(d * w for d, w in zip(digits, [2, 7, 6, 5, 4, 3, 2])) + (4 if prefix == "T" else 0)
+    return prefix + "".join(map(str, digits)) + "JZIHGFEDCBA"[total % 11]
+
+
+def fake_mcr(rng):
+    return f"{rng.randint(10000, 99999):06d}"
+
+
+def fake_phone(rng):
+    return f"{rng.choice('689')}{rng.randint(0, 999):03d} {rng.randint(0, 9999):04d}"
+
+
+def fake_email(rng, name):
+    user = name.lower().replace(" ", ".")
+    return f"{user}{rng.randint(1, 99)}@{rng.choice(EMAIL_DOMAINS)}"
+
+
+def fake_address(rng):
+    return (f"Blk {rng.randint(1, 999)} {rng.choice(STREETS)} #{rng.randint(2, 20):02d}-"
+            f"{rng.randint(1, 999):03d} Singapore {rng.randint(100000, 829999)}")
+
+
+def fake_date(rng):
+    return f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1940, 2015)}"
+
+
+def fake_medical_id(rng):
+    return f"{rng.choice('ABCDEFGHJK')}{rng.choice('ABCDEFGHJK')}{rng.randint(0, 999999):06d}"
+
+
+def phi_line(rng):
+    """One PHI line: (text, [(category, value), ...])."""
+    kind = rng.randrange(8)
+    if kind == 0:
+        name = fake_name(rng)
+        return f"Patient Name: {name}", [("PERSON", name)]
+    if kind == 1:
+        nric = fake_nric(rng)
+        return f"NRIC: {nric}", [("NRIC/FIN", nric)]
+    if kind == 2:
+        name, mcr = fake_name(rng), fake_mcr(rng)
+        return f"Attending: Dr {name}   MCR: {mcr}", [("PERSON", name), ("MCR no.", mcr)]
+    if kind == 3:
+        phone = fake_phone(rng)
+        return f"Tel: {phone}", [("PHONE", phone)]
+    if kind == 4:
+        email = fake_email(rng, fake_name(rng))
+        return f"Contact email {email}", [("EMAIL", email)]
+    if kind == 5:
+        address = fake_address(rng)
+        return f"Address: {address}", [("ADDRESS", address)]
+    if kind == 6:
+        date = fake_date(rng)
+        return f"Date of birth: {date}", [("DATE", date)]
+    medical_id = fake_medical_id(rng)
+    return f"Med. number ID {medical_id}", [("ID_NUMBER", medical_id)]
+
+
+def page_lines(rng, phi_density):
+    """LINES_PER_PAGE lines of (text, [(category, value), ...])."""
+    return [phi_line(rng) if rng.random() < phi_density else (rng.choice(FILLER), [])
+            for _ in range(LINES_PER_PAGE)]
+
+
+# --- 2. FILES ---
+
+def _text_pdf(pages):
+    """A text-layer PDF of the pages' lines, plus the truth with boxes in points."""
+    doc = fitz.open()
+    truth = []
+    for page_number, lines in enumerate(pages):
+        page = doc.new_page(width=A4_POINTS[0], height=A4_POINTS[1])
+        for line_number, (text, values) in enumerate(lines):
+            y = MARGIN + line_number * LINE_STEP
+            page.insert_text((MARGIN, y), text, fontsize=FONT_SIZE)
+            for (category, value) in values:
+                x0 = MARGIN + fitz.get_text_length(text[:text.index(value)], fontsize=FONT_SIZE)
+                x1 = x0 + fitz.get_text_length(value, fontsize=FONT_SIZE)
+                # Box around the ink: cap height above the baseline, descenders below
+                box = [round(x0, 2), round(y - FONT_SIZE * 0.8, 2), round(x1, 2),
+                       round(y + FONT_SIZE * 0.25, 2)]
+                truth.append({"page": page_number, "category": category, "value": value, "box": box})
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data, truth
+
+
+def _scanned_pdf(text_pdf_bytes):
+    """The same pages as images only (no text layer), like a scanner output."""
+    output = fitz.open()
+    with fitz.open(stream=text_pdf_bytes, filetype="pdf") as doc:
+        for page in doc:
+            pix = page.get_pixmap(dpi=DPI, colorspace=fitz.csGRAY)
+            new_page = output.new_page(width=page.rect.width, height=page.rect.height)
+            new_page.insert_image(new_page.rect, pixmap=pix)
+    data = output.tobytes(garbage=3, deflate=True)
+    output.close()
+    return data
+
+
+def _png(text_pdf_bytes):
+    with fitz.open(stream=text_pdf_bytes, filetype="pdf") as doc:
+        pix = doc.load_page(0).get_pixmap(dpi=DPI)
+        pix.set_dpi(DPI, DPI)
+        return pix.tobytes("png")
+
+
+def _noisy_scan(text_pdf_bytes, dpi, seed):
+    """Page 1 as a poor scan: grey paper, darker towards one side, noise."""
+    rng = np.random.default_rng(seed)
+    with fitz.open(stream=text_pdf_bytes, filetype="pdf") as doc:
+        pix = doc.load_page(0).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    ink = 1 - np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width) / 255.0
+    paper = np.linspace(225, 150, pix.width)[None, :]
+    scan = paper * (1 - 0.75 * ink) + rng.normal(0, 14, ink.shape)
+    scan = scan.clip(0, 255).astype(np.uint8)
+    noisy = fitz.Pixmap(fitz.csGRAY, pix.width, pix.height, scan.tobytes(), False)
+    noisy.set_dpi(dpi, dpi)
+    return noisy.tobytes("png")
+
+
+def _docx(texts):
+    document = docx.Document()
+    for text in texts:
+        document.add_paragraph(text)
+    output_stream = BytesIO()
+    document.save(output_stream)
+    return output_stream.getvalue()
+
+
+def make_document(rng, file_format, page_count, phi_density):
+    """
+    One synthetic document. Returns {"name", "format", "pages",
+    "bytes", "truth"}; txt/docx are a single (tall) page and their
+    truth has no boxes.
+    """
+    if file_format in ("txt", "docx", "png", "scan_noisy", "scan_hires"):
+        page_count = 1
+    pages = [page_lines(rng, phi_density) for _ in range(page_count)]
+
+    if file_format in ("txt", "docx"):
+        texts = [text for lines in pages for (text, _) in lines]
+        data = "\n".join(texts).encode("utf-8") if file_format == "txt" else _docx(texts)
+        truth = [{"page": 0, "category": category, "value": value, "box": None}
+                 for lines in pages for (_, values) in lines for (category, value) in values]
+    else:
+        data, truth = _text_pdf(pages)
+        if file_format == "pdf_scan":
+            data = _scanned_pdf(data)
+        elif file_format == "png":
+            data = _png(data)
+        elif file_format in ("scan_noisy", "scan_hires"):
+            data = _noisy_scan(data, HIRES_DPI if file_format == "scan_hires" else DPI,
+                               rng.randrange(2 ** 32))
+
+    extension = {"pdf_scan": "pdf", "scan_noisy": "png", "scan_hires": "png"}.get(file_format, file_format)
+    return {
+        "name": f"{file_format}_{page_count}p_{rng.randrange(16 ** 6):06x}.{extension}",
+        "format": file_format,
+        "pages": page_count,
+        "bytes": data,
+        "truth": truth
+    }
+
+
+def build_corpus(seed=0, docs_per_format=2, formats=None, page_counts=(1, 3), phi_density=0.5):
+    """'docs_per_format' documents of each format, cycling through 'page_counts'."""
+    rng = random.Random(seed)
+    return [
+        make_document(rng, file_format, page_counts[i % len(page_counts)], phi_density)
+        for file_format in (formats or FORMATS)
+        for i in range(docs_per_format)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes a synthetic PHI corpus with its ground truth.")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--docs-per-format", type=int, default=2)
+    parser.add_argument("--pages", default="1,3")
+    parser.add_argument("--phi-density", type=float, default=0.5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.seed, args.docs_per_format,
+                          page_counts=[int(count) for count in args.pages.split(",")],
+                          phi_density=args.phi_density)
+    os.makedirs(args.out, exist_ok=True)
+    for document in corpus:
+        with open(os.path.join(args.out, document["name"]), "wb") as f:
+            f.write(document["bytes"])
+    with open(os.path.join(args.out, "truth.json"), "w") as f:
+        json.dump({document["name"]: document["truth"] for document in corpus}, f, indent=2)
+    print(f"Wrote {len(corpus)} documents and truth.json to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
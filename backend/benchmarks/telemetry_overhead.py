@@ -0,0 +1,70 @@
+# -----------------------------------------------------------------
+# benchmarks/telemetry_overhead.py
+#
+# Cost of the timing spans (telemetry.py):
+# - ns per empty span(), with metrics on and off (REDACT_METRICS=0),
+#   inside a request context like the API runs them.
+# - The redact + encode loop of a synthetic 200-DPI form page
+#   (both stages are traced), with metrics on and off.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.telemetry_overhead [--spans 200000] [--pages 20]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import time
+
+import telemetry
+from benchmarks.output_encoding import form_page
+from benchmarks.page_stages import synthetic_entities, DPI
+from encoder import encode_page_pdf
+from engine import redact_image_with_labels
+from telemetry import METRICS, request_context, span
+
+
+def span_ns(count):
+    with request_context("bench", log_summary=False):
+        start = time.perf_counter_ns()
+        for _ in range(count):
+            with span("bench"):
+                pass
+        return (time.perf_counter_ns() - start) / count
+
+
+def page_loop_seconds(page, entities, pages):
+    with request_context("bench", log_summary=False):
+        start = time.perf_counter()
+        for _ in range(pages):
+            redacted = redact_image_with_labels(page, entities)
+            encode_page_pdf(redacted, DPI)
+        return time.perf_counter() - start
+
+
+def best_of(fn, repeat):
+    return min(fn() for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of the telemetry spans.")
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    page = form_page()
+    entities = synthetic_entities(20)
+    report = {"spans": args.spans, "pages": args.pages, "dpi": DPI}
+    for enabled in (False, True):
+        telemetry.METRICS_ENABLED = enabled
+        key = "on" if enabled else "off"
+        report[f"span_ns_{key}"] = round(best_of(lambda: span_ns(args.spans), args.repeat), 1)
+        seconds = best_of(lambda: page_loop_seconds(page, entities, args.pages), args.repeat)
+        report[f"page_ms_{key}"] = round(seconds / args.pages * 1000, 3)
+    report["page_overhead_pct"] = round((report["page_ms_on"] / report["page_ms_off"] - 1) * 100, 2)
+    METRICS.reset()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -----------------------------------------------------------------
+# benchmarks/upload_spooling.py
+#
+# Peak memory of rendering a large scanned PDF page by page, with
+# the upload held in memory ("bytes", the old file.read() path)
+# or spooled to disk ("spooled", uploads.SpooledUpload).
+# - The PDF is --pages pages of noisy grey scans (incompressible,
+#   like real scans), written to a temp file and wiped afterwards.
+# - Each mode runs in its own process so peak RSS is fair.
+#
+# Usage (from the backend folder):
+#   python -m benchmarks.upload_spooling [--pages 60]
+# -----------------------------------------------------------------
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from benchmarks.page_stages import A4_POINTS, DPI, current_rss_mb
+
+
+def build_scanned_pdf(path, pages):
+    """'pages' A4 pages, each one noisy 150-DPI grey JPEG."""
+    rng = np.random.default_rng(0)
+    width, height = round(A4_POINTS[0] * 150 / 72), round(A4_POINTS[1] * 150 / 72)
+    doc = fitz.open()
+    for _ in range(pages):
+        scan = rng.normal(200, 40, (height, width)).clip(0, 255).astype(np.uint8)
+        pix = fitz.Pixmap(fitz.csGRAY, width, height, scan.tobytes(), False)
+        page = doc.new_page(width=A4_POINTS[0], height=A4_POINTS[1])
+        page.insert_image(page.rect, stream=pix.tobytes("jpg", jpg_quality=90))
+    doc.save(path)
+    doc.close()
+
+
+def run_mode(mode, path):
+    """Renders every page of 'path' in this process and returns the report."""
+    from image_converter import iter_pdf_pages
+    from uploads import SpooledUpload
+
+    baseline_rss = current_rss_mb()
+    start = time.perf_counter()
+    if mode == "bytes":
+        with open(path, "rb") as f:
+            source = f.read()
+    else:
+        source = SpooledUpload(path)
+    pages = sum(1 for _ in iter_pdf_pages(source, dpi=DPI, use_text_layer=False))
+    return {
+        "mode": mode,
+        "pages": pages,
+        "seconds": round(time.perf_counter() - start, 2),
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS: upload in memory vs spooled to disk.")
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--mode", choices=["bytes", "spooled"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.path)))
+        return
+
+    from uploads import wipe_file
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        path = f.name
+    try:
+        build_scanned_pdf(path, args.pages)
+        with open(path, "rb") as f:
+            file_mb = len(f.read()) / (1024 * 1024)
+        reports = []
+        for mode in ["bytes", "spooled"]:
+            cmd = [sys.executable, "-m", "benchmarks.upload_spooling", "--mode", mode, "--path", path]
+            output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            reports.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        wipe_file(path)
+
+    print(json.dumps({"dpi": DPI, "file_mb": round(file_mb, 1), "results": reports}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
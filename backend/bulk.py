@@ -0,0 +1,341 @@
+# -----------------------------------------------------------------
+# bulk.py
+#
+# Command-line bulk redactor for back-file conversions.
+# - Walks an input folder tree and redacts every supported file
+#   into the same relative path under the output folder
+#   ('scans/a.png' -> 'scans/a.pdf').
+# - Files run in parallel on prefork workers (workers.py). The
+#   models are loaded once and shared by every worker. Input files
+#   reach the workers as paths (uploads.SpooledUpload), so the
+#   parent never reads them whole.
+# - Every finished file is appended to manifest.jsonl in the output
+#   folder, keyed by the SHA-256 of its content and a hash of the
+#   settings. A re-run skips files already done with the same
+#   settings, so an interrupted run picks up where it stopped.
+#   Identical files found under other names are copied, not redone.
+# - Outputs are written to a temp name and renamed into place, so a
+#   crash never leaves a half-written file behind.
+# - Prints files/s, MB/s and an ETA every --progress-every seconds.
+#
+# Usage (from the backend folder):
+#   python bulk.py INPUT_DIR OUTPUT_DIR [--workers 4]
+#       [--categories PERSON,NRIC/FIN] [--first-page-only]
+#       [--output-format pdf|document]
+# -----------------------------------------------------------------
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+from batch import SUPPORTED_EXTENSIONS
+from engine import ALL_CATEGORIES
+from telemetry import get_logger, request_context
+from uploads import SpooledUpload
+from workers import PREFORK_WORKERS, WorkerPool
+
+MANIFEST_NAME = "manifest.jsonl"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+log = get_logger("bulk")
+
+
+# --- 1. INPUT TREE ---
+
+def list_input_files(input_dir, output_dir):
+    """Sorted relative paths of the supported files (skipping the output folder)."""
+    output_dir = os.path.abspath(output_dir)
+    found = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".")
+                         and os.path.abspath(os.path.join(root, d)) != output_dir)
+        for name in sorted(files):
+            if name.startswith(".") or name.rsplit(".", 1)[-1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            found.append(os.path.relpath(os.path.join(root, name), input_dir))
+    return found
+
+
+def output_extension(path, output_format):
+    """Extension of the file redact_file() returns for this input."""
+    ext = path.rsplit(".", 1)[-1].lower()
+    if output_format == "pdf":
+        return "pdf"
+    return "png" if ext in ("png", "jpg", "jpeg") else ext
+
+
+def output_paths(relative_paths, output_format):
+    """
+    {input relative path: output relative path}. 'a.png' becomes
+    'a.pdf', unless another input in that folder would get the same
+    name; then the one whose extension changes keeps it ('a.png.pdf').
+    Only depends on the file list, so re-runs pick the same names.
+    """
+    def plain(path):
+        return f"{path.rsplit('.', 1)[0]}.{output_extension(path, output_format)}"
+
+    counts = {}
+    for path in relative_paths:
+        counts[plain(path)] = counts.get(plain(path), 0) + 1
+    outputs = {}
+    for path in relative_paths:
+        name = plain(path)
+        if counts[name] > 1 and name != path:
+            name = f"{path}.{output_extension(path, output_format)}"
+        outputs[path] = name
+    return outputs
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# --- 2. MANIFEST ---
+
+def settings_id(categories, all_pages, output_format):
+    """Short hash of everything that changes the output of a file."""
+    settings = json.dumps({"categories": sorted(categories), "all_pages": all_pages,
+                           "output_format": output_format}, sort_keys=True)
+    return hashlib.sha256(settings.encode()).hexdigest()[:12]
+
+
+class Manifest:
+    """
+    manifest.jsonl: one JSON line per finished file. Lines are
+    appended and fsynced as files finish, so it survives a crash.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {}   # (sha256, settings) -> entry
+        self.outputs = set()   # (sha256, settings, output) already written
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line cut short by a crash
+                        continue
+                    self._remember(entry)
+        self._file = open(path, "a")
+
+    def _remember(self, entry):
+        if entry.get("status") in ("done", "copied"):
+            self.done[(entry["sha256"], entry["settings"])] = entry
+            self.outputs.add((entry["sha256"], entry["settings"], entry["output"]))
+
+    def lookup(self, sha256, settings):
+        with self.lock:
+            return self.done.get((sha256, settings))
+
+    def has_output(self, sha256, settings, output):
+        with self.lock:
+            return (sha256, settings, output) in self.outputs
+
+    def append(self, entry):
+        with self.lock:
+            self._remember(entry)
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+# --- 3. ONE FILE ---
+
+def _write_atomically(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.partial"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def redact_one(pool, manifest, input_dir, output_dir, relative_path, output_relative,
+               categories, all_pages, output_format, settings):
+    """
+    Redacts one file unless the manifest already has it.
+    Returns (status, input bytes).
+    """
+    input_path = os.path.join(input_dir, relative_path)
+    output_path = os.path.join(output_dir, output_relative)
+    try:
+        size = os.path.getsize(input_path)
+        sha256 = file_sha256(input_path)
+    except OSError as e:
+        # Gone or unreadable since the folder was listed
+        log.error(f"{relative_path}: {e}")
+        manifest.append({"sha256": None, "settings": settings, "input": relative_path,
+                         "output": output_relative, "status": "failed", "error": str(e), "seconds": 0})
+        return "failed", 0
+
+    if manifest.has_output(sha256, settings, output_relative) and os.path.exists(output_path):
+        return "skipped", size
+    previous = manifest.lookup(sha256, settings)
+    if previous is not None:
+        previous_output = os.path.join(output_dir, previous["output"])
+        if os.path.exists(previous_output):
+            # Same content under another name: reuse its output
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            shutil.copyfile(previous_output, output_path)
+            manifest.append(dict(previous, input=relative_path, output=output_relative,
+                                 status="copied", copied_from=previous["output"], seconds=0))
+            return "copied", size
+
+    entry = {"sha256": sha256, "settings": settings, "input": relative_path,
+             "output": output_relative, "bytes": size}
+    start = time.perf_counter()
+    stats = {}
+    with request_context(sha256[:16], log_summary=False):
+        try:
+            output_bytes, _, _ = pool.redact(
+                SpooledUpload(input_path, size), os.path.basename(relative_path), categories,
+                stats=stats, block=True, all_pages=all_pages, output_format=output_format)
+            _write_atomically(output_path, output_bytes)
+            entry.update(status="done", output_bytes=len(output_bytes),
+                         entities=dict(stats.get("entities", {})))
+        except Exception as e:
+            log.error(f"{relative_path}: {e}")
+            entry.update(status="failed", error=str(e))
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    manifest.append(entry)
+    return entry["status"], size
+
+
+# --- 4. PROGRESS ---
+
+def _duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}h{rest // 60:02d}m" if hours else f"{rest // 60}m{rest % 60:02d}s"
+
+
+class Progress:
+    """Counts per status plus rates over the files processed in this run."""
+
+    def __init__(self, total_files, total_bytes):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.counts = {}
+        self.bytes_seen = 0
+        self.bytes_processed = 0
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def add(self, status, size):
+        with self.lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+            self.bytes_seen += size
+            if status in ("done", "failed"):
+                self.bytes_processed += size
+
+    def line(self):
+        with self.lock:
+            elapsed = max(time.perf_counter() - self.start, 1e-9)
+            seen = sum(self.counts.values())
+            processed = self.counts.get("done", 0) + self.counts.get("failed", 0)
+            # ETA from the byte rate: file sizes vary far more than pages per file
+            byte_rate = self.bytes_processed / elapsed
+            remaining = self.total_bytes - self.bytes_seen
+            eta = _duration(remaining / byte_rate) if byte_rate else "?"
+            counts = ", ".join(f"{status} {count}" for status, count in sorted(self.counts.items()))
+            return (f"[{seen}/{self.total_files}] {counts} | {processed / elapsed:.2f} files/s, "
+                    f"{byte_rate / 2 ** 20:.2f} MB/s | elapsed {_duration(elapsed)}, ETA {eta}")
+
+
+# --- 5. MAIN ---
+
+def run(input_dir, output_dir, workers, categories, all_pages, output_format, progress_every):
+    files = list_input_files(input_dir, output_dir)
+    if not files:
+        print(f"No supported files under {input_dir}.")
+        return 0
+    outputs = output_paths(files, output_format)
+    settings = settings_id(categories, all_pages, output_format)
+    total_bytes = sum(os.path.getsize(os.path.join(input_dir, path)) for path in files)
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    print(f"{len(files)} files ({total_bytes / 2 ** 20:.1f} MB), "
+          f"{len(manifest.done)} already in the manifest.")
+
+    pool = WorkerPool(workers=workers)
+    pool.start()
+    if not pool.ready():
+        manifest.close()
+        print(f"No worker could start: {pool.health()}")
+        return 1
+
+    progress = Progress(len(files), total_bytes)
+    stop = threading.Event()
+
+    def report():
+        while not stop.wait(progress_every):
+            print(progress.line(), flush=True)
+
+    reporter = threading.Thread(target=report, name="bulk-progress", daemon=True)
+    reporter.start()
+
+    pending = iter(files)
+    pending_lock = threading.Lock()
+
+    def feed_worker():
+        # One thread per worker process; each only waits on its worker
+        while not stop.is_set():
+            with pending_lock:
+                path = next(pending, None)
+            if path is None:
+                return
+            status, size = redact_one(pool, manifest, input_dir, output_dir, path, outputs[path],
+                                      categories, all_pages, output_format, settings)
+            progress.add(status, size)
+
+    feeders = [threading.Thread(target=feed_worker, name=f"bulk-feed-{i}") for i in range(pool.workers)]
+    for feeder in feeders:
+        feeder.start()
+    try:
+        for feeder in feeders:
+            feeder.join()
+    except KeyboardInterrupt:
+        print("Interrupted: finishing the files in progress (re-run to resume).")
+        stop.set()
+        for feeder in feeders:
+            feeder.join()
+    finally:
+        stop.set()
+        manifest.close()
+    print(progress.line())
+    return 1 if progress.counts.get("failed") else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redacts every file under a folder into a mirrored output folder.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--workers", type=int, default=PREFORK_WORKERS)
+    parser.add_argument("--categories", default=",".join(ALL_CATEGORIES),
+                        help="comma-separated (default: all)")
+    parser.add_argument("--first-page-only", action="store_true", help="PDFs: redact page 1 only")
+    parser.add_argument("--output-format", choices=["pdf", "document"], default="pdf")
+    parser.add_argument("--progress-every", type=float, default=10, help="seconds")
+    args = parser.parse_args()
+
+    sys.exit(run(args.input_dir, args.output_dir, args.workers, args.categories.split(","),
+                 not args.first_page_only, args.output_format, args.progress_every))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# -----------------------------------------------------------------
+# cache.py
+#
+# Content-addressed cache for OCR lines and raw entity spans.
+# - Key: hash of the page pixels (or text) + the OCR/NER settings.
+# - Value: the OCR lines and the findings for ALL categories, so
+#   changing the category selection never re-runs the models
+#   (filtering happens after the lookup).
+# - Tier 1: bounded in-memory LRU.
+# - Tier 2 (optional): a folder of JSON files with size-based
+#   eviction (least recently used first). Off by default because
+#   the cached text is PHI; point REDACT_CACHE_DIR at an
+#   encrypted, access-controlled volume if you turn it on.
+# -----------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from telemetry import CACHE_LOOKUPS
+
+CACHE_MAX_ENTRIES = int(os.environ.get("REDACT_CACHE_ENTRIES", 256))
+CACHE_DIR = os.environ.get("REDACT_CACHE_DIR") or None
+CACHE_DISK_MAX_BYTES = int(os.environ.get("REDACT_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+
+
+def cache_key(content, params):
+    """
+    Builds a cache key from the page content (NumPy array, bytes
+    or str) and a dict of the settings that change the result.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    if hasattr(content, "tobytes"):
+        digest.update(str((content.shape, str(content.dtype))).encode())
+        digest.update(memoryview(content).cast("B") if content.flags["C_CONTIGUOUS"]
+                      else content.tobytes())
+    elif isinstance(content, str):
+        digest.update(content.encode("utf-8"))
+    else:
+        digest.update(content)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def to_jsonable_ocr(ocr_results):
+    """EasyOCR returns NumPy numbers; make them plain floats/strings."""
+    return [
+        ([[float(x), float(y)] for (x, y) in coords] if coords is not None else None,
+         str(text), float(conf))
+        for (coords, text, conf) in ocr_results
+    ]
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache with hit/miss counters."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, disk_dir=CACHE_DIR,
+                 disk_max_bytes=CACHE_DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk_bytes = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, mode=0o700, exist_ok=True)
+            self._disk_bytes = sum(size for (_, _, size) in self._disk_files())
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or bool(self.disk_dir)
+
+    # --- memory tier ---
+
+    def get(self, key):
+        """Returns the cached value or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                CACHE_LOOKUPS.inc(result="memory_hit")
+                return self._memory[key]
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self.disk_hits += 1
+            CACHE_LOOKUPS.inc(result="disk_hit")
+        self._memory_put(key, value)
+        return value
+
+    def contains(self, key):
+        """True if 'key' is cached (doesn't count as a hit or miss)."""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return bool(self.disk_dir) and os.path.exists(self._disk_path(key))
+
+    def put(self, key, value):
+        """Stores a JSON-serializable value in both tiers."""
+        self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def _memory_put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    # --- disk tier ---
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_files(self):
+        """[(path, last_used, size), ...] for every cached file."""
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.disk_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((path, stat.st_mtime, stat.st_size))
+        return files
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # mark as recently used
+            return value
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir:
+            return
+        data = json.dumps(value).encode("utf-8")
+        if len(data) > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._disk_bytes += len(data) - old_size
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Deletes least recently used files until under the size limit."""
+        files = sorted(self._disk_files(), key=lambda f: f[1])
+        total = sum(size for (_, _, size) in files)
+        for (path, _, size) in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._disk_bytes = total
+
+    # --- counters ---
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes
+            }
+
+
+# One cache per process, shared by all pipeline threads
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,172 @@
+# -----------------------------------------------------------------
+# document_redactor.py
+#
+# Redacts DOCX and TXT files directly from their text,
+# without drawing them to an image and reading them back.
+# - Returns a redacted DOCX/TXT that keeps the original
+#   paragraphs, runs and formatting.
+# - In a DOCX, body paragraphs, tables (nested too), text boxes
+#   and every header/footer are redacted, and the author, title
+#   and other core properties are cleared.
+# - Each finding is replaced by its label, e.g. "<PERSON>".
+# -----------------------------------------------------------------
+
+import docx
+from collections import Counter
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+from io import BytesIO
+
+from engine import find_line_findings
+from models import MODELS
+
+
+# --- 1. HELPERS ---
+
+def _merge_spans(findings):
+    """
+    Sorts findings by position and merges overlapping ones.
+    Returns [(start_char, end_char, label), ...] with no overlaps.
+    The earliest finding's label wins.
+    """
+    merged = []
+    for finding in sorted(findings, key=lambda f: (f["start_char"], -f["end_char"])):
+        start, end, label = finding["start_char"], finding["end_char"], finding["label"]
+        if merged and start < merged[-1][1]:
+            prev_start, prev_end, prev_label = merged[-1]
+            merged[-1] = (prev_start, max(prev_end, end), prev_label)
+        else:
+            merged.append((start, end, label))
+    return merged
+
+def redact_run_texts(run_texts, spans):
+    """
+    Replaces every span in a paragraph that is split into runs.
+    The label goes into the run where the span starts; the rest of
+    the span is removed from whichever runs it covers.
+    """
+    new_texts = []
+    run_start = 0
+    for text in run_texts:
+        run_end = run_start + len(text)
+        pieces = []
+        pos = run_start
+        for (start, end, label) in spans:
+            if end <= run_start or start >= run_end:
+                continue
+            if start > pos:
+                pieces.append(text[pos - run_start:start - run_start])
+            if start >= run_start:
+                pieces.append(label)
+            pos = max(pos, min(end, run_end))
+        pieces.append(text[pos - run_start:])
+        new_texts.append("".join(pieces))
+        run_start = run_end
+    return new_texts
+
+def find_paragraph_spans(paragraphs, categories_to_find, stats=None):
+    """
+    Runs detection over every line of every paragraph.
+    Returns one merged span list per paragraph, in paragraph offsets.
+    If 'stats' is given, its "entities" Counter is updated per label.
+    """
+    lines = []        # "OCR results" for the engine (no coordinates)
+    line_origin = []  # (paragraph_index, char_offset) for each line
+    for para_index, para_text in enumerate(paragraphs):
+        offset = 0
+        for line_text in para_text.split("\n"):
+            if line_text.strip():
+                lines.append((None, line_text, 1.0))
+                line_origin.append((para_index, offset))
+            offset += len(line_text) + 1
+
+    findings_per_para = [[] for _ in paragraphs]
+    if lines and MODELS.get("ner") is None:
+        raise Exception("NLP model not available.")
+    if lines:
+        findings_per_line = find_line_findings(lines, categories_to_find)
+        for (para_index, offset), findings in zip(line_origin, findings_per_line):
+            for finding in findings:
+                findings_per_para[para_index].append({
+                    "start_char": finding["start_char"] + offset,
+                    "end_char": finding["end_char"] + offset,
+                    "label": finding["label"]
+                })
+
+    if stats is not None:
+        stats.setdefault("entities", Counter()).update(
+            finding["label"] for findings in findings_per_para for finding in findings)
+
+    return [_merge_spans(findings) for findings in findings_per_para]
+
+
+# --- 2. DOCX & TXT OUTPUT ---
+
+# Core properties that can name the author, patient or case
+DOCX_TEXT_PROPERTIES = [
+    "author", "category", "comments", "content_status", "identifier",
+    "keywords", "language", "last_modified_by", "subject", "title", "version"
+]
+
+def docx_paragraphs(doc):
+    """
+    Every paragraph of a DOCX that can hold text: the body, table
+    cells (nested tables too), text boxes, and all headers and
+    footers (default, first-page and even-page, of every section).
+    """
+    parts = [doc.part]
+    for rel in doc.part.rels.values():
+        if rel.reltype in (RT.HEADER, RT.FOOTER) and not rel.is_external:
+            parts.append(rel.target_part)
+    # Walking the XML finds paragraphs at any depth
+    return [
+        Paragraph(p, part)
+        for part in parts
+        for p in part.element.iter(qn("w:p"))
+    ]
+
+def redact_docx_bytes(file_bytes, categories_to_find, stats=None):
+    """Returns a redacted copy of a DOCX, keeping its structure."""
+    doc = docx.Document(BytesIO(file_bytes))
+    paragraphs = docx_paragraphs(doc)
+    spans_per_para = find_paragraph_spans([p.text for p in paragraphs], categories_to_find, stats)
+
+    for para, spans in zip(paragraphs, spans_per_para):
+        if not spans:
+            continue
+        runs = para.runs
+        run_texts = [run.text for run in runs]
+        if "".join(run_texts) == para.text:
+            for run, new_text in zip(runs, redact_run_texts(run_texts, spans)):
+                if new_text != run.text:
+                    run.text = new_text
+        else:
+            # Text outside plain runs (e.g. hyperlinks): rewrite the
+            # whole paragraph so nothing is left behind.
+            para.text = redact_run_texts([para.text], spans)[0]
+
+    for name in DOCX_TEXT_PROPERTIES:
+        setattr(doc.core_properties, name, "")
+
+    output_stream = BytesIO()
+    doc.save(output_stream)
+    return output_stream.getvalue()
+
+def redact_txt_bytes(file_bytes, categories_to_find, stats=None):
+    """Returns a redacted copy of a UTF-8 text file, line for line."""
+    lines = file_bytes.decode("utf-8").split("\n")
+    spans_per_line = find_paragraph_spans(lines, categories_to_find, stats)
+    redacted = [
+        redact_run_texts([line], spans)[0] if spans else line
+        for line, spans in zip(lines, spans_per_line)
+    ]
+    return "\n".join(redacted).encode("utf-8")
+
+def redact_text_document(file_bytes, file_type, categories_to_find, stats=None):
+    """Redacts a DOCX or TXT file and returns it in the same format."""
+    if file_type == "docx":
+        return redact_docx_bytes(file_bytes, categories_to_find, stats)
+    elif file_type == "txt":
+        return redact_txt_bytes(file_bytes, categories_to_find, stats)
+    raise Exception(f"Unsupported file type for document output: {file_type}")
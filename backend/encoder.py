@@ -0,0 +1,126 @@
+# -----------------------------------------------------------------
+# encoder.py
+#
+# Output encoding of redacted pages (the stage after
+# engine.redact_image_with_labels).
+# - "bilevel": mostly black-and-white pages (scanned forms, text
+#   files) are thresholded to 1 bit and stored with CCITT G4
+#   compression, or as a 1-bit Flate image if Pillow was built
+#   without libtiff.
+# - "jpeg": photos and grey/colour scans, at JPEG_QUALITY.
+# - "flate": lossless, for when JPEG artefacts are not acceptable.
+# - "auto" (default) picks bilevel or jpeg per page from a sample
+#   of its pixels. Red labels count as ink (they print black).
+# - PNG outputs (redacted images returned as images) use
+#   PNG_COMPRESS_LEVEL.
+# -----------------------------------------------------------------
+
+import os
+from io import BytesIO
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image, features
+
+from telemetry import get_logger, traced
+
+# "auto", "bilevel", "jpeg" or "flate"
+OUTPUT_ENCODING = os.environ.get("REDACT_OUTPUT_ENCODING", "auto")
+OUTPUT_ENCODINGS = ("auto", "bilevel", "jpeg", "flate")
+JPEG_QUALITY = int(os.environ.get("REDACT_JPEG_QUALITY", 75))
+# 0 (fastest, largest) .. 9 (slowest, smallest)
+PNG_COMPRESS_LEVEL = int(os.environ.get("REDACT_PNG_COMPRESS_LEVEL", 6))
+
+# A page is bilevel if this share of its pixels is near black or
+# near white and almost none are coloured (labels aside)
+BILEVEL_MIN_SHARE = float(os.environ.get("REDACT_BILEVEL_MIN_SHARE", 0.95))
+BILEVEL_MAX_COLOUR_SHARE = 0.02
+# Grey level splitting ink from paper when going to 1 bit
+BILEVEL_CUTOFF = 160
+
+HAS_LIBTIFF = features.check("libtiff")
+
+if OUTPUT_ENCODING not in OUTPUT_ENCODINGS:
+    get_logger("encoder").warning(f"Unknown REDACT_OUTPUT_ENCODING '{OUTPUT_ENCODING}', using 'auto'.")
+    OUTPUT_ENCODING = "auto"
+
+
+# --- 1. CHOOSING AN ENCODING ---
+
+def page_tone_shares(pixels):
+    """
+    Shares of near-black/near-white pixels and of coloured pixels in
+    an RGB array, measured on every 4th pixel in each direction.
+    """
+    sample = pixels[::4, ::4]
+    gray = cv2.cvtColor(np.ascontiguousarray(sample), cv2.COLOR_RGB2GRAY)
+    extreme = np.count_nonzero((gray <= 64) | (gray >= 192))
+    spread = sample.max(axis=2).astype(np.int16) - sample.min(axis=2)
+    coloured = np.count_nonzero(spread > 48)
+    return extreme / gray.size, coloured / gray.size
+
+
+def choose_encoding(pixels, encoding=None):
+    """Resolves "auto" (or None) to "bilevel" or "jpeg" for this page."""
+    encoding = encoding or OUTPUT_ENCODING
+    if encoding != "auto":
+        return encoding
+    extreme_share, colour_share = page_tone_shares(pixels)
+    if extreme_share >= BILEVEL_MIN_SHARE and colour_share <= BILEVEL_MAX_COLOUR_SHARE:
+        return "bilevel"
+    return "jpeg"
+
+
+# --- 2. ENCODERS ---
+
+def to_bilevel(pixels):
+    """RGB array -> 1-bit PIL image (ink black, paper white)."""
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    return Image.fromarray(gray >= BILEVEL_CUTOFF)
+
+
+def _flate_pdf(image, dpi):
+    """Single-page PDF holding 'image' losslessly (Flate)."""
+    png_stream = BytesIO()
+    # MuPDF re-compresses the pixels anyway: keep the PNG step cheap
+    image.save(png_stream, format="PNG", compress_level=1)
+    width, height = image.size
+    with fitz.open() as pdf_document:
+        page = pdf_document.new_page(width=width * 72.0 / dpi, height=height * 72.0 / dpi)
+        page.insert_image(page.rect, stream=png_stream.getvalue())
+        return pdf_document.tobytes(garbage=3, deflate=True)
+
+
+@traced("export")
+def encode_page_pdf(pixels, dpi=200, encoding=None, jpeg_quality=None):
+    """
+    Encodes a redacted page (RGB NumPy array) as a single-page PDF.
+    Returns (pdf_bytes, encoding used).
+    """
+    encoding = choose_encoding(pixels, encoding)
+    output_stream = BytesIO()
+
+    if encoding == "bilevel":
+        bitonal = to_bilevel(pixels)
+        if not HAS_LIBTIFF:
+            return _flate_pdf(bitonal, dpi), encoding
+        # Pillow stores mode "1" images with CCITT G4 when it has libtiff
+        bitonal.save(output_stream, format="PDF", resolution=dpi)
+    elif encoding == "flate":
+        return _flate_pdf(Image.fromarray(pixels), dpi), encoding
+    else:
+        Image.fromarray(pixels).save(output_stream, format="PDF", resolution=dpi,
+                                     quality=jpeg_quality or JPEG_QUALITY)
+    return output_stream.getvalue(), encoding
+
+
+@traced("export")
+def encode_png(pixels, dpi=None, compress_level=None):
+    """Encodes a redacted page (RGB NumPy array) as PNG bytes."""
+    output_stream = BytesIO()
+    options = {"compress_level": PNG_COMPRESS_LEVEL if compress_level is None else compress_level}
+    if dpi:
+        options["dpi"] = (dpi, dpi)
+    Image.fromarray(pixels).save(output_stream, format="PNG", **options)
+    return output_stream.getvalue()
@@ -9,10 +9,13 @@
 #   AI_BLOCK_LIST to fix the false positive <PERSON> tags.
 # -----------------------------------------------------------------
 
-import easyocr
-import spacy
-import traceback
 import re
+import os
+import bisect
+import functools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 import cv2 # OpenCV
@@ -28,47 +31,82 @@ except ModuleNotFoundError:
     print("="*50)
     exit()
 
-# --- 1. GLOBAL MODEL LOADING ---
-
-print("Loading EasyOCR model (this may take a moment)...")
-try:
-    OCR_READER = easyocr.Reader(['en'], gpu=False) 
-    print("EasyOCR model loaded successfully.")
-except Exception as e:
-    print(f"Error loading EasyOCR model: {e}")
-    OCR_READER = None
-
-print("Loading spaCy (NLP) model...")
-try:
-    # ✅ Load the transformer model efficiently
-    NLP = spacy.load("en_core_web_trf", exclude=["tagger", "lemmatizer", "textcat", "senter"])
-    print("✅ spaCy transformer model 'en_core_web_trf' loaded successfully.")
-except MemoryError:
-    print("❌ MemoryError: Not enough RAM to load 'en_core_web_trf'.")
-    print("Tip: Close unused programs or switch to 'en_core_web_md' for lighter performance.")
-    NLP = None
-except Exception as e:
-    print("⚠️ Failed to load spaCy transformer model:")
-    traceback.print_exc()
-    NLP = None
+from rules import REDACTION_RULES, RULE_MATCHER
+from gazetteer import GAZETTEER
+
+# --- 1. MODELS ---
+# EasyOCR and spaCy are loaded on first use (or in the background by
+# the API) through the registry in models.py: MODELS.get("ocr"),
+# MODELS.get("ner"), MODELS.get("ner_cascade").
+from models import MODELS
+from encoder import encode_page_pdf, encode_png
+from preprocess import prepare_for_ocr, scale_box
+from tiling import OCR_TILE_WORKERS, merge_tile_boxes, page_tiles
+from telemetry import PREPROCESS_PAGES, get_logger, span, traced
+
+log = get_logger("engine")
+
+
+# --- OCR batching ---
+# Text-box crops of all pages handled together are recognized in
+# batches of this many (see run_ocr_on_images).
+OCR_BATCH_SIZE = int(os.environ.get("REDACT_OCR_BATCH_SIZE", 32))
+
+# --- NER batching ---
+# All eligible OCR lines of a document go through nlp.pipe() in one go
+# instead of one NLP(text) call per line. Both knobs can be tuned per
+# deployment through the environment.
+NER_BATCH_SIZE = int(os.environ.get("REDACT_NER_BATCH_SIZE", 64))
+NER_N_PROCESS = int(os.environ.get("REDACT_NER_N_PROCESS", 1))
+
+# --- NER mode ---
+# "line": every OCR line is its own spaCy doc (see run_ner_on_lines).
+# "page": all lines of a page are joined in reading order into ONE doc,
+#         so names split over a line break or next to "Patient:" keep
+#         their context, and spans are mapped back to the lines
+#         (see run_ner_on_page).
+NER_MODES = ("line", "page")
+NER_MODE = os.environ.get("REDACT_NER_MODE", "line")
+if NER_MODE not in NER_MODES:
+    raise ValueError(f"REDACT_NER_MODE must be one of {NER_MODES}, got {NER_MODE!r}")
+
+# --- NER cascade ---
+# A cheap first stage picks the lines that might hold a PERSON/ORG/GPE
+# entity and only those go to the transformer (see select_ner_lines).
+# "trf":       no cascade, every line goes to the transformer (default).
+# "heuristic": capitalized words that are not on the block lists.
+# "small":     a small spaCy model (NER_CASCADE_MODEL_NAME in models.py,
+#              REDACT_NER_CASCADE_MODEL), loaded on first use.
+# Measure recall on your own documents before turning it on
+# (python -m benchmarks.ner_cascade).
+NER_CASCADES = ("trf", "heuristic", "small")
+NER_CASCADE = os.environ.get("REDACT_NER_CASCADE", "trf")
+if NER_CASCADE not in NER_CASCADES:
+    raise ValueError(f"REDACT_NER_CASCADE must be one of {NER_CASCADES}, got {NER_CASCADE!r}")
+
+
+# --- Redaction rendering ---
+# Boxes are whited out and labelled in red; labels are rendered once
+# per label text and stamped (see redact_image_with_labels).
+LABEL_FONT_SIZE = 18
+LABEL_COLOR = np.array([255, 0, 0], dtype=np.float32)
+# Merge touching boxes of the same label (fewer, larger boxes)
+MERGE_BOXES = os.environ.get("REDACT_MERGE_BOXES", "0") == "1"
+MERGE_GAP_PX = int(os.environ.get("REDACT_MERGE_GAP_PX", 4))
 
 
 # --- 2. GLOBAL REGEX RULES & BLOCK LISTS ---
 
-phone_pattern = r'(\b[689]\d{3}[\s-]?\d{4}\b)|(\+[\d\s\-\(\)]{7,17}\d\b)'
-date_pattern = r'(?i)\b(?:dob|birth)\b[^\dA-Za-z]{0,5}((?:\d{1,2}[./-]\d{1,2}[./-]\d{2,4})|(?:\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s\d{1,2},?\s\d{2,4}\b))'
-
-id_pattern = r'\b(?:[A-Z]{2}\d{6}|\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{3,4})\b'
-
+# Regex rules live in rules.py (declarative, one matcher for all of
+# them). REGEX_RULES keeps the label -> compiled pattern view.
 REGEX_RULES = {
-    "NRIC/FIN": re.compile(r'\b[STFGM]\d{7}[A-Z]\b', re.IGNORECASE),
-    "MCR no.": re.compile(r'\b\d{6}\b'), # Simple pattern, relies on context filter
-    "EMAIL": re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', re.IGNORECASE),
-    "PHONE": re.compile(phone_pattern),
-    "DATE": re.compile(date_pattern, re.IGNORECASE),
-    "ID_NUMBER": re.compile(id_pattern, re.IGNORECASE)
+    rule["label"]: re.compile(rule["pattern"], re.IGNORECASE if rule.get("ignore_case") else 0)
+    for rule in REDACTION_RULES
 }
 
+# Every category the frontend can ask for
+ALL_CATEGORIES = ["PERSON", "ADDRESS"] + list(REGEX_RULES.keys())
+
 # --- THIS IS THE FIX (v24) ---
 AI_BLOCK_LIST = {
     "patient", "patient's", "doctor", "doctor's", "medical", "report",
@@ -79,6 +117,17 @@ AI_BLOCK_LIST = {
 }
 # -----------------------------
 
+# Capitalized words that don't make a line worth the transformer on
+# their own (used by the "heuristic" cascade, on top of AI_BLOCK_LIST)
+CASCADE_COMMON_WORDS = {
+    "the", "a", "an", "of", "and", "or", "to", "in", "on", "at", "for",
+    "with", "by", "from", "is", "was", "no", "yes", "not", "page",
+    "dob", "tel", "phone", "mobile", "email", "id", "ihi", "med",
+    "number", "sex", "male", "female", "diagnosis", "remarks",
+    "january", "february", "march", "july", "august", "september",
+    "october", "november", "december"
+}
+
 ADDRESS_CONTEXT_WORDS = {
     "address:", "hospital", "clinic", "road", "street", "avenue",
     "blvd", "singapore", "block", "unit", "sunnyville", "harmony"
@@ -86,151 +135,494 @@ ADDRESS_CONTEXT_WORDS = {
 
 # --- 3. PRE-PROCESSING FUNCTION ---
 
-def preprocess_image_for_ocr(image_bytes):
+@traced("preprocess")
+def preprocess_image_for_ocr(image, with_profile=False):
     """
-    Takes image bytes, loads them into OpenCV,
+    Takes a page (RGB NumPy array, or PNG bytes for older callers),
     and applies filters to make text clearer for EasyOCR.
     This is ONLY for the OCR, not for the final output.
+    Arrays stay arrays: nothing is re-encoded.
+    The filters depend on the page (see preprocess.py: clean pages
+    are left alone, noisy scans thresholded, huge ones downscaled).
+    with_profile=True returns (image, profile, scale) instead; boxes
+    found on the image must be divided by 'scale'.
     """
+    is_array = isinstance(image, np.ndarray)
     try:
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        # Invert (white-on-dark -> black-on-white)
-        img_inverted = cv2.bitwise_not(img_gray)
-        
-        # Binarize (make it pure B&W)
-        _, img_thresh = cv2.threshold(img_inverted, 127, 255, cv2.THRESH_BINARY)
+        if is_array:
+            pixels = image
+        else:
+            nparr = np.frombuffer(image, np.uint8)
+            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            pixels = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+        # Callers of the bytes form can't scale the boxes back
+        prepared, profile, scale = prepare_for_ocr(pixels, allow_downscale=is_array)
+        PREPROCESS_PAGES.inc(profile=profile)
+
+        if is_array:
+            return (prepared, profile, scale) if with_profile else prepared
         
-        is_success, buffer = cv2.imencode(".png", img_thresh)
+        is_success, buffer = cv2.imencode(".png", prepared if prepared.ndim == 2
+                                          else cv2.cvtColor(prepared, cv2.COLOR_RGB2BGR))
         if is_success:
             return buffer.tobytes()
         else:
-            return image_bytes # Fallback
+            return image # Fallback
     except Exception as e:
-        print(f"OpenCV pre-processing failed: {e}")
-        return image_bytes # Fallback
+        log.warning(f"OpenCV pre-processing failed: {e}")
+        return (image, "failed", 1.0) if with_profile else image # Fallback
 
 # --- 4. CORE FUNCTIONS ---
 
-def run_ocr_on_image(image_bytes):
+def run_ocr_on_image(image, batch_size=None, timings=None):
     """
-    Runs EasyOCR on the provided image bytes to extract text and coordinates.
+    Runs EasyOCR on the provided page (NumPy array or image bytes)
+    to extract text and coordinates.
     It now pre-processes the image first!
     """
-    if OCR_READER is None:
-        print("OCR_READER is not loaded. Cannot run OCR.")
+    results = run_ocr_on_images([image], batch_size, timings)
+    return results[0] if results is not None else None
+
+def _recognition_batches(crops, batch_size):
+    """
+    Groups crops of similar width into batches of 'batch_size'.
+    Every crop in a batch is padded to the widest one, so mixing a
+    short word with a full-width line wastes most of the batch.
+    Yields lists of indexes into 'crops'.
+    """
+    by_width = sorted(range(len(crops)), key=lambda i: crops[i][1].shape[1])
+    for start in range(0, len(by_width), batch_size):
+        yield by_width[start:start + batch_size]
+
+def detect_text_boxes(ocr_reader, img):
+    """
+    CRAFT text detection on one (preprocessed) page. Oversized pages
+    are cut into overlapping tiles (see tiling.py), detected in
+    OCR_TILE_WORKERS threads (torch releases the GIL) and stitched
+    back. Returns (horizontal_list, free_list, tile count).
+    """
+    tiles = page_tiles(img.shape[0], img.shape[1])
+    if len(tiles) == 1:
+        horizontal_list, free_list = ocr_reader.detect(img, reformat=False)
+        return horizontal_list[0], free_list[0], 1
+
+    def detect_tile(tile):
+        tile_img = np.ascontiguousarray(img[tile.y0:tile.y1, tile.x0:tile.x1])
+        horizontal_list, free_list = ocr_reader.detect(tile_img, reformat=False)
+        return tile, horizontal_list[0], free_list[0]
+
+    # At most OCR_TILE_WORKERS tiles are in CRAFT at once: that, not
+    # the page size, bounds the detection memory
+    with ThreadPoolExecutor(max_workers=max(1, min(OCR_TILE_WORKERS, len(tiles)))) as pool:
+        tile_results = list(pool.map(detect_tile, tiles))
+    horizontal_list, free_list = merge_tile_boxes(tile_results)
+    return horizontal_list, free_list, len(tiles)
+
+def run_ocr_on_images(images, batch_size=None, timings=None):
+    """
+    OCR for several pages at once, in two stages:
+    1. text detection (CRAFT) page by page, in tiles for oversized
+       pages (see detect_text_boxes),
+    2. recognition of the text-box crops of ALL pages together, in
+       batches of 'batch_size' (default OCR_BATCH_SIZE) crops of
+       similar width.
+    Returns one readtext()-style list [(box, text, conf), ...] per
+    image, or None if OCR failed. 'timings' (optional dict) gets the
+    seconds spent in "ocr_detect" and "ocr_recognize" added to it.
+    """
+    ocr_reader = MODELS.get("ocr")
+    if ocr_reader is None:
+        log.error("OCR model is not loaded. Cannot run OCR.")
         return None
-        
-    print("Pre-processing image just for EasyOCR...")
-    preprocessed_bytes = preprocess_image_for_ocr(image_bytes)
-    
+    if batch_size is None:
+        batch_size = OCR_BATCH_SIZE
+
     try:
-        # We feed the "ugly" B&W image to EasyOCR
-        results = OCR_READER.readtext(preprocessed_bytes, paragraph=False, detail=1)
-        return results
+        from easyocr import config as easyocr_config
+        from easyocr.recognition import get_text
+        from easyocr.utils import get_image_list, reformat_input
+        model_height = getattr(easyocr_config, "imgH", 64)
+
+        # --- 1. Detection, per page ---
+        start = time.perf_counter()
+        crops = []       # (box, crop) for every text box of every page
+        crop_pages = []  # page index of each crop
+        page_scales = []  # prepared size / page size, per page
+        profiles = {}
+        tile_count = 0
+        for page_index, image in enumerate(images):
+            # We feed the preprocessed image to EasyOCR
+            prepared, profile, scale = preprocess_image_for_ocr(image, with_profile=True)
+            page_scales.append(scale)
+            profiles[profile] = profiles.get(profile, 0) + 1
+            img, img_cv_grey = reformat_input(prepared)
+            with span("ocr_detect"):
+                horizontal_list, free_list, page_tile_count = detect_text_boxes(ocr_reader, img)
+                tile_count += page_tile_count
+                page_crops, _ = get_image_list(horizontal_list, free_list, img_cv_grey,
+                                               model_height=model_height)
+            crops.extend(page_crops)
+            crop_pages.extend([page_index] * len(page_crops))
+        detect_seconds = time.perf_counter() - start
+
+        # --- 2. Recognition, batched across pages ---
+        start = time.perf_counter()
+        ignore_char = "".join(set(ocr_reader.character) - set(ocr_reader.lang_char))
+        recognized = [None] * len(crops)
+        with span("ocr_recognize"):
+            for batch in _recognition_batches(crops, batch_size):
+                batch_crops = [crops[i] for i in batch]
+                max_width = max(crop.shape[1] for (_, crop) in batch_crops)
+                batch_results = get_text(
+                    ocr_reader.character, model_height, int(max_width), ocr_reader.recognizer,
+                    ocr_reader.converter, batch_crops, ignore_char=ignore_char,
+                    batch_size=batch_size, workers=0, device=ocr_reader.device)
+                for i, result in zip(batch, batch_results):
+                    recognized[i] = result
+        recognize_seconds = time.perf_counter() - start
     except Exception as e:
-        print(f"Error during EasyOCR.readtext: {e}")
+        log.exception(f"Error during EasyOCR detection/recognition: {e}")
         return None
 
+    # --- 3. Scatter back to the pages (reading order per page) ---
+    results = [[] for _ in images]
+    for page_index, (box, text, conf) in zip(crop_pages, recognized):
+        if page_scales[page_index] != 1.0:
+            box = scale_box(box, page_scales[page_index])
+        results[page_index].append((box, text, conf))
+
+    log.info("OCR done", extra={"fields": {
+        "pages": len(images), "text_boxes": len(crops), "preprocess": profiles, "tiles": tile_count,
+        "detect_s": round(detect_seconds, 3), "recognize_s": round(recognize_seconds, 3)}})
+    if timings is not None:
+        timings["ocr_detect"] = timings.get("ocr_detect", 0) + detect_seconds
+        timings["ocr_recognize"] = timings.get("ocr_recognize", 0) + recognize_seconds
+    return results
+
 # ---------------------------------------------------------------
 # 🧠 THE "BRAIN" FUNCTION (v20 logic) 🧠
 # ---------------------------------------------------------------
-def find_sensitive_entities(ocr_results, categories_to_find):
+CASCADE_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'\-]*")
+CASCADE_LABELS = {"PERSON", "ORG", "GPE", "LOC", "FAC"}
+
+def line_may_have_entity(text):
     """
-    v20 logic - We now trust the AI *unless* it's in the block list.
+    Cheap check for the "heuristic" cascade: True if the line has an
+    address context word, or a capitalized word that is not a field
+    label ("Name:") and not on AI_BLOCK_LIST / CASCADE_COMMON_WORDS.
     """
-    print(f"Finding sensitive entities for: {categories_to_find}")
-    
-    if NLP is None or not ocr_results:
-        print("NLP model or OCR results not available. Skipping.")
-        return []
+    lower_text = text.lower()
+    if any(word in lower_text for word in ADDRESS_CONTEXT_WORDS):
+        return True
+    for match in CASCADE_WORD_RE.finditer(text):
+        word = match.group()
+        if not word[0].isupper():
+            continue
+        if text[match.end():match.end() + 1] == ":":
+            continue
+        if word.lower() in AI_BLOCK_LIST or word.lower() in CASCADE_COMMON_WORDS:
+            continue
+        return True
+    return False
 
-    entities_to_redact = [] 
+def select_ner_lines(ocr_results, line_indexes, cascade=None, batch_size=None):
+    """
+    First stage of the NER cascade: returns the subset of 'line_indexes'
+    that should go to the transformer. With cascade="trf" (or when the
+    small model can't be loaded) every line is kept.
+    """
+    if cascade is None:
+        cascade = NER_CASCADE
+    if cascade == "heuristic":
+        return [i for i in line_indexes if line_may_have_entity(ocr_results[i][1])]
+    if cascade == "small":
+        small_nlp = MODELS.get("ner_cascade")
+        if small_nlp is not None:
+            texts = (ocr_results[i][1] for i in line_indexes)
+            docs = small_nlp.pipe(texts, batch_size=batch_size or NER_BATCH_SIZE)
+            return [
+                i for i, doc in zip(line_indexes, docs)
+                if any(ent.label_ in CASCADE_LABELS for ent in doc.ents)
+                or any(word in ocr_results[i][1].lower() for word in ADDRESS_CONTEXT_WORDS)
+            ]
+    return list(line_indexes)
+
+def run_ner_on_lines(ocr_results, batch_size=None, n_process=None, cascade=None):
+    """
+    Runs spaCy over every eligible OCR line in one batched nlp.pipe() call.
+    Returns a dict of {line_index: [(label, text, start_char, end_char), ...]}
+    so the caller can map each result back to its line and coordinates.
+    Lines containing "@" are skipped (same rule as before), and so are
+    lines the cascade's first stage rules out (see select_ner_lines).
+    """
+    if batch_size is None:
+        batch_size = NER_BATCH_SIZE
+    if n_process is None:
+        n_process = NER_N_PROCESS
+
+    eligible = [i for i, (_, text, _) in enumerate(ocr_results) if "@" not in text]
+    eligible = select_ner_lines(ocr_results, eligible, cascade, batch_size)
+    entities_by_line = {}
+    if not eligible:
+        return entities_by_line
+
+    texts = (ocr_results[i][1] for i in eligible)
+    docs = MODELS.get("ner").pipe(texts, batch_size=batch_size, n_process=n_process)
+
+    for line_index, doc in zip(eligible, docs):
+        entities_by_line[line_index] = [
+            (ent.label_, ent.text, ent.start_char, ent.end_char)
+            for ent in doc.ents
+        ]
+    return entities_by_line
+
+def _reading_order(ocr_results, line_indexes):
+    """
+    Groups lines into rows (top to bottom) and sorts each row left to
+    right. A line joins the current row if its vertical center falls
+    inside the row's first line. Lines without coordinates (text
+    documents) keep their order, one per row.
+    Returns a list of rows, each a list of line indexes.
+    """
+    if any(ocr_results[i][0] is None for i in line_indexes):
+        return [[i] for i in line_indexes]
+
+    def top(i):
+        return min(point[1] for point in ocr_results[i][0])
+
+    def bottom(i):
+        return max(point[1] for point in ocr_results[i][0])
+
+    rows = []
+    row_top = row_bottom = None
+    for i in sorted(line_indexes, key=lambda i: (top(i), ocr_results[i][0][0][0])):
+        center = (top(i) + bottom(i)) / 2
+        if rows and row_top <= center <= row_bottom:
+            rows[-1].append(i)
+        else:
+            rows.append([i])
+            row_top, row_bottom = top(i), bottom(i)
+    return [sorted(row, key=lambda i: ocr_results[i][0][0][0]) for row in rows]
+
+def build_page_document(ocr_results, line_indexes):
+    """
+    Joins the given lines in reading order into one text: lines on the
+    same row are separated by a space, rows by a newline.
+    Returns (text, offset_map) where offset_map is a list of
+    (doc_start, doc_end, line_index) segments, one per line, in order.
+    """
+    parts = []
+    offset_map = []
+    position = 0
+    for row_number, row in enumerate(_reading_order(ocr_results, line_indexes)):
+        for line_number, i in enumerate(row):
+            if row_number or line_number:
+                separator = " " if line_number else "\n"
+                parts.append(separator)
+                position += len(separator)
+            line_text = ocr_results[i][1]
+            parts.append(line_text)
+            offset_map.append((position, position + len(line_text), i))
+            position += len(line_text)
+    return "".join(parts), offset_map
+
+def project_span(offset_map, start_char, end_char):
+    """
+    Maps a [start_char, end_char) span of the page document back to
+    the lines it covers: [(line_index, line_start, line_end), ...].
+    A span that crosses a line break is split into one piece per line;
+    separators between lines are dropped.
+    """
+    pieces = []
+    first = bisect.bisect_right(offset_map, (start_char, float("inf"))) - 1
+    for (doc_start, doc_end, line_index) in offset_map[max(first, 0):]:
+        if doc_start >= end_char:
+            break
+        piece_start = max(start_char, doc_start)
+        piece_end = min(end_char, doc_end)
+        if piece_start < piece_end:
+            pieces.append((line_index, piece_start - doc_start, piece_end - doc_start))
+    return pieces
+
+def run_ner_on_page(ocr_results, cascade=None):
+    """
+    Runs spaCy ONCE over all eligible lines of a page joined in reading
+    order (see build_page_document) and projects every entity back to
+    its lines. Returns the same {line_index: [(label, text, start_char,
+    end_char), ...]} as run_ner_on_lines; 'text' is the WHOLE entity
+    (so the block list sees the full name), start/end are the piece of
+    it that falls on that line. Lines containing "@" are skipped.
+    With a cascade the whole page (for context) still goes to the
+    transformer, but only if at least one line passes the first stage.
+    """
+    eligible = [i for i, (_, text, _) in enumerate(ocr_results) if "@" not in text]
+    entities_by_line = {}
+    if not eligible or not select_ner_lines(ocr_results, eligible, cascade):
+        return entities_by_line
+
+    page_text, offset_map = build_page_document(ocr_results, eligible)
+    doc = MODELS.get("ner")(page_text)
+
+    for ent in doc.ents:
+        for (line_index, start_char, end_char) in project_span(offset_map, ent.start_char, ent.end_char):
+            entities_by_line.setdefault(line_index, []).append(
+                (ent.label_, ent.text, start_char, end_char))
+    return entities_by_line
+
+def span_x_from_char_boxes(char_boxes, start_char, end_char):
+    """
+    Gets the exact x0/x1 of a character span from known boxes
+    [(start_char, end_char, x0, x1), ...] (one per word or glyph).
+    Spans that only cover part of a box are interpolated inside it.
+    Returns (None, None) if no box overlaps the span.
+    """
+    span_x0 = None
+    span_x1 = None
+    for (box_start, box_end, box_x0, box_x1) in char_boxes:
+        if box_end <= start_char or box_start >= end_char:
+            continue
+        px_per_char = (box_x1 - box_x0) / max(box_end - box_start, 1)
+        seg_x0 = box_x0 + (max(start_char, box_start) - box_start) * px_per_char
+        seg_x1 = box_x0 + (min(end_char, box_end) - box_start) * px_per_char
+        span_x0 = seg_x0 if span_x0 is None else min(span_x0, seg_x0)
+        span_x1 = seg_x1 if span_x1 is None else max(span_x1, seg_x1)
+    return span_x0, span_x1
+
+def find_line_findings(ocr_results, categories_to_find, batch_size=None, n_process=None,
+                       ner_mode=None, cascade=None):
+    """
+    Runs the address heuristic, the AI model, the gazetteer (known
+    names and addresses, see gazetteer.py) and the regex rules over
+    every line. Returns one list per line of findings:
+    {"start_char", "end_char", "label"} (character spans in that line).
+    'ner_mode' is "line" or "page" (default: NER_MODE), 'cascade' one
+    of NER_CASCADES (default: NER_CASCADE).
+    """
+    if ner_mode is None:
+        ner_mode = NER_MODE
+    findings_per_line = []
 
     AI_ADDRESS_LABELS = {"ORG", "GPE", "LOCATION"}
     AI_PERSON_LABEL = {"PERSON"}
 
-    for (line_coords, text, conf) in ocr_results:
-        
-        all_findings_in_line = []
-        lower_text = text.lower()
+    # --- B (batched). Run AI Model (spaCy) over all lines at once ---
+    # Only needed when an AI-backed category was asked for.
+    if "PERSON" in categories_to_find or "ADDRESS" in categories_to_find:
+        with span("ner"):
+            if ner_mode == "page":
+                ai_entities = run_ner_on_page(ocr_results, cascade)
+            else:
+                ai_entities = run_ner_on_lines(ocr_results, batch_size, n_process, cascade)
+    else:
+        ai_entities = {}
+
+    # --- E (batched). Known names/addresses from the gazetteer lists ---
+    if len(GAZETTEER) and ("PERSON" in categories_to_find or "ADDRESS" in categories_to_find):
+        with span("gazetteer"):
+            gazetteer_matches = [GAZETTEER.find_all(text, categories_to_find)
+                                 for (_, text, _) in ocr_results]
+    else:
+        gazetteer_matches = None
+
+    # Address heuristic, AI results, regex rules and gazetteer matches, line by line
+    with span("regex"):
+        for line_index, (line_coords, text, conf) in enumerate(ocr_results):
+
+            all_findings_in_line = []
+            lower_text = text.lower()
         
-        # --- A. Address Heuristic ---
-        if "ADDRESS" in categories_to_find and "address:" in lower_text:
-            colon_index = lower_text.find(":")
-            if colon_index != -1: 
-                start_char = colon_index + 1
-                end_char = len(text)
+            # --- A. Address Heuristic ---
+            if "ADDRESS" in categories_to_find and "address:" in lower_text:
+                colon_index = lower_text.find(":")
+                if colon_index != -1: 
+                    start_char = colon_index + 1
+                    end_char = len(text)
                 
-                if start_char < end_char:
-                    all_findings_in_line.append({
-                        "start_char": start_char,
-                        "end_char": end_char,
-                        "label": "<ADDRESS>"
-                    })
+                    if start_char < end_char:
+                        all_findings_in_line.append({
+                            "start_char": start_char,
+                            "end_char": end_char,
+                            "label": "<ADDRESS>"
+                        })
         
-        # --- B. Run AI Model (spaCy) ---
-        run_ai = "@" not in text
-        
-        if run_ai:
-            doc = NLP(text)
+            # --- B. Collect AI results for this line ---
+            for (ent_label, ent_text, ent_start, ent_end) in ai_entities.get(line_index, []):
             
-            for ent in doc.ents:
-                
                 # Detect <PERSON>
-                if (ent.label_ in AI_PERSON_LABEL and 
+                if (ent_label in AI_PERSON_LABEL and 
                     "PERSON" in categories_to_find and 
-                    ent.text.lower() not in AI_BLOCK_LIST):
-                    
+                    ent_text.lower() not in AI_BLOCK_LIST and
+                    not GAZETTEER.is_blocked(ent_text)):
+                
                     all_findings_in_line.append({
-                        "start_char": ent.start_char,
-                        "end_char": ent.end_char,
+                        "start_char": ent_start,
+                        "end_char": ent_end,
                         "label": "<PERSON>"
                     })
-                
+            
                 # Detect unified <ADDRESS>
-                elif (ent.label_ in AI_ADDRESS_LABELS and 
+                elif (ent_label in AI_ADDRESS_LABELS and 
                       "ADDRESS" in categories_to_find and 
-                      ent.text.lower() not in AI_BLOCK_LIST):
-                    
+                      ent_text.lower() not in AI_BLOCK_LIST and
+                      not GAZETTEER.is_blocked(ent_text)):
+                
                     all_findings_in_line.append({
-                        "start_char": ent.start_char,
-                        "end_char": ent.end_char,
+                        "start_char": ent_start,
+                        "end_char": ent_end,
                         "label": "<ADDRESS>"
                     })
 
-        # --- C. Run refined Regex patterns ---
-        for label, pattern in REGEX_RULES.items():
-            if label not in categories_to_find:
-                continue
-
-            # Context filters
-            if label == "MCR no." and "mcr" not in lower_text:
-                continue
-            if label == "NRIC/FIN" and not re.search(r'\b(nric|fin|passport)\b', lower_text):
-                continue
-            
-            # --- THIS IS THE FIX (v24) ---
-            # REMOVED the context filter for PHONE
-            # if label == "PHONE" and not re.search(r'\b(phone|tel...)\b', lower_text):
-            #     continue
-            # -----------------------------
-            
-            if label == "DATE" and not re.search(r'\b(date|birth|dob)\b', lower_text):
-                continue
-            
-            if label == "ID_NUMBER" and not re.search(r'\b(med\. number|ihi|id)\b', lower_text):
-                continue
-                
-            for match in pattern.finditer(text):
+            # --- C. Run refined Regex patterns ---
+            # Context filters and pre-checks are part of each rule
+            for (label, start_char, end_char) in RULE_MATCHER.find_all(text, categories_to_find):
                 all_findings_in_line.append({
-                    "start_char": match.start(),
-                    "end_char": match.end(),
+                    "start_char": start_char,
+                    "end_char": end_char,
                     "label": f"<{label}>"
                 })
+
+            # --- E. Gazetteer matches for this line ---
+            if gazetteer_matches is not None:
+                for (label, start_char, end_char) in gazetteer_matches[line_index]:
+                    all_findings_in_line.append({
+                        "start_char": start_char,
+                        "end_char": end_char,
+                        "label": f"<{label}>"
+                    })
         
+            findings_per_line.append(all_findings_in_line)
+
+    return findings_per_line
+
+def filter_findings(findings_per_line, categories_to_find):
+    """
+    Keeps only the findings whose label was asked for. Running
+    find_line_findings() with ALL_CATEGORIES and then filtering
+    gives the same result as running it with 'categories_to_find'.
+    """
+    wanted_labels = {f"<{category}>" for category in categories_to_find}
+    return [
+        [finding for finding in findings if finding["label"] in wanted_labels]
+        for findings in findings_per_line
+    ]
+
+@traced("map")
+def findings_to_coordinates(ocr_results, findings_per_line, char_boxes=None,
+                            with_confidence=False):
+    """
+    Turns per-line character findings into pixel boxes:
+    [(coords, label), ...] ready for redact_image_with_labels.
+    'char_boxes' (optional) gives exact word/glyph boxes per line, e.g.
+    from a PDF text layer; without it positions are averaged per char.
+    with_confidence=True adds the OCR confidence of the line:
+    [(coords, label, conf), ...].
+    """
+    entities_to_redact = []
+
+    for line_index, (line_coords, text, conf) in enumerate(ocr_results):
+        all_findings_in_line = findings_per_line[line_index]
+
         # --- D. Calculate Coordinates for findings in this line ---
         if not all_findings_in_line:
             continue
@@ -247,10 +639,17 @@ def find_sensitive_entities(ocr_results, categories_to_find):
         
         avg_pixels_per_char = line_pixel_width / line_char_length
 
+        line_char_boxes = char_boxes[line_index] if char_boxes else None
+
         for finding in all_findings_in_line:
             
-            ent_x0 = line_x0 + (finding['start_char'] * avg_pixels_per_char)
-            ent_x1 = line_x0 + (finding['end_char'] * avg_pixels_per_char)
+            ent_x0 = ent_x1 = None
+            if line_char_boxes:
+                ent_x0, ent_x1 = span_x_from_char_boxes(
+                    line_char_boxes, finding['start_char'], finding['end_char'])
+            if ent_x0 is None:
+                ent_x0 = line_x0 + (finding['start_char'] * avg_pixels_per_char)
+                ent_x1 = line_x0 + (finding['end_char'] * avg_pixels_per_char)
             ent_y0 = line_y0
             ent_y1 = line_y1
             
@@ -261,83 +660,224 @@ def find_sensitive_entities(ocr_results, categories_to_find):
                 [ent_x0, ent_y1]
             ]
             
-            entities_to_redact.append( (approx_coords, finding['label']) )
+            if with_confidence:
+                entities_to_redact.append((approx_coords, finding['label'], conf))
+            else:
+                entities_to_redact.append( (approx_coords, finding['label']) )
 
-    print(f"Found {len(entities_to_redact)} sensitive items to redact.")
+    return entities_to_redact
+
+def find_sensitive_entities(ocr_results, categories_to_find, batch_size=None, n_process=None,
+                            char_boxes=None, ner_mode=None, cascade=None):
+    """
+    v20 logic - We now trust the AI *unless* it's in the block list.
+    The AI pass is batched over all lines (see run_ner_on_lines), or
+    runs once over the whole page with ner_mode="page" (see
+    run_ner_on_page); boxes come out per line either way.
+    'char_boxes' (optional) gives exact word/glyph boxes per line.
+    'cascade' overrides REDACT_NER_CASCADE (see select_ner_lines).
+    """
+    log.debug(f"Finding sensitive entities for: {categories_to_find}")
+    
+    if MODELS.get("ner") is None or not ocr_results:
+        log.warning("NLP model or OCR results not available. Skipping.")
+        return []
+
+    findings_per_line = find_line_findings(ocr_results, categories_to_find, batch_size, n_process,
+                                           ner_mode, cascade)
+    entities_to_redact = findings_to_coordinates(ocr_results, findings_per_line, char_boxes)
+
+    log.debug(f"Found {len(entities_to_redact)} sensitive items to redact.")
     return entities_to_redact
 
 # ---------------------------------------------------------------
 # (End of the "Brain" function)
 # ---------------------------------------------------------------
 
-def redact_image_with_labels(image_bytes, entities_to_redact):
+@functools.lru_cache(maxsize=None)
+def _label_font():
+    return ImageFont.load_default(size=LABEL_FONT_SIZE)
+
+@functools.lru_cache(maxsize=64)
+def label_sprite(label_text):
+    """
+    Alpha mask (float32, 0..1, H x W) of a label exactly as
+    draw.text((0, 0), label_text) renders it. Rendered once per label.
+    """
+    font = _label_font()
+    _, _, right, bottom = font.getbbox(label_text)
+    mask = Image.new("L", (max(int(right), 1), max(int(bottom), 1)), 0)
+    ImageDraw.Draw(mask).text((0, 0), label_text, fill=255, font=font)
+    sprite = np.asarray(mask, dtype=np.float32) / 255.0
+    sprite.flags.writeable = False
+    return sprite
+
+def _box_pixels(coordinates, width, height):
+    """
+    Pixel bounds (x0, y0, x1, y1), inclusive and clipped to the page,
+    of a box. Rounded outwards so it covers at least every pixel
+    draw.rectangle() would. None if the box is off the page.
+    """
+    xs = (coordinates[0][0], coordinates[2][0])
+    ys = (coordinates[0][1], coordinates[2][1])
+    x0 = max(math.floor(min(xs)), 0)
+    y0 = max(math.floor(min(ys)), 0)
+    x1 = min(math.ceil(max(xs)), width - 1)
+    y1 = min(math.ceil(max(ys)), height - 1)
+    if x0 > x1 or y0 > y1:
+        return None
+    return (x0, y0, x1, y1)
+
+def merge_boxes(boxes, gap=None):
+    """
+    Merges boxes [(x0, y0, x1, y1, label), ...] with the same label
+    that overlap vertically and are at most 'gap' px apart
+    horizontally (e.g. "John" + "Tan", or a span found twice).
+    The merged box is the union bounding box, so it covers at least
+    the same pixels.
+    """
+    if gap is None:
+        gap = MERGE_GAP_PX
+    merged = []
+    for box in sorted(boxes, key=lambda b: (b[4], b[1], b[0])):
+        if merged:
+            last = merged[-1]
+            same_row = (last[4] == box[4] and box[1] <= last[3] and last[1] <= box[3])
+            if same_row and box[0] <= last[2] + gap + 1 and last[0] <= box[2] + gap + 1:
+                merged[-1] = (min(last[0], box[0]), min(last[1], box[1]),
+                              max(last[2], box[2]), max(last[3], box[3]), last[4])
+                continue
+        merged.append(box)
+    return merged
+
+def stamp_label(pixels, label_text, x, y):
+    """Alpha-blends the cached sprite of 'label_text' at (x, y), in place."""
+    sprite = label_sprite(label_text)
+    height, width = pixels.shape[:2]
+    sprite_h, sprite_w = sprite.shape
+    # Clip the sprite to the page
+    left, top = max(x, 0), max(y, 0)
+    right, bottom = min(x + sprite_w, width), min(y + sprite_h, height)
+    if left >= right or top >= bottom:
+        return
+    alpha = sprite[top - y:bottom - y, left - x:right - x, None]
+    region = pixels[top:bottom, left:right]
+    region[:] = (region * (1.0 - alpha) + LABEL_COLOR * alpha + 0.5).astype(np.uint8)
+
+@traced("render")
+def redact_image_with_labels(image, entities_to_redact, merge=None):
     """
     Takes the ORIGINAL image and draws redactions on it.
+    'image' is an RGB NumPy array (returned as a new array)
+    or PNG bytes (returned as PNG bytes, for older callers).
+    All boxes are whited out on the array first, then each label is
+    stamped from a cached sprite (no PIL drawing per entity).
+    merge=True (default: MERGE_BOXES) merges touching boxes of the
+    same label first, so they get one label.
     """
-    print(f"Redacting image with {len(entities_to_redact)} labels...")
+    log.debug(f"Redacting image with {len(entities_to_redact)} labels...")
     
-    if not entities_to_redact or image_bytes is None:
-        return image_bytes
+    if not entities_to_redact or image is None:
+        return image
+    if merge is None:
+        merge = MERGE_BOXES
 
+    is_array = isinstance(image, np.ndarray)
     try:
-        # This 'image_bytes' is the ORIGINAL, full-color image
-        image = Image.open(BytesIO(image_bytes))
-        draw = ImageDraw.Draw(image)
-        
-        font = ImageFont.load_default(size=18)
-        
+        # This is the ORIGINAL, full-color image (we draw on a copy)
+        if is_array:
+            pixels = np.array(image, dtype=np.uint8)
+        else:
+            pixels = np.array(Image.open(BytesIO(image)).convert("RGB"))
+        height, width = pixels.shape[:2]
+
+        boxes = []
         for (coordinates, label_text) in entities_to_redact:
-            x0 = coordinates[0][0]
-            y0 = coordinates[0][1]
-            x1 = coordinates[2][0]
-            y1 = coordinates[2][1]
-            box_to_cover = [(x0, y0), (x1, y1)]
-
-            # 2. Cover the original text (white-out)
-            draw.rectangle(box_to_cover, fill="white")
-
-            # 3. Write the new label
-            draw.text(
-                (x0 + 2, y0 + 2), # Add a small 2px padding
-                label_text,
-                fill="red",
-                font=font
-            )
-
-        output_stream = BytesIO()
-        image.save(output_stream, format="PNG")
-        return output_stream.getvalue() # Returns the beautiful, redacted image
+            bounds = _box_pixels(coordinates, width, height)
+            if bounds is not None:
+                # Labels go where draw.text() put them: 2px inside the first corner
+                boxes.append(bounds + (label_text,))
+        if merge:
+            boxes = merge_boxes(boxes)
+
+        # 1. Cover the original text (white-out), all boxes
+        for (x0, y0, x1, y1, _) in boxes:
+            pixels[y0:y1 + 1, x0:x1 + 1] = 255
+
+        # 2. Write the labels
+        for (x0, y0, x1, y1, label_text) in boxes:
+            stamp_label(pixels, label_text, x0 + 2, y0 + 2)
+
+        if is_array:
+            return pixels
+
+        return encode_png(pixels) # Returns the beautiful, redacted image
 
     except Exception as e:
-        print(f"Error redacting image: {e}")
+        log.exception(f"Error redacting image: {e}")
         return None
 
-def export_image_to_pdf(image_bytes):
+def export_image_to_pdf(image, dpi=None, encoding=None):
     """
-    Takes the final redacted image (as bytes) and saves
-    it into a new, single-page PDF document in memory.
+    Takes the final redacted image (RGB NumPy array or bytes) and
+    saves it into a new, single-page PDF document in memory, encoded
+    as 'encoding' (default: OUTPUT_ENCODING, see encoder.py).
     """
-    if image_bytes is None:
-        print("No image data to export to PDF.")
+    if image is None:
+        log.error("No image data to export to PDF.")
         return None
     try:
-        image = Image.open(BytesIO(image_bytes))
-        image_rgb = image.convert("RGB")
-        pdf_bytes_io = BytesIO()
-        image_rgb.save(pdf_bytes_io, format="PDF", resolution=image.info.get("dpi", (200, 200))[0])
-        return pdf_bytes_io.getvalue()
+        if isinstance(image, np.ndarray):
+            pixels = np.asarray(image, dtype=np.uint8)
+            resolution = dpi or 200
+        else:
+            pil_image = Image.open(BytesIO(image))
+            pixels = np.asarray(pil_image.convert("RGB"))
+            resolution = dpi or pil_image.info.get("dpi", (200, 200))[0]
+        pdf_bytes, _ = encode_page_pdf(pixels, dpi=resolution, encoding=encoding)
+        return pdf_bytes
     except Exception as e:
-        print(f"Error converting final image to PDF: {e}")
+        log.exception(f"Error converting final image to PDF: {e}")
         return None
 
-# --- 5. TEST BLOCK (Updated to use the REAL brain) ---
+# --- 5. WARMUP ---
+
+WARMUP_TEXT = [
+    "Patient Name: John Tan",
+    "NRIC: S1234567D   Tel: 9123 4567",
+    "Address: 12 Harmony Road, Singapore 123456"
+]
+
+def warmup_models():
+    """
+    Runs one small synthetic page through OCR, NER and redaction so
+    the first real request doesn't pay for cold kernels. Raises if a
+    model isn't available (MODELS.warmup() records the error).
+    """
+    if MODELS.get("ocr") is None or MODELS.get("ner") is None:
+        raise RuntimeError("OCR or NER model not loaded.")
+
+    page = Image.new("RGB", (900, 60 + 50 * len(WARMUP_TEXT)), "white")
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=28)
+    for i, line in enumerate(WARMUP_TEXT):
+        draw.text((30, 30 + 50 * i), line, fill="black", font=font)
+    image = np.array(page)
+
+    ocr_results = run_ocr_on_image(image)
+    if not ocr_results:
+        raise RuntimeError("OCR returned nothing for the warmup page.")
+    entities = find_sensitive_entities(ocr_results, ALL_CATEGORIES)
+    redact_image_with_labels(image, entities)
+
+# --- 6. TEST BLOCK (Updated to use the REAL brain) ---
 if __name__ == "__main__":
     
     print("\n" + "="*50)
     print("--- [BACKEND ENGINE TEST] ---")
     print("="*50)
     
-    if OCR_READER is None or NLP is None:
+    if MODELS.get("ocr") is None or MODELS.get("ner") is None:
         print("A model failed to load. Exiting test.")
         exit()
         
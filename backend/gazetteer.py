@@ -0,0 +1,351 @@
+# -----------------------------------------------------------------
+# gazetteer.py
+#
+# Known names and addresses (patient rosters, staff directories),
+# matched in every line in one pass.
+# - Lists are plain UTF-8 text files, one entry per line ("#"
+#   comments and blank lines are skipped): REDACT_GAZETTEER_PERSON
+#   and REDACT_GAZETTEER_ADDRESS (several files separated by ":").
+#   Matches come out as <PERSON> / <ADDRESS> findings next to the
+#   NER and regex ones (engine.find_line_findings).
+# - REDACT_GAZETTEER_BLOCK lists phrases that are never a name or
+#   an address: they are dropped from the lists above, and NER
+#   entities with that text are dropped too (like AI_BLOCK_LIST).
+# - Matching is on words, not characters: each entry and each line
+#   is split into \w+ words and case-folded, so case, spacing and
+#   punctuation ("TAN,  Ah Kow" vs "Tan Ah Kow") don't matter. The
+#   entries form an Aho-Corasick automaton over word ids, so a line
+#   is scanned in one pass whatever the number of entries.
+# - Entries shorter than REDACT_GAZETTEER_MIN_TOKENS words (default
+#   2) are skipped: a lone "Lee" or "Hope" would hit everywhere.
+# - Building a million entries takes a while, so the automaton is
+#   pickled to REDACT_GAZETTEER_COMPILED and loaded from there as
+#   long as the list files haven't changed. Precompile it with:
+#     python gazetteer.py --out gazetteer.pkl
+#   The pickle holds plain arrays and dicts only (no class), so it
+#   loads whatever module saved it. One that can't be read is logged
+#   and rebuilt from the lists.
+#   The pickle holds PHI: keep it next to the lists, access-controlled.
+# -----------------------------------------------------------------
+
+import argparse
+import hashlib
+import os
+import pickle
+import re
+import time
+from array import array
+from bisect import bisect_left
+
+from telemetry import get_logger
+
+GAZETTEER_PERSON_FILES = [p for p in os.environ.get("REDACT_GAZETTEER_PERSON", "").split(os.pathsep) if p]
+GAZETTEER_ADDRESS_FILES = [p for p in os.environ.get("REDACT_GAZETTEER_ADDRESS", "").split(os.pathsep) if p]
+GAZETTEER_BLOCK_FILES = [p for p in os.environ.get("REDACT_GAZETTEER_BLOCK", "").split(os.pathsep) if p]
+GAZETTEER_COMPILED = os.environ.get("REDACT_GAZETTEER_COMPILED")
+GAZETTEER_MIN_TOKENS = int(os.environ.get("REDACT_GAZETTEER_MIN_TOKENS", 2))
+
+# Bump when the pickled layout changes
+FORMAT_VERSION = 2
+
+# Labels are bits, so one entry can be in both lists
+LABEL_BITS = {"PERSON": 1, "ADDRESS": 2}
+
+WORD_RE = re.compile(r"\w+")
+
+log = get_logger("gazetteer")
+
+
+def normalize(text):
+    """The case-folded words of 'text' (what matching compares)."""
+    return [word.casefold() for word in WORD_RE.findall(text)]
+
+
+def read_list(path):
+    """Entries of one list file."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def list_sources(person_files, address_files, block_files):
+    """(kind, path, size, mtime) of every list: tells if a pickle is stale."""
+    sources = []
+    for kind, paths in (("PERSON", person_files), ("ADDRESS", address_files),
+                        ("BLOCK", block_files)):
+        for path in paths:
+            stat = os.stat(path)
+            sources.append((kind, os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    return sources
+
+
+# --- 1. THE AUTOMATON ---
+
+class Gazetteer:
+    """
+    Aho-Corasick automaton over word ids. State 0 is the root.
+    Transitions are stored CSR-style in flat arrays (one sorted run
+    of (word, next state) per state, found with bisect), and the
+    root's transitions as one array indexed by word id. That keeps
+    a million entries in tens of MB, not one dict per state.
+    """
+
+    def __init__(self, entries=(), blocked=(), min_tokens=GAZETTEER_MIN_TOKENS, sources=()):
+        """
+        entries: [(label, text), ...] with label "PERSON" or "ADDRESS"
+        blocked: phrases never to match (and to drop from NER output)
+        """
+        self.min_tokens = min_tokens
+        self.sources = list(sources)
+        self.blocked = frozenset(" ".join(normalize(text)) for text in blocked)
+        digest = hashlib.sha256()
+
+        # Word ids, and each entry's ids -> label bits
+        self.vocab = {}
+        keyed = {}
+        for label, text in entries:
+            words = normalize(text)
+            if len(words) < min_tokens or " ".join(words) in self.blocked:
+                continue
+            digest.update(f"{label}\t{' '.join(words)}\n".encode())
+            key = tuple(self.vocab.setdefault(word, len(self.vocab)) for word in words)
+            keyed[key] = keyed.get(key, 0) | LABEL_BITS[label]
+        digest.update("\n".join(sorted(self.blocked)).encode())
+        # Goes into the result cache key (see pipeline._cache_params)
+        self.signature = digest.hexdigest()[:16]
+        self.entries = len(keyed)
+
+        self._build_trie(keyed)
+        del keyed
+        self._build_links()
+
+    def _build_trie(self, keyed):
+        # Sorted keys share prefixes with their neighbour, so the trie
+        # is built with a stack instead of a dict per state
+        parents, words, depths = array("i", [0]), array("i", [0]), array("i", [0])
+        self.out_len = array("i", [0])      # words in the entry ending here
+        self.out_labels = array("b", [0])   # its label bits
+        path = []   # state of each word of the previous key
+        previous = ()
+        for key in sorted(keyed):
+            common = 0
+            while common < min(len(key), len(previous)) and key[common] == previous[common]:
+                common += 1
+            del path[common:]
+            for depth in range(common, len(key)):
+                state = len(parents)
+                parents.append(path[-1] if path else 0)
+                words.append(key[depth])
+                depths.append(depth + 1)
+                self.out_len.append(0)
+                self.out_labels.append(0)
+                path.append(state)
+            self.out_len[path[-1]] = len(key)
+            self.out_labels[path[-1]] = keyed[key]
+            previous = key
+        self.states = len(parents)
+
+        # Children of each state, sorted by word (sorted keys already
+        # give that order within one parent)
+        order = sorted(range(1, self.states), key=parents.__getitem__)
+        self.offsets = array("i", [0]) * (self.states + 1)
+        for state in order:
+            self.offsets[parents[state] + 1] += 1
+        for state in range(self.states):
+            self.offsets[state + 1] += self.offsets[state]
+        self.edge_words = array("i", (words[state] for state in order))
+        self.edge_targets = array("i", order)
+        self.root_next = array("i", [0]) * len(self.vocab)
+        for state in range(self.offsets[0], self.offsets[1]):
+            self.root_next[self.edge_words[state]] = self.edge_targets[state]
+        self._parents, self._words, self._depths = parents, words, depths
+
+    def _build_links(self):
+        # Failure links in breadth-first order (parents first), and
+        # output links: the next state down the failure chain that
+        # ends an entry
+        self.fail = array("i", [0]) * self.states
+        self.out_link = array("i", [0]) * self.states
+        parents, words = self._parents, self._words
+        for state in sorted(range(1, self.states), key=self._depths.__getitem__):
+            parent = parents[state]
+            if parent:
+                fallback = self.fail[parent]
+                while True:
+                    target = self._next(fallback, words[state])
+                    if target or not fallback:
+                        break
+                    fallback = self.fail[fallback]
+                self.fail[state] = target
+            fail = self.fail[state]
+            self.out_link[state] = fail if self.out_len[fail] else self.out_link[fail]
+        del self._parents, self._words, self._depths
+
+    def _next(self, state, word):
+        """Transition on 'word', 0 if there is none."""
+        if not state:
+            return self.root_next[word]
+        lo, hi = self.offsets[state], self.offsets[state + 1]
+        i = bisect_left(self.edge_words, word, lo, hi)
+        return self.edge_targets[i] if i < hi and self.edge_words[i] == word else 0
+
+    def __len__(self):
+        return self.entries
+
+    def is_blocked(self, text):
+        return bool(self.blocked) and " ".join(normalize(text)) in self.blocked
+
+    # --- 2. SCANNING ---
+
+    def find_all(self, text, categories_to_find):
+        """
+        Returns [(label, start_char, end_char), ...] for the entries
+        found in 'text', longest first where one contains another.
+        """
+        wanted = sum(bit for label, bit in LABEL_BITS.items() if label in categories_to_find)
+        if not wanted or not self.entries:
+            return []
+
+        vocab = self.vocab
+        starts = []
+        matches = []
+        state = 0
+        for match in WORD_RE.finditer(text):
+            starts.append(match.start())
+            word = vocab.get(match.group().casefold())
+            if word is None:
+                # Not in any entry: nothing can continue through it
+                state = 0
+                continue
+            while True:
+                target = self._next(state, word)
+                if target or not state:
+                    break
+                state = self.fail[state]
+            state = target
+
+            found = state if self.out_len[state] else self.out_link[state]
+            while found:
+                bits = self.out_labels[found] & wanted
+                if bits:
+                    start = starts[len(starts) - self.out_len[found]]
+                    for label, bit in LABEL_BITS.items():
+                        if bits & bit:
+                            matches.append((label, start, match.end()))
+                found = self.out_link[found]
+
+        # "Tan Ah Kow" also contains the entry "Ah Kow": keep the longer
+        kept = []
+        for label, start, end in sorted(matches, key=lambda m: (m[1], -m[2])):
+            if not any(k[0] == label and k[1] <= start and end <= k[2] for k in kept):
+                kept.append((label, start, end))
+        return kept
+
+    # --- 3. PRECOMPILED FILE ---
+
+    def save(self, path):
+        """
+        Pickles the automaton's state (arrays, dicts), not the object:
+        a pickled class would be tied to the module that saved it
+        (e.g. __main__ when run as a script). Written to a temp name,
+        then renamed.
+        """
+        temp_path = f"{path}.partial"
+        with open(temp_path, "wb") as f:
+            pickle.dump({"version": FORMAT_VERSION, "state": dict(self.__dict__)}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def load(path):
+        """A saved automaton, or None if it was saved by another version."""
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        if not isinstance(saved, dict) or saved.get("version") != FORMAT_VERSION:
+            return None
+        gazetteer = Gazetteer.__new__(Gazetteer)
+        gazetteer.__dict__.update(saved["state"])
+        return gazetteer
+
+
+# --- 4. LOADING AT START-UP ---
+
+def build_from_files(person_files, address_files, block_files, min_tokens=GAZETTEER_MIN_TOKENS):
+    entries = [("PERSON", text) for path in person_files for text in read_list(path)]
+    entries += [("ADDRESS", text) for path in address_files for text in read_list(path)]
+    blocked = [text for path in block_files for text in read_list(path)]
+    return Gazetteer(entries, blocked, min_tokens,
+                     list_sources(person_files, address_files, block_files))
+
+
+def load_gazetteer(person_files=None, address_files=None, block_files=None, compiled=None,
+                   min_tokens=None):
+    """
+    The gazetteer for the configured lists: from the pickle when it
+    is still up to date, else built (and pickled, if a path is set).
+    """
+    person_files = GAZETTEER_PERSON_FILES if person_files is None else person_files
+    address_files = GAZETTEER_ADDRESS_FILES if address_files is None else address_files
+    block_files = GAZETTEER_BLOCK_FILES if block_files is None else block_files
+    compiled = GAZETTEER_COMPILED if compiled is None else compiled
+    min_tokens = GAZETTEER_MIN_TOKENS if min_tokens is None else min_tokens
+    if not (person_files or address_files or block_files):
+        return Gazetteer()
+
+    sources = list_sources(person_files, address_files, block_files)
+    if compiled and os.path.exists(compiled):
+        start = time.perf_counter()
+        try:
+            gazetteer = Gazetteer.load(compiled)
+        except Exception as e:
+            # Truncated, corrupt or from an older layout: the lists win
+            log.warning(f"Can't load {compiled} ({type(e).__name__}: {e}).")
+            gazetteer = None
+        if (gazetteer is not None and gazetteer.sources == sources
+                and gazetteer.min_tokens == min_tokens):
+            log.info(f"Loaded gazetteer ({len(gazetteer)} entries) from {compiled} "
+                     f"in {time.perf_counter() - start:.2f}s.")
+            return gazetteer
+        log.info(f"{compiled} is out of date, rebuilding the gazetteer.")
+
+    start = time.perf_counter()
+    gazetteer = build_from_files(person_files, address_files, block_files, min_tokens)
+    log.info(f"Built gazetteer ({len(gazetteer)} entries, {gazetteer.states} states) "
+             f"in {time.perf_counter() - start:.2f}s.")
+    if compiled:
+        try:
+            gazetteer.save(compiled)
+        except OSError as e:
+            log.warning(f"Can't save the gazetteer to {compiled}: {e}")
+    return gazetteer
+
+
+# (Not when run as the precompile script: main() builds it once)
+GAZETTEER = load_gazetteer() if __name__ != "__main__" else Gazetteer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompiles the gazetteer lists into one file.")
+    parser.add_argument("--person", action="append", default=[], help="name list (repeatable)")
+    parser.add_argument("--address", action="append", default=[], help="address list (repeatable)")
+    parser.add_argument("--block", action="append", default=[], help="block list (repeatable)")
+    parser.add_argument("--min-tokens", type=int, default=GAZETTEER_MIN_TOKENS)
+    parser.add_argument("--out", default=GAZETTEER_COMPILED, required=not GAZETTEER_COMPILED)
+    args = parser.parse_args()
+
+    # Without list options, the REDACT_GAZETTEER_* ones are compiled
+    if not (args.person or args.address or args.block):
+        args.person, args.address, args.block = (GAZETTEER_PERSON_FILES, GAZETTEER_ADDRESS_FILES,
+                                                 GAZETTEER_BLOCK_FILES)
+    start = time.perf_counter()
+    gazetteer = build_from_files(args.person, args.address, args.block, args.min_tokens)
+    gazetteer.save(args.out)
+    print(f"{len(gazetteer)} entries, {gazetteer.states} states, {len(gazetteer.vocab)} words: "
+          f"built in {time.perf_counter() - start:.1f}s, saved to {args.out} "
+          f"({os.path.getsize(args.out) / 2 ** 20:.1f} MB).")
+
+
+if __name__ == "__main__":
+    main()
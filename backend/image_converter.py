@@ -4,13 +4,57 @@
 # This version is now "dumb" again. It ONLY converts a
 # file into a standard PNG image. It no longer does
 # any pre-processing.
+# - The pipeline uses PageImage (a NumPy array + DPI) so
+#   pages are never PNG-encoded between stages. The PNG
+#   functions are kept for older callers.
 # -----------------------------------------------------------------
 
 import fitz  # PyMuPDF
 import docx
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 
+from telemetry import get_logger, span, traced
+from uploads import MemoryBudgetError, SpooledUpload, check_budget, page_memory_bytes
+
+log = get_logger("converter")
+
+# --- 0. IN-MEMORY PAGE ---
+
+class PageImage:
+    """
+    One page as an RGB uint8 NumPy array (height x width x 3)
+    plus the DPI it was rendered at. This is what moves between
+    convert -> preprocess -> OCR -> redact -> export.
+    """
+    def __init__(self, array, dpi=200, page_number=0):
+        self.array = array
+        self.dpi = dpi
+        self.page_number = page_number
+
+    @property
+    def width(self):
+        return self.array.shape[1]
+
+    @property
+    def height(self):
+        return self.array.shape[0]
+
+def pixmap_to_array(pix):
+    """Copies a fitz Pixmap into an RGB NumPy array (no PNG step)."""
+    if pix.alpha or pix.n != 3:
+        pix = fitz.Pixmap(fitz.csRGB, pix, 0)
+    samples = pix.samples_mv if hasattr(pix, "samples_mv") else pix.samples
+    array = np.frombuffer(samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    return array.copy()
+
+def pil_to_page_image(image, dpi=200, page_number=0):
+    """Wraps a PIL image as a PageImage (RGB array)."""
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return PageImage(np.array(image), dpi=dpi, page_number=page_number)
+
 # --- 1. PDF & IMAGE Handler ---
 
 def convert_pdf_or_image_to_bytes(file_bytes, file_type):
@@ -28,7 +72,7 @@ def convert_pdf_or_image_to_bytes(file_bytes, file_type):
             pdf_document.close()
             return image_bytes
         except Exception as e:
-            print(f"Error converting PDF: {e}")
+            log.warning(f"Error converting PDF: {e}")
             return None
             
     elif file_type in ["png", "jpg", "jpeg"]:
@@ -40,62 +84,252 @@ def convert_pdf_or_image_to_bytes(file_bytes, file_type):
             img.save(output_stream, format="PNG")
             return output_stream.getvalue()
         except Exception as e:
-            print(f"Error standardizing image: {e}")
+            log.warning(f"Error standardizing image: {e}")
             return None
 
+# A page needs at least this many words in its text layer
+# before we trust it instead of running OCR.
+MIN_TEXT_LAYER_WORDS = 5
+
+# A page with any image covering more than this fraction of it is
+# OCR'd as a whole: the text layer does not include what is printed
+# in the image (a scan, a pasted photo of an ID card, a stamp).
+# Smaller images (logos, icons, bullets) are ignored.
+IMAGE_OCR_MIN_COVERAGE = 0.02
+
+def extract_text_layer_lines(page, dpi=200):
+    """
+    Reads lines and word boxes straight from a PDF page's text layer.
+    Returns (ocr_results, word_boxes), or None if the page has no
+    usable text layer or carries an image that may hold text (then
+    the caller should fall back to OCR).
+
+    - ocr_results: [(coords, text, conf), ...] in the same shape
+      EasyOCR returns, scaled to page pixels at 'dpi'.
+    - word_boxes: one list per line of (start_char, end_char, x0, x1)
+      giving the exact pixel span of every word in that line.
+    """
+    # Rotated pages render in a different orientation than the
+    # text layer coordinates, so leave those to OCR.
+    if page.rotation != 0:
+        return None
+
+    words = page.get_text("words")
+    if len(words) < MIN_TEXT_LAYER_WORDS:
+        return None
+
+    page_area = abs(page.rect)
+    if page_area > 0 and any(
+        abs(fitz.Rect(info["bbox"]) & page.rect) / page_area > IMAGE_OCR_MIN_COVERAGE
+        for info in page.get_image_info()
+    ):
+        return None
+
+    scale = dpi / 72.0
+
+    # Group words by (block, line), keeping reading order
+    lines = {}
+    for (x0, y0, x1, y1, word, block_no, line_no, word_no) in words:
+        lines.setdefault((block_no, line_no), []).append((x0, y0, x1, y1, word))
+
+    ocr_results = []
+    word_boxes = []
+    for line_words in lines.values():
+        text = ""
+        boxes = []
+        for (x0, y0, x1, y1, word) in line_words:
+            if text:
+                text += " "
+            start_char = len(text)
+            text += word
+            boxes.append((start_char, len(text), x0 * scale, x1 * scale))
+
+        line_x0 = min(w[0] for w in line_words) * scale
+        line_y0 = min(w[1] for w in line_words) * scale
+        line_x1 = max(w[2] for w in line_words) * scale
+        line_y1 = max(w[3] for w in line_words) * scale
+        coords = [
+            [line_x0, line_y0],
+            [line_x1, line_y0],
+            [line_x1, line_y1],
+            [line_x0, line_y1]
+        ]
+        ocr_results.append((coords, text, 1.0))
+        word_boxes.append(boxes)
+
+    return ocr_results, word_boxes
+
+def open_pdf(source):
+    """
+    Opens PDF bytes, or a SpooledUpload from its path (MuPDF then
+    reads the file as pages need it instead of holding it all).
+    """
+    if isinstance(source, SpooledUpload):
+        return fitz.open(source.path, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+def iter_pdf_pages(file_bytes, dpi=200, use_text_layer=True):
+    """
+    Lazily renders a PDF (bytes or a SpooledUpload) one page at a
+    time. Yields (page_image, text_layer) so only the current page
+    is ever held in memory as an image. 'page_image' is a PageImage
+    and 'text_layer' is the result of extract_text_layer_lines(),
+    or None if OCR is needed.
+    """
+    pdf_document = open_pdf(file_bytes)
+    try:
+        for page_number in range(pdf_document.page_count):
+            with span("convert"):
+                page = pdf_document.load_page(page_number)
+                text_layer = extract_text_layer_lines(page, dpi) if use_text_layer else None
+                pix = page.get_pixmap(dpi=dpi)
+                page_image = PageImage(pixmap_to_array(pix), dpi=dpi, page_number=page_number)
+                # Drop the pixmap before handing the page on
+                pix = None
+            yield page_image, text_layer
+    finally:
+        pdf_document.close()
+
+@traced("convert")
+def load_image_page(file_bytes):
+    """
+    Opens a PNG/JPG upload (bytes or a SpooledUpload) as a
+    PageImage, keeping its DPI if the file has one (200 otherwise).
+    Raises MemoryBudgetError before decoding an image too big for it.
+    """
+    try:
+        img = Image.open(file_bytes.path if isinstance(file_bytes, SpooledUpload)
+                         else BytesIO(file_bytes))
+        # Only the header has been read so far
+        check_budget(page_memory_bytes(*img.size), "decoding this image")
+        dpi = img.info.get("dpi", (200, 200))[0] or 200
+        return pil_to_page_image(img, dpi=dpi)
+    except MemoryBudgetError:
+        raise
+    except Exception as e:
+        log.warning(f"Error opening image: {e}")
+        return None
+
 # --- 2. DOCX & TXT Handler ---
 
-def convert_text_to_image_bytes(file_bytes, file_type):
+TEXT_PAGE_PADDING = 50
+TEXT_PAGE_WIDTH = 1200
+TEXT_FONT_SIZE = 24
+# Same gap PIL puts between lines of multiline text
+TEXT_LINE_SPACING = 4
+
+def extract_document_paragraphs(file_bytes, file_type):
     """
-    "Rasterizes" a text-based file. This already creates
-    a perfect black-on-white image.
+    Returns the paragraphs of a DOCX/TXT file as a list of strings.
+    (For TXT, each line of the file is one "paragraph".)
     """
-    text = ""
     file_stream = BytesIO(file_bytes)
     
     try:
         if file_type == "docx":
             doc = docx.Document(file_stream)
-            all_paras = [para.text for para in doc.paragraphs]
-            text = "\n".join(all_paras)
+            return [para.text for para in doc.paragraphs]
         
         elif file_type == "txt":
-            text = file_stream.read().decode("utf-8")
+            return file_stream.read().decode("utf-8").split("\n")
     
     except Exception as e:
-        print(f"Error reading {file_type}: {e}")
+        log.warning(f"Error reading {file_type}: {e}")
         return None
 
-    padding = 50
-    img_width = 1200
-    bg_color = "white"
-    font_color = "black"
-    
+def _load_text_font():
     try:
-        font = ImageFont.load_default(size=24)
+        return ImageFont.load_default(size=TEXT_FONT_SIZE)
     except IOError:
-        font = ImageFont.load_default()
+        return ImageFont.load_default()
+
+def layout_text_lines(text, font, draw):
+    """
+    Works out where every line of 'text' is drawn, the same way
+    PIL lays out multiline text. Returns a list of (x, y, line_text).
+    """
+    line_step = draw.textbbox((0, 0), "A", font=font)[3] + TEXT_LINE_SPACING
+    return [
+        (TEXT_PAGE_PADDING, TEXT_PAGE_PADDING + i * line_step, line_text)
+        for i, line_text in enumerate(text.split("\n"))
+    ]
+
+def rasterize_text(text):
+    """
+    Draws the text onto a white page and returns
+    (image, layout), where layout is from layout_text_lines().
+    """
+    font = _load_text_font()
 
     temp_img = Image.new("RGB", (1, 1))
     temp_draw = ImageDraw.Draw(temp_img)
     
     if hasattr(temp_draw, 'textbbox'):
-        bbox = temp_draw.textbbox((padding, padding), text, font=font)
+        bbox = temp_draw.textbbox((TEXT_PAGE_PADDING, TEXT_PAGE_PADDING), text, font=font)
         text_height = bbox[3]
     else:
         text_width, text_height = temp_draw.textsize(text, font=font)
 
-    img_height = text_height + (padding * 2) 
+    img_height = text_height + (TEXT_PAGE_PADDING * 2) 
 
-    image = Image.new("RGB", (img_width, img_height), color=bg_color)
+    image = Image.new("RGB", (TEXT_PAGE_WIDTH, img_height), color="white")
     draw = ImageDraw.Draw(image)
 
-    draw.text(
-        (padding, padding),
-        text,
-        fill=font_color,
-        font=font
-    )
+    # Draw line by line so we know exactly where each glyph ends up
+    layout = layout_text_lines(text, font, draw)
+    for (x, y, line_text) in layout:
+        draw.text((x, y), line_text, fill="black", font=font)
+
+    return image, layout
+
+def text_layout_to_lines(layout, draw=None):
+    """
+    Turns a text layout into "OCR results" without running OCR.
+    Returns (ocr_results, glyph_boxes):
+    - ocr_results: [(coords, text, conf), ...] like EasyOCR
+    - glyph_boxes: per line, (start_char, end_char, x0, x1) for every
+      character, measured with the same font the rasterizer used.
+    Empty lines are skipped.
+    """
+    font = _load_text_font()
+    if draw is None:
+        draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    line_height = draw.textbbox((0, 0), "Ag", font=font)[3]
+
+    ocr_results = []
+    glyph_boxes = []
+    for (x, y, line_text) in layout:
+        if not line_text.strip():
+            continue
+
+        boxes = []
+        char_x0 = x
+        for i in range(len(line_text)):
+            char_x1 = x + draw.textlength(line_text[:i + 1], font=font)
+            boxes.append((i, i + 1, char_x0, char_x1))
+            char_x0 = char_x1
+
+        coords = [
+            [x, y],
+            [char_x0, y],
+            [char_x0, y + line_height],
+            [x, y + line_height]
+        ]
+        ocr_results.append((coords, line_text, 1.0))
+        glyph_boxes.append(boxes)
+
+    return ocr_results, glyph_boxes
+
+def convert_text_to_image_bytes(file_bytes, file_type):
+    """
+    "Rasterizes" a text-based file. This already creates
+    a perfect black-on-white image.
+    """
+    paragraphs = extract_document_paragraphs(file_bytes, file_type)
+    if paragraphs is None:
+        return None
+
+    image, layout = rasterize_text("\n".join(paragraphs))
     
     output_stream = BytesIO()
     image.save(output_stream, format="PNG")
@@ -122,5 +356,5 @@ def convert_to_image(uploaded_file):
         return convert_text_to_image_bytes(file_bytes, file_type)
         
     else:
-        print(f"Unsupported file type: {file_type}")
+        log.warning(f"Unsupported file type: {file_type}")
         return None
\ No newline at end of file
@@ -0,0 +1,181 @@
+# -----------------------------------------------------------------
+# jobs.py
+#
+# In-process job queue for the redaction pipeline.
+# - POST /jobs puts a job on a bounded queue and returns at once.
+# - A fixed pool of worker threads runs the pipeline; they all
+#   share the models already loaded by engine.py.
+# - A full queue raises QueueFullError (the API turns it into 429).
+# - Finished results are kept until they are downloaded, or for
+#   JOB_RESULT_TTL seconds at most; the workers sweep out expired
+#   jobs every JOB_SWEEP_SECONDS, even when no new requests come.
+# -----------------------------------------------------------------
+
+import os
+import queue
+import threading
+import time
+import uuid
+
+from telemetry import current_request_id, get_logger, request_context
+
+log = get_logger("jobs")
+
+JOB_WORKERS = int(os.environ.get("REDACT_JOB_WORKERS", 2))
+JOB_QUEUE_SIZE = int(os.environ.get("REDACT_JOB_QUEUE_SIZE", 16))
+JOB_RESULT_TTL = int(os.environ.get("REDACT_JOB_RESULT_TTL", 3600))
+JOB_SWEEP_SECONDS = 60
+
+
+class QueueFullError(Exception):
+    """Raised when no more jobs can be queued right now."""
+
+
+class Job:
+    """One redaction request and everything we know about it."""
+
+    def __init__(self, run, filename, on_done=None):
+        self.id = uuid.uuid4().hex
+        # Logs of the job thread carry the ID of the request that queued it
+        self.request_id = current_request_id() or self.id
+        self.filename = filename
+        self.status = "queued"     # queued -> running -> done / failed
+        self.stage = None          # current pipeline stage
+        self.stages = {}           # stage -> seconds since the job started
+        self.pages_done = 0
+        self.pages_total = None
+        self.error = None
+        self.error_type = None     # exception class name, e.g. "MemoryBudgetError"
+        self.result = None         # (output_bytes, mimetype, download_name)
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._run = run
+        self._on_done = on_done
+        self.done_event = threading.Event()
+
+    def report_progress(self, stage, pages_done=None, pages_total=None):
+        """Progress callback handed to the pipeline."""
+        if stage == "page":
+            self.pages_done = pages_done
+        else:
+            self.stage = stage
+            self.stages.setdefault(stage, round(time.time() - self.started_at, 3))
+        if pages_total is not None:
+            self.pages_total = pages_total
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": self.stages,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    """A bounded queue plus a fixed pool of pipeline worker threads."""
+
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL,
+                 sweep_seconds=JOB_SWEEP_SECONDS):
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.sweep_seconds = sweep_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_workers(self):
+        # Started on first use so that importing this module (e.g. in
+        # the Flask reloader's parent process) doesn't spawn threads.
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"redact-worker-{i}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, run, filename, block=False, on_done=None):
+        """
+        Queues 'run(progress)' as a new job and returns the Job.
+        Raises QueueFullError if the queue is full (unless block=True,
+        which waits for a free slot instead).
+        'on_done(job)' is called from the worker when the job finishes.
+        """
+        self._start_workers()
+        self._drop_expired()
+
+        job = Job(run, filename, on_done)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put(job, block=block)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise QueueFullError("Redaction queue is full, please retry later.")
+        return job
+
+    def get(self, job_id):
+        self._drop_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id):
+        """Forgets a job (and its result) once the caller has used it."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = self._queue.get(timeout=self.sweep_seconds)
+            except queue.Empty:
+                # Idle: results must not outlive their TTL just
+                # because no one submits or polls any more
+                self._drop_expired()
+                continue
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                with request_context(job.request_id):
+                    job.result = job._run(job.report_progress)
+                job.status = "done"
+            except Exception as e:
+                with request_context(job.request_id, log_summary=False):
+                    log.exception(f"Job {job.id} failed.")
+                job.error = str(e)
+                job.error_type = type(e).__name__
+                job.status = "failed"
+            finally:
+                # Drop the input (it holds the uploaded file)
+                job._run = None
+                job.finished_at = time.time()
+                job.done_event.set()
+                self._queue.task_done()
+                if job._on_done is not None:
+                    job._on_done(job)
+                self._drop_expired()
+
+    def _drop_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and now - job.finished_at > self.result_ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,188 @@
+# -----------------------------------------------------------------
+# models.py
+#
+# Model registry: loads EasyOCR and the spaCy models on demand
+# (or in a background thread) instead of at import time.
+# - Each model has a state: not_loaded -> loading -> ready|failed,
+#   plus its load time and error, for /healthz and /readyz.
+# - MODELS.get(name) loads the model on first use (waiting if a
+#   background load is already running) and returns None if it
+#   failed to load.
+# - warmup() runs a caller-supplied function once (a synthetic page
+#   through OCR and NER, see engine.warmup_models) so the first
+#   real request doesn't pay for cold kernels.
+# -----------------------------------------------------------------
+
+import os
+import threading
+import time
+
+from telemetry import get_logger
+
+log = get_logger("models")
+
+# "background": start loading + warmup as soon as the API starts
+# "lazy":       load each model on its first use, no warmup
+MODEL_LOADING = os.environ.get("REDACT_MODEL_LOADING", "background")
+WARMUP_ENABLED = os.environ.get("REDACT_WARMUP", "1") != "0"
+
+NER_MODEL_NAME = "en_core_web_trf"
+NER_CASCADE_MODEL_NAME = os.environ.get("REDACT_NER_CASCADE_MODEL", "en_core_web_sm")
+
+
+# --- 1. LOADERS ---
+
+def load_ocr_reader():
+    import easyocr
+    return easyocr.Reader(['en'], gpu=False)
+
+
+def load_ner_model():
+    import spacy
+    try:
+        return spacy.load(NER_MODEL_NAME, exclude=["tagger", "lemmatizer", "textcat", "senter"])
+    except MemoryError:
+        log.error("Tip: Close unused programs or switch to 'en_core_web_md' for lighter performance.")
+        raise
+
+
+def load_cascade_model():
+    import spacy
+    return spacy.load(NER_CASCADE_MODEL_NAME,
+                      exclude=["tagger", "parser", "lemmatizer", "textcat", "senter"])
+
+
+# --- 2. REGISTRY ---
+
+class ModelSlot:
+    """One model: its loader, load state and the loaded object."""
+
+    def __init__(self, name, loader, required=True):
+        self.name = name
+        self.loader = loader
+        self.required = required
+        self.state = "not_loaded"
+        self.error = None
+        self.load_seconds = None
+        self.model = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Loads the model once; returns it, or None if loading failed."""
+        if self.state == "ready":
+            return self.model
+        with self.lock:
+            if self.state in ("ready", "failed"):
+                return self.model
+            self.state = "loading"
+            log.info(f"Loading '{self.name}'...")
+            start = time.perf_counter()
+            try:
+                self.model = self.loader()
+                self.state = "ready"
+                log.info(f"'{self.name}' loaded.")
+            except Exception as e:
+                log.exception(f"Failed to load '{self.name}'.")
+                self.error = f"{type(e).__name__}: {e}"
+                self.state = "failed"
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            return self.model
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "required": self.required,
+            "load_seconds": self.load_seconds,
+            "error": self.error
+        }
+
+
+class ModelRegistry:
+    """
+    Named model slots plus the warmup state (see ready() for what
+    counts as ready).
+    """
+
+    def __init__(self, warmup_enabled=True, lazy=False):
+        self.slots = {}
+        self.lazy = lazy
+        self.warmup_enabled = warmup_enabled and not lazy
+        self.warmup_state = "pending" if self.warmup_enabled else "disabled"
+        self.warmup_seconds = None
+        self.warmup_error = None
+        self._background = None
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, required=True):
+        self.slots[name] = ModelSlot(name, loader, required)
+
+    def get(self, name):
+        return self.slots[name].get()
+
+    def state(self, name):
+        return self.slots[name].state
+
+    def load_required(self):
+        """Loads every required model (blocking)."""
+        for slot in self.slots.values():
+            if slot.required:
+                slot.get()
+
+    def warmup(self, warmup_fn):
+        """Runs warmup_fn() once and records how long it took."""
+        if not self.warmup_enabled or self.warmup_state == "done":
+            return
+        start = time.perf_counter()
+        try:
+            warmup_fn()
+            self.warmup_state = "done"
+        except Exception as e:
+            log.exception("Warmup failed.")
+            self.warmup_error = f"{type(e).__name__}: {e}"
+            self.warmup_state = "failed"
+        self.warmup_seconds = round(time.perf_counter() - start, 3)
+        log.info(f"Warmup {self.warmup_state} in {self.warmup_seconds}s.")
+
+    def start_background_loading(self, warmup_fn=None):
+        """Loads the required models (then warms up) in a daemon thread."""
+        with self._lock:
+            if self._background is not None:
+                return
+
+            def run():
+                self.load_required()
+                if warmup_fn is not None and self.required_ready():
+                    self.warmup(warmup_fn)
+
+            self._background = threading.Thread(target=run, name="model-loader", daemon=True)
+            self._background.start()
+
+    def required_ready(self):
+        return all(slot.state == "ready" for slot in self.slots.values() if slot.required)
+
+    def ready(self):
+        """
+        Background loading: required models loaded and warmup done.
+        Lazy loading: nothing is loaded up front, so ready unless a
+        required model already failed.
+        """
+        if self.lazy:
+            return not any(slot.state == "failed" for slot in self.slots.values() if slot.required)
+        return self.required_ready() and self.warmup_state in ("done", "disabled")
+
+    def health(self):
+        return {
+            "ready": self.ready(),
+            "models": {name: slot.to_dict() for name, slot in self.slots.items()},
+            "warmup": {
+                "state": self.warmup_state,
+                "seconds": self.warmup_seconds,
+                "error": self.warmup_error
+            }
+        }
+
+
+MODELS = ModelRegistry(warmup_enabled=WARMUP_ENABLED, lazy=MODEL_LOADING == "lazy")
+MODELS.register("ocr", load_ocr_reader)
+MODELS.register("ner", load_ner_model)
+MODELS.register("ner_cascade", load_cascade_model, required=False)
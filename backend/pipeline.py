@@ -0,0 +1,752 @@
+# -----------------------------------------------------------------
+# pipeline.py
+#
+# Runs the full OCR -> detect -> redact -> export chain for
+# documents with more than one page.
+# - Pages are rendered lazily from the PDF, one at a time.
+# - Each page goes through the same steps as a single /redact.
+# - Finished pages are appended to one output PDF as they
+#   come back, so peak memory depends on a page, not the file.
+# - Pages can run in parallel across worker processes.
+# - Pages that already carry a text layer skip OCR entirely.
+# - DOCX/TXT files skip OCR too: we already know the text and
+#   exactly where the rasterizer drew every glyph.
+# - redact_file() is the single entry point used by /redact
+#   and the job workers; it reports per-stage progress.
+# - OCR lines and raw findings are cached per page (cache.py),
+#   so re-uploads with other categories skip the models.
+# - Pages are handled in groups of OCR_PAGES_PER_BATCH: text
+#   detection runs per page, then the text-box crops of the whole
+#   group are recognized in shared batches (engine.run_ocr_on_images).
+# - detect_file() and render_reviewed_pages() split a run in two
+#   for human review: detect (keeping the pages), then draw the
+#   reviewed boxes without running any model again.
+# - Uploads may be bytes or a SpooledUpload on disk (uploads.py).
+#   Fewer pages are held at once when the memory budget needs it.
+# -----------------------------------------------------------------
+
+import os
+import json
+import time
+import itertools
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+from image_converter import (
+    PageImage,
+    pixmap_to_array,
+    extract_text_layer_lines,
+    iter_pdf_pages,
+    load_image_page,
+    open_pdf,
+    pil_to_page_image,
+    extract_document_paragraphs,
+    rasterize_text,
+    text_layout_to_lines
+)
+from engine import (
+    run_ocr_on_images,
+    find_line_findings,
+    filter_findings,
+    findings_to_coordinates,
+    redact_image_with_labels,
+    ALL_CATEGORIES,
+    AI_BLOCK_LIST,
+    CASCADE_COMMON_WORDS,
+    ADDRESS_CONTEXT_WORDS,
+    NER_MODE,
+    NER_CASCADE
+)
+from preprocess import PREPROCESS_MODE
+from tiling import OCR_TILE_PX, OCR_TILE_OVERLAP_PX
+from rules import REDACTION_RULES
+from gazetteer import GAZETTEER
+from models import MODELS, NER_MODEL_NAME, NER_CASCADE_MODEL_NAME
+from cache import RESULT_CACHE, cache_key, to_jsonable_ocr
+from encoder import encode_page_pdf, encode_png
+from document_redactor import redact_text_document
+from telemetry import METRICS, DOCUMENTS, ENTITIES, REQUEST_SECONDS, get_logger, span
+from uploads import (
+    PAGE_COPIES,
+    check_budget,
+    page_memory_bytes,
+    pages_within_budget,
+    read_upload,
+    resident_bytes,
+    upload_size
+)
+from pdf_redactor import (
+    pixel_box_to_page_rect,
+    add_redactions,
+    apply_redactions,
+    scrub_document,
+    verify_redactions
+)
+
+log = get_logger("pipeline")
+
+# Number of worker processes used for multi-page documents.
+# 1 means "run every page in this process".
+PIPELINE_WORKERS = int(os.environ.get("REDACT_PIPELINE_WORKERS", 1))
+
+# Pages whose OCR runs together (recognition batches span them)
+OCR_PAGES_PER_BATCH = int(os.environ.get("REDACT_OCR_PAGES_PER_BATCH", 4))
+
+# How many page groups may be queued per worker before we wait
+# for the oldest one to finish (keeps memory bounded: at most
+# 2 * OCR_PAGES_PER_BATCH rendered pages per worker).
+GROUPS_IN_FLIGHT_PER_WORKER = 2
+
+
+# Resolution at which pages without a text layer are OCR'd when a
+# PDF is redacted in place (boxes are mapped back to points)
+IN_PLACE_OCR_DPI = 200
+
+
+DOCUMENT_MIMETYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+    "png": "image/png"
+}
+
+
+def _report(progress, stage, pages_done=None, pages_total=None):
+    """Calls the optional progress callback (used by the job API)."""
+    if progress is not None:
+        progress(stage, pages_done, pages_total)
+
+
+# --- 1. DETECTION (with cache) ---
+
+def _cache_params(source):
+    """Everything besides the page content that changes OCR/NER output."""
+    return {
+        "source": source,
+        "ocr": f"easyocr-en/preprocess-{PREPROCESS_MODE}/batched-recognition",
+        "ocr_tiles": [OCR_TILE_PX, OCR_TILE_OVERLAP_PX],
+        "ner": NER_MODEL_NAME,
+        "ner_mode": NER_MODE,
+        "ner_cascade": [NER_CASCADE, NER_CASCADE_MODEL_NAME],
+        "rules": REDACTION_RULES,
+        "word_lists": [sorted(AI_BLOCK_LIST), sorted(CASCADE_COMMON_WORDS),
+                       sorted(ADDRESS_CONTEXT_WORDS)],
+        "gazetteer": GAZETTEER.signature
+    }
+
+
+def detect_entities(content, source, get_lines, categories_to_find, char_boxes=None,
+                    progress=None, with_confidence=False):
+    """
+    Finds the boxes to redact for one page.
+    - content/source: what the page is (pixels or text) and where its
+      lines come from ("ocr", "text_layer", "text"); used as cache key.
+    - get_lines(): produces the (coords, text, conf) lines on a miss.
+    Returns (ocr_results, entities_to_redact); with_confidence=True
+    gives (coords, label, conf) entities (see findings_to_coordinates).
+
+    With the cache on, findings are computed for ALL_CATEGORIES and
+    filtered afterwards, so another category selection is a cache hit.
+    """
+    if not RESULT_CACHE.enabled:
+        ocr_results = get_lines()
+        _report(progress, "detect")
+        if MODELS.get("ner") is None or not ocr_results:
+            log.warning("NLP model or OCR results not available. Skipping.")
+            return ocr_results, []
+        findings_per_line = find_line_findings(ocr_results, categories_to_find)
+        return ocr_results, findings_to_coordinates(ocr_results, findings_per_line, char_boxes,
+                                                    with_confidence)
+
+    key = cache_key(content, _cache_params(source))
+    cached = RESULT_CACHE.get(key)
+
+    if cached is not None:
+        log.info("Cache hit, skipping OCR and NER.")
+        ocr_results = cached["ocr_results"]
+        all_findings = cached["findings"]
+    else:
+        ocr_results = get_lines()
+        _report(progress, "detect")
+        if MODELS.get("ner") is None or not ocr_results:
+            # Don't cache: the model may be back next time
+            log.warning("NLP model or OCR results not available. Skipping.")
+            return ocr_results, []
+        all_findings = find_line_findings(ocr_results, ALL_CATEGORIES)
+        RESULT_CACHE.put(key, {"ocr_results": to_jsonable_ocr(ocr_results), "findings": all_findings})
+
+    findings_per_line = filter_findings(all_findings, categories_to_find)
+    return ocr_results, findings_to_coordinates(ocr_results, findings_per_line, char_boxes,
+                                                with_confidence)
+
+
+# --- 2. ONE PAGE ---
+
+def _count_labels(stats, entity_counts):
+    """Adds per-label entity counts into the optional stats dict."""
+    if stats is not None:
+        stats.setdefault("entities", Counter()).update(entity_counts)
+
+
+def _add_timings(stats, timings):
+    """Adds per-stage seconds (e.g. ocr_detect) into the optional stats dict."""
+    if stats is not None and timings:
+        stats.setdefault("timings", Counter()).update(timings)
+
+
+def _count_encoding(stats, encoding, output_bytes):
+    """Adds one encoded page (pages and bytes per encoding) into the optional stats dict."""
+    if stats is not None:
+        counts = stats.setdefault("encoding", {}).setdefault(encoding, Counter())
+        counts.update(pages=1, bytes=len(output_bytes))
+
+
+def encode_page(pixels, dpi, timings=None, output_format="pdf"):
+    """
+    Encodes a redacted page as a single-page PDF (encoder.py picks
+    the encoding) or, with output_format="png", as a PNG. 'timings'
+    gets the seconds under "encode_<encoding>".
+    Returns (output_bytes, encoding).
+    """
+    start = time.perf_counter()
+    if output_format == "png":
+        output_bytes, encoding = encode_png(pixels, dpi=dpi), "png"
+    else:
+        output_bytes, encoding = encode_page_pdf(pixels, dpi=dpi)
+    if timings is not None:
+        key = f"encode_{encoding}"
+        timings[key] = timings.get(key, 0.0) + time.perf_counter() - start
+    return output_bytes, encoding
+
+
+def redact_page_image(page, categories_to_find, text_layer=None, progress=None,
+                      ocr_results=None, timings=None, output_format="pdf"):
+    """
+    Runs OCR, entity detection, redaction and PDF export
+    for a single PageImage. Returns (single-page PDF bytes,
+    Counter of entity labels found on the page, encoding used).
+    output_format="png" returns PNG bytes instead of the PDF.
+    If 'text_layer' (lines + word boxes from the PDF) is given,
+    OCR is skipped and the exact word boxes are used.
+    'ocr_results' are OCR lines already computed for this page (see
+    redact_page_group); 'timings' gets the OCR and encode seconds.
+    The page stays a NumPy array the whole way through.
+    """
+    if text_layer is not None:
+        source = "text_layer"
+        word_boxes = text_layer[1]
+        log.info(f"Using PDF text layer ({len(text_layer[0])} lines), skipping OCR.")
+
+        def get_lines():
+            return text_layer[0]
+    else:
+        source = "ocr"
+        word_boxes = None
+
+        def get_lines():
+            if ocr_results is not None:
+                return ocr_results
+            _report(progress, "ocr")
+            results = run_ocr_on_images([page.array], timings=timings)
+            if results is None:
+                raise Exception("OCR process failed.")
+            return results[0]
+
+    ocr_results, entities_to_redact = detect_entities(page.array, source, get_lines,
+                                                      categories_to_find, word_boxes, progress)
+
+    _report(progress, "redact")
+    redacted_array = redact_image_with_labels(page.array, entities_to_redact)
+    if redacted_array is None:
+        raise Exception("Redaction drawing failed.")
+
+    _report(progress, "export")
+    output_bytes, encoding = encode_page(redacted_array, page.dpi, timings, output_format)
+    return output_bytes, Counter(label for (_, label) in entities_to_redact), encoding
+
+
+def _group_ocr(pages, timings, progress=None):
+    """
+    OCRs together the (PageImage, text_layer) pairs of a group that
+    need it (no text layer, not cached), so their text boxes share
+    recognition batches. Returns {index in group: OCR lines}.
+    """
+    needs_ocr = [
+        index for index, (page, text_layer) in enumerate(pages)
+        if text_layer is None and not (
+            RESULT_CACHE.enabled and RESULT_CACHE.contains(cache_key(page.array, _cache_params("ocr"))))
+    ]
+    group_ocr = {}
+    if needs_ocr:
+        _report(progress, "ocr")
+        results = run_ocr_on_images([pages[index][0].array for index in needs_ocr], timings=timings)
+        if results is None:
+            raise Exception("OCR process failed.")
+        group_ocr = dict(zip(needs_ocr, results))
+    return group_ocr
+
+
+def redact_page_group(pages, categories_to_find, progress=None):
+    """
+    Redacts a group of (PageImage, text_layer) pairs, OCR'd together
+    (see _group_ocr). Returns ([(pdf_bytes, Counter, encoding), ...]
+    in page order, {"ocr_detect": s, ...}).
+    """
+    timings = {}
+    group_ocr = _group_ocr(pages, timings, progress)
+    done = [
+        redact_page_image(page, categories_to_find, text_layer, progress,
+                          ocr_results=group_ocr.get(index), timings=timings)
+        for index, (page, text_layer) in enumerate(pages)
+    ]
+    return done, timings
+
+
+def _pooled_page_group(pages, categories_to_find):
+    """redact_page_group() in a pool process, plus the metrics it recorded."""
+    done, timings = redact_page_group(pages, categories_to_find)
+    return done, timings, METRICS.drain()
+
+
+def _append_pdf_page(output_pdf, page_pdf_bytes):
+    """Appends a single-page PDF (as bytes) to the output document."""
+    with fitz.open(stream=page_pdf_bytes, filetype="pdf") as page_pdf:
+        output_pdf.insert_pdf(page_pdf)
+
+
+# --- 3. WHOLE DOCUMENT ---
+
+def _page_groups(pages, group_size):
+    """Yields lists of up to 'group_size' items from the 'pages' iterator."""
+    pages = iter(pages)
+    while True:
+        group = list(itertools.islice(pages, max(1, group_size)))
+        if not group:
+            return
+        yield group
+
+
+def pdf_page_info(file_bytes, dpi=200, max_pages=None):
+    """
+    (number of pages, memory estimate of the largest page rendered
+    at 'dpi') of a PDF, without rendering anything.
+    """
+    with open_pdf(file_bytes) as pdf_document:
+        pages_total = pdf_document.page_count
+        if max_pages is not None:
+            pages_total = min(pages_total, max_pages)
+        largest = 0
+        for page_number in range(pages_total):
+            rect = pdf_document.load_page(page_number).rect
+            largest = max(largest, page_memory_bytes(round(rect.width * dpi / 72),
+                                                     round(rect.height * dpi / 72)))
+        return pages_total, largest
+
+
+def redact_pdf_all_pages(file_bytes, categories_to_find, workers=None, max_pages=None,
+                         progress=None, stats=None):
+    """
+    Redacts every page of a PDF (or the first 'max_pages') and returns
+    the combined PDF bytes. Pages are rendered lazily and the output
+    PDF is built up page by page, in the original order.
+    """
+    if workers is None:
+        workers = PIPELINE_WORKERS
+
+    pages_total, page_bytes = pdf_page_info(file_bytes, max_pages=max_pages)
+    # Raises MemoryBudgetError if even the largest page alone won't fit
+    pages_at_once = pages_within_budget(page_bytes, resident_bytes(file_bytes))
+    group_size = OCR_PAGES_PER_BATCH
+    if pages_at_once is not None:
+        group_size = min(group_size, pages_at_once)
+    _report(progress, "render", 0, pages_total)
+
+    output_pdf = fitz.open()
+
+    def append_group(done, timings, metrics=None):
+        # Metrics recorded in a pool process come back with its group
+        METRICS.merge(metrics)
+        for page_pdf, entity_counts, encoding in done:
+            _append_pdf_page(output_pdf, page_pdf)
+            _count_labels(stats, entity_counts)
+            _count_encoding(stats, encoding, page_pdf)
+            log.info(f"Page {output_pdf.page_count} done "
+                     f"({encoding}, {len(page_pdf) / 1024:.0f} KB).")
+            _report(progress, "page", output_pdf.page_count, pages_total)
+        _add_timings(stats, timings)
+
+    try:
+        pages = iter_pdf_pages(file_bytes)
+        if max_pages is not None:
+            pages = itertools.islice(pages, max_pages)
+        groups = _page_groups(pages, group_size)
+
+        if workers <= 1:
+            for group in groups:
+                append_group(*redact_page_group(group, categories_to_find, progress))
+        else:
+            # 'fork' lets the workers share the models loaded in this
+            # process; load them first so each worker doesn't load its own.
+            MODELS.load_required()
+            context = multiprocessing.get_context("fork")
+            max_in_flight = workers * GROUPS_IN_FLIGHT_PER_WORKER
+            if pages_at_once is not None:
+                max_in_flight = max(1, min(max_in_flight, pages_at_once // group_size))
+
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=METRICS.reset) as pool:
+                in_flight = deque()
+
+                for group in groups:
+                    in_flight.append(pool.submit(_pooled_page_group, group, categories_to_find))
+                    group = None
+
+                    # Wait for the oldest group before rendering more
+                    if len(in_flight) >= max_in_flight:
+                        append_group(*in_flight.popleft().result())
+
+                while in_flight:
+                    append_group(*in_flight.popleft().result())
+
+        if output_pdf.page_count == 0:
+            raise Exception("PDF has no pages.")
+
+        return output_pdf.tobytes(garbage=3, deflate=True)
+    finally:
+        output_pdf.close()
+
+
+def redact_pdf_in_place(file_bytes, categories_to_find, max_pages=None, progress=None,
+                        stats=None):
+    """
+    Redacts the ORIGINAL PDF (or its first 'max_pages') instead of
+    rasterizing it: findings become redaction annotations that remove
+    the text and image content under them (see pdf_redactor.py).
+    Pages with a text layer are read in points directly; the others
+    are rendered and OCR'd at IN_PLACE_OCR_DPI.
+    The result is re-opened and checked: if any text is still
+    extractable inside a redacted box, this raises instead of
+    returning the file. 'stats' gets a "redaction" summary
+    (sizes, seconds, boxes).
+    """
+    start = time.perf_counter()
+    timings = {}
+    rects_per_page = {}
+    labels = set()
+
+    pdf_document = open_pdf(file_bytes)
+    try:
+        if max_pages is not None and pdf_document.page_count > max_pages:
+            pdf_document.select(list(range(max_pages)))
+        pages_total = pdf_document.page_count
+        if pages_total == 0:
+            raise Exception("PDF has no pages.")
+        _report(progress, "render", 0, pages_total)
+
+        for page in pdf_document:
+            text_layer = extract_text_layer_lines(page, dpi=72)
+            if text_layer is not None:
+                lines, word_boxes = text_layer
+                dpi = 72
+                _, entities_to_redact = detect_entities(
+                    json.dumps(to_jsonable_ocr(lines)), "text_layer_points", lambda: lines,
+                    categories_to_find, word_boxes, progress)
+            else:
+                dpi = IN_PLACE_OCR_DPI
+                check_budget(resident_bytes(file_bytes) + page_memory_bytes(
+                    round(page.rect.width * dpi / 72), round(page.rect.height * dpi / 72)),
+                    f"rendering page {page.number + 1}")
+                page_image = PageImage(pixmap_to_array(page.get_pixmap(dpi=dpi)), dpi=dpi,
+                                       page_number=page.number)
+
+                def get_lines():
+                    _report(progress, "ocr")
+                    results = run_ocr_on_images([page_image.array], timings=timings)
+                    if results is None:
+                        raise Exception("OCR process failed.")
+                    return results[0]
+
+                _, entities_to_redact = detect_entities(page_image.array, "ocr", get_lines,
+                                                        categories_to_find, None, progress)
+                page_image = None
+
+            _report(progress, "redact")
+            boxes = [(pixel_box_to_page_rect(page, coordinates, dpi), label_text)
+                     for (coordinates, label_text) in entities_to_redact]
+            with span("apply"):
+                add_redactions(page, boxes)
+                apply_redactions(page)
+            rects_per_page[page.number] = [rect for (rect, _) in boxes]
+            labels.update(label_text for (_, label_text) in boxes)
+            _count_labels(stats, Counter(label_text for (_, label_text) in boxes))
+            log.info(f"Page {page.number + 1}: {len(boxes)} redactions applied.")
+            _report(progress, "page", page.number + 1, pages_total)
+
+        _report(progress, "export")
+        with span("export"):
+            scrub_document(pdf_document)
+            output_bytes = pdf_document.tobytes(garbage=4, deflate=True, clean=True)
+    finally:
+        pdf_document.close()
+
+    _report(progress, "verify")
+    with span("verify"):
+        leaks = verify_redactions(output_bytes, rects_per_page, labels)
+    if leaks:
+        raise Exception(f"Redaction check failed: {len(leaks)} word(s) still extractable "
+                        f"inside redacted areas (first on page {leaks[0][0] + 1}).")
+
+    summary = {
+        "input_bytes": upload_size(file_bytes),
+        "output_bytes": len(output_bytes),
+        "seconds": round(time.perf_counter() - start, 3),
+        "redactions": sum(len(rects) for rects in rects_per_page.values()),
+        "verified": True
+    }
+    log.info("In-place PDF redaction done", extra={"fields": summary})
+    _add_timings(stats, timings)
+    if stats is not None:
+        stats["redaction"] = summary
+    return output_bytes
+
+
+# --- 4. DOCX & TXT (no OCR) ---
+
+def redact_text_file_to_pdf(file_bytes, file_type, categories_to_find, progress=None,
+                            stats=None):
+    """
+    Redacts a DOCX/TXT file without OCR: the text is drawn once,
+    detection runs on the known lines and the boxes come from the
+    glyph positions of the same font. Returns PDF bytes.
+    """
+    _report(progress, "render", 0, 1)
+    with span("convert"):
+        paragraphs = extract_document_paragraphs(file_bytes, file_type)
+        if paragraphs is None:
+            raise Exception("File conversion failed (unsupported format or corrupt file).")
+
+        text = "\n".join(paragraphs)
+        image, layout = rasterize_text(text)
+        text_lines, glyph_boxes = text_layout_to_lines(layout)
+        page = pil_to_page_image(image)
+    log.info(f"{len(text_lines)} text lines from {file_type}, skipping OCR.")
+    image = None
+
+    ocr_results, entities_to_redact = detect_entities(text, "text", lambda: text_lines,
+                                                      categories_to_find, glyph_boxes, progress)
+
+    _count_labels(stats, Counter(label for (_, label) in entities_to_redact))
+
+    _report(progress, "redact")
+    redacted_array = redact_image_with_labels(page.array, entities_to_redact)
+    if redacted_array is None:
+        raise Exception("Redaction drawing failed.")
+
+    _report(progress, "export")
+    timings = {}
+    pdf_bytes, encoding = encode_page(redacted_array, page.dpi, timings)
+    _count_encoding(stats, encoding, pdf_bytes)
+    _add_timings(stats, timings)
+    _report(progress, "page", 1, 1)
+    return pdf_bytes
+
+
+# --- 5. SINGLE IMAGES ---
+
+def redact_image_file_to_pdf(file_bytes, categories_to_find, progress=None, stats=None,
+                             output_format="pdf"):
+    """
+    Redacts a PNG/JPG upload and returns PDF bytes
+    (or PNG bytes with output_format="png").
+    """
+    _report(progress, "render", 0, 1)
+    page = load_image_page(file_bytes)
+    if page is None:
+        raise Exception("File conversion failed (unsupported format or corrupt file).")
+    timings = {}
+    output_bytes, entity_counts, encoding = redact_page_image(
+        page, categories_to_find, progress=progress, timings=timings, output_format=output_format)
+    _count_labels(stats, entity_counts)
+    _count_encoding(stats, encoding, output_bytes)
+    _add_timings(stats, timings)
+    _report(progress, "page", 1, 1)
+    return output_bytes
+
+
+# --- 6. ANY UPLOAD ---
+
+def redact_file(file_bytes, filename, categories_to_find, all_pages=False,
+                output_format="pdf", progress=None, stats=None):
+    """
+    Redacts one uploaded file, whatever its type (see _redact_file),
+    and records the document in the metrics.
+    """
+    file_type = filename.split('.')[-1].lower()
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+    try:
+        result = _redact_file(file_bytes, file_type, categories_to_find, all_pages,
+                              output_format, progress, stats)
+    except Exception:
+        DOCUMENTS.inc(file_type=file_type, status="failed")
+        raise
+    REQUEST_SECONDS.observe(time.perf_counter() - start, file_type=file_type)
+    DOCUMENTS.inc(file_type=file_type, status="done")
+    for label, count in stats.get("entities", {}).items():
+        ENTITIES.inc(count, category=label.strip("<>"))
+    return result
+
+
+def _redact_file(file_bytes, file_type, categories_to_find, all_pages=False,
+                 output_format="pdf", progress=None, stats=None):
+    """
+    Redacts one uploaded file, whatever its type.
+    Returns (output_bytes, mimetype, download_name).
+    - file_bytes: bytes, or a SpooledUpload for large uploads.
+    - all_pages: PDFs only; otherwise just the first page is done.
+    - output_format: "pdf", or "document" to get the original
+      document back with the findings removed: a redacted DOCX/TXT,
+      a PNG for PNG/JPG uploads, or for PDFs the original PDF with
+      true redactions applied (see redact_pdf_in_place).
+    - stats: optional dict; gets an "entities" Counter of labels,
+      a "timings" Counter of OCR and encode seconds and an
+      "encoding" dict of pages and bytes per page encoding.
+    """
+    if file_type == "pdf":
+        # PDFs go page by page (text layer first, OCR only if needed)
+        max_pages = None if all_pages else 1
+        if output_format == "document":
+            output_bytes = redact_pdf_in_place(file_bytes, categories_to_find, max_pages=max_pages,
+                                               progress=progress, stats=stats)
+        else:
+            output_bytes = redact_pdf_all_pages(file_bytes, categories_to_find,
+                                                max_pages=max_pages, progress=progress,
+                                                stats=stats)
+
+    elif file_type in ["docx", "txt"]:
+        # Text files never need OCR
+        file_bytes = read_upload(file_bytes)
+        if output_format == "document":
+            _report(progress, "detect")
+            output_bytes = redact_text_document(file_bytes, file_type, categories_to_find, stats)
+            return output_bytes, DOCUMENT_MIMETYPES[file_type], f"REDACTED_OUTPUT.{file_type}"
+        output_bytes = redact_text_file_to_pdf(file_bytes, file_type, categories_to_find,
+                                               progress, stats)
+
+    elif file_type in ["png", "jpg", "jpeg"]:
+        # The page stays in memory as an array until the PDF is written
+        if output_format == "document":
+            output_bytes = redact_image_file_to_pdf(file_bytes, categories_to_find, progress,
+                                                    stats, output_format="png")
+            return output_bytes, DOCUMENT_MIMETYPES["png"], "REDACTED_OUTPUT.png"
+        output_bytes = redact_image_file_to_pdf(file_bytes, categories_to_find, progress, stats)
+
+    else:
+        raise Exception("File conversion failed (unsupported format or corrupt file).")
+
+    return output_bytes, DOCUMENT_MIMETYPES["pdf"], "REDACTED_OUTPUT.pdf"
+
+
+# --- 7. TWO-PHASE REVIEW (detect, then render) ---
+
+def _review_pages(file_bytes, file_type, max_pages):
+    """Yields (PageImage, text_layer, cache content, cache source) per page."""
+    if file_type == "pdf":
+        pages = iter_pdf_pages(file_bytes)
+        if max_pages is not None:
+            pages = itertools.islice(pages, max_pages)
+        for page, text_layer in pages:
+            yield page, text_layer, page.array, ("ocr" if text_layer is None else "text_layer")
+
+    elif file_type in ["docx", "txt"]:
+        with span("convert"):
+            paragraphs = extract_document_paragraphs(read_upload(file_bytes), file_type)
+            if paragraphs is None:
+                raise Exception("File conversion failed (unsupported format or corrupt file).")
+            text = "\n".join(paragraphs)
+            image, layout = rasterize_text(text)
+            page = pil_to_page_image(image)
+        yield page, text_layout_to_lines(layout), text, "text"
+
+    elif file_type in ["png", "jpg", "jpeg"]:
+        page = load_image_page(file_bytes)
+        if page is None:
+            raise Exception("File conversion failed (unsupported format or corrupt file).")
+        yield page, None, page.array, "ocr"
+
+    else:
+        raise Exception("File conversion failed (unsupported format or corrupt file).")
+
+
+def detect_file(file_bytes, filename, categories_to_find, all_pages=False, progress=None,
+                stats=None):
+    """
+    Phase 1 of a review: OCR and detection only, nothing is drawn.
+    Returns one dict per page: {"page": PageImage, "lines": its OCR
+    lines, "entities": [(coords, label, conf), ...]}. Every page is
+    kept for render_reviewed_pages(), so they all count against the
+    memory budget.
+    """
+    file_type = filename.split('.')[-1].lower()
+    max_pages = None if all_pages else 1
+    pages_total = 1
+    if file_type == "pdf":
+        pages_total, page_bytes = pdf_page_info(file_bytes, max_pages=max_pages)
+        check_budget(resident_bytes(file_bytes) + page_bytes + pages_total * page_bytes // PAGE_COPIES,
+                     f"keeping {pages_total} pages for review")
+    _report(progress, "render", 0, pages_total)
+
+    timings = {}
+    detected = []
+    for group in _page_groups(_review_pages(file_bytes, file_type, max_pages), OCR_PAGES_PER_BATCH):
+        group_ocr = _group_ocr([(page, text_layer) for (page, text_layer, _, _) in group],
+                               timings, progress)
+        for index, (page, text_layer, content, source) in enumerate(group):
+            lines = text_layer[0] if text_layer is not None else group_ocr.get(index)
+
+            def get_lines(page=page, lines=lines):
+                if lines is not None:
+                    return lines
+                # Was cached when the group was OCR'd, evicted since
+                results = run_ocr_on_images([page.array], timings=timings)
+                if results is None:
+                    raise Exception("OCR process failed.")
+                return results[0]
+
+            ocr_results, entities = detect_entities(
+                content, source, get_lines, categories_to_find,
+                text_layer[1] if text_layer is not None else None, progress, with_confidence=True)
+            _count_labels(stats, Counter(label for (_, label, _) in entities))
+            detected.append({"page": page, "lines": ocr_results, "entities": entities})
+            _report(progress, "page", len(detected), pages_total)
+
+    _add_timings(stats, timings)
+    if not detected:
+        raise Exception("PDF has no pages.")
+    return detected
+
+
+def render_reviewed_pages(pages, stats=None):
+    """
+    Phase 2 of a review: draws the reviewed boxes on the pages kept
+    by detect_file() and returns the redacted PDF bytes. 'pages' is
+    [(PageImage, [(coords, label), ...]), ...]. No model runs here.
+    """
+    timings = {}
+    output_pdf = fitz.open()
+    try:
+        for page, entities in pages:
+            redacted_array = redact_image_with_labels(page.array, entities)
+            if redacted_array is None:
+                raise Exception("Redaction drawing failed.")
+            page_pdf, encoding = encode_page(redacted_array, page.dpi, timings)
+            _append_pdf_page(output_pdf, page_pdf)
+            _count_labels(stats, Counter(label for (_, label) in entities))
+            _count_encoding(stats, encoding, page_pdf)
+        _add_timings(stats, timings)
+        return output_pdf.tobytes(garbage=3, deflate=True)
+    finally:
+        output_pdf.close()
@@ -0,0 +1,167 @@
+# -----------------------------------------------------------------
+# preprocess.py
+#
+# Preprocessing profiles for OCR, picked per page from cheap image
+# statistics (a histogram of every 4th pixel in each direction).
+# - "skip": clean black-on-white pages (rasterized text files,
+#   born-digital PDF renders) go to EasyOCR as they are.
+# - "grayscale": clean pages with colour or anti-aliased grey text:
+#   converted to grey only, since a hard threshold eats thin strokes.
+# - "otsu": low-contrast or noisy scans with an even background:
+#   Otsu threshold to black text on white.
+# - "adaptive": scans whose paper is much darker in some parts (shadows,
+#   uneven lighting): a local (adaptive) threshold.
+# - "downscale": pages more than DOWNSCALE_LONG_SIDE pixels long
+#   (high-DPI scans) are shrunk to DOWNSCALE_TARGET first, then
+#   thresholded. The OCR boxes are scaled back to page pixels.
+#   Strips much longer than a sheet of paper (rasterized long text
+#   files) are not downscaled: the OCR tiles them (tiling.py).
+# - "legacy": the old fixed invert + threshold at 127.
+# REDACT_PREPROCESS forces one profile for every page; "auto"
+# (default) chooses per page.
+# -----------------------------------------------------------------
+
+import os
+
+import cv2
+import numpy as np
+
+from telemetry import get_logger
+
+PREPROCESS_PROFILES = ("skip", "grayscale", "otsu", "adaptive", "downscale", "legacy")
+PREPROCESS_MODE = os.environ.get("REDACT_PREPROCESS", "auto")
+
+# Longest side (pixels) above which a page is downscaled, and the
+# longest side it is downscaled to (~A4 at 300 and 200 DPI)
+DOWNSCALE_LONG_SIDE = int(os.environ.get("REDACT_PREPROCESS_DOWNSCALE_PX", 3600))
+DOWNSCALE_TARGET = int(os.environ.get("REDACT_PREPROCESS_TARGET_PX", 2400))
+# Pages longer than this many times their width are strips, not sheets
+SHEET_MAX_ASPECT = 2.0
+
+# A page is clean when at most this share of its pixels is mid-grey
+# and paper and ink are this far apart
+CLEAN_MAX_MID_SHARE = 0.05
+GRAYSCALE_MAX_MID_SHARE = 0.12
+CLEAN_MIN_CONTRAST = 160
+COLOUR_MAX_SHARE = 0.02
+# Paper levels of the page's tiles further apart than this: uneven
+UNEVEN_MIN_SPREAD = 40
+TILES = 4
+PAPER_KERNEL = np.ones((5, 5), np.uint8)
+ADAPTIVE_BLOCK = 31
+ADAPTIVE_C = 15
+
+if PREPROCESS_MODE not in PREPROCESS_PROFILES + ("auto",):
+    get_logger("preprocess").warning(f"Unknown REDACT_PREPROCESS '{PREPROCESS_MODE}', using 'auto'.")
+    PREPROCESS_MODE = "auto"
+
+
+# --- 1. PAGE STATISTICS ---
+
+def _sample(image):
+    """Every 4th pixel in each direction, as a compact array."""
+    height, width = image.shape[:2]
+    return cv2.resize(image, (max(1, width // 4), max(1, height // 4)), interpolation=cv2.INTER_NEAREST)
+
+
+def page_statistics(pixels):
+    """
+    Cheap statistics of an RGB (or grey) page, on every 4th pixel in
+    each direction: paper level, contrast, share of mid-grey and of
+    coloured pixels, and how much the paper level varies between
+    tiles.
+    """
+    sample = _sample(pixels)
+    if sample.ndim == 3:
+        red, green, blue = cv2.split(sample)
+        spread = cv2.absdiff(cv2.max(cv2.max(red, green), blue), cv2.min(cv2.min(red, green), blue))
+        colour = np.count_nonzero(spread > 48) / spread.size
+        gray = cv2.cvtColor(sample, cv2.COLOR_RGB2GRAY)
+    else:
+        colour, gray = 0.0, sample
+    histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    cumulative = np.cumsum(histogram) / gray.size
+    low, median, high = (int(np.searchsorted(cumulative, q)) for q in (0.01, 0.5, 0.99))
+
+    # Paper level per tile: a max filter wipes out the (thin, dark)
+    # text, then each tile is averaged
+    paper = cv2.resize(cv2.dilate(gray, PAPER_KERNEL), (TILES, TILES), interpolation=cv2.INTER_AREA)
+    return {
+        "paper": median,
+        "contrast": high - low,
+        "mid_share": float(histogram[64:192].sum() / gray.size),
+        "colour_share": float(colour),
+        "paper_spread": float(paper.max()) - float(paper.min())
+    }
+
+
+def choose_profile(stats, long_side):
+    """The profile for a page with these statistics."""
+    if long_side > DOWNSCALE_LONG_SIDE:
+        return "downscale"
+    if stats["paper"] >= 128 and stats["contrast"] >= CLEAN_MIN_CONTRAST:
+        if stats["mid_share"] <= CLEAN_MAX_MID_SHARE and stats["colour_share"] <= COLOUR_MAX_SHARE:
+            return "skip"
+        if stats["mid_share"] <= GRAYSCALE_MAX_MID_SHARE and stats["paper_spread"] < UNEVEN_MIN_SPREAD:
+            return "grayscale"
+    if stats["paper_spread"] >= UNEVEN_MIN_SPREAD:
+        return "adaptive"
+    return "otsu"
+
+
+# --- 2. APPLYING A PROFILE ---
+
+def _threshold(gray, adaptive):
+    """Black text on white paper, whatever the page's polarity."""
+    # White text on a dark background: flip it first
+    if np.median(gray[::8, ::8]) < 128:
+        gray = cv2.bitwise_not(gray)
+    # Without the blur, scanner noise on the paper can split it in two
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    if adaptive:
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                                     ADAPTIVE_BLOCK, ADAPTIVE_C)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return binary
+
+
+def prepare_for_ocr(pixels, profile=None, allow_downscale=True):
+    """
+    Runs a preprocessing profile on an RGB page. Returns
+    (image for EasyOCR, profile that ran, scale), where 'scale' is
+    prepared size / page size (OCR boxes must be divided by it).
+    'profile' None uses REDACT_PREPROCESS.
+    """
+    profile = profile or PREPROCESS_MODE
+    height, width = pixels.shape[:2]
+    if max(height, width) > SHEET_MAX_ASPECT * min(height, width):
+        allow_downscale = False
+    if profile == "auto":
+        profile = choose_profile(page_statistics(pixels),
+                                 max(pixels.shape[:2]) if allow_downscale else 0)
+    if profile == "skip":
+        return pixels, "skip", 1.0
+
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    long_side = max(gray.shape[:2])
+    if profile == "legacy":
+        _, binary = cv2.threshold(cv2.bitwise_not(gray), 127, 255, cv2.THRESH_BINARY)
+        return binary, "legacy", 1.0
+    if profile == "grayscale":
+        return gray, "grayscale", 1.0
+
+    scale = 1.0
+    if profile == "downscale":
+        if allow_downscale and long_side > DOWNSCALE_TARGET:
+            scale = DOWNSCALE_TARGET / long_side
+            gray = cv2.resize(gray, (round(gray.shape[1] * scale), round(gray.shape[0] * scale)),
+                              interpolation=cv2.INTER_AREA)
+        adaptive = page_statistics(gray)["paper_spread"] >= UNEVEN_MIN_SPREAD
+    else:
+        adaptive = profile == "adaptive"
+    return _threshold(gray, adaptive), profile, scale
+
+
+def scale_box(box, scale):
+    """An OCR box found on a downscaled page, in page pixels."""
+    return [[x / scale, y / scale] for (x, y) in box]
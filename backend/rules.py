@@ -0,0 +1,197 @@
+# -----------------------------------------------------------------
+# rules.py
+#
+# Declarative regex rules for structured identifiers, and a
+# matcher that checks all of them in one scan per line.
+# - Each rule is a label, a pattern, and optional context words
+#   that must appear in the line for the rule to apply.
+# - All context words are found in ONE pass over the line and
+#   cheap pre-checks skip rules that can't match, so only the
+#   patterns that can hit are run. Results are the same as
+#   running re.search()/finditer() per rule.
+# - Extra rules can be added without code changes through a JSON
+#   file (REDACT_RULES_FILE), e.g.:
+#     [{"label": "PASSPORT", "pattern": "\\b[A-Z]\\d{7}[A-Z]\\b",
+#       "ignore_case": true, "context": ["passport"]}]
+# -----------------------------------------------------------------
+
+import json
+import os
+import re
+
+phone_pattern = r'(\b[689]\d{3}[\s-]?\d{4}\b)|(\+[\d\s\-\(\)]{7,17}\d\b)'
+date_pattern = r'\b(?:dob|birth)\b[^\dA-Za-z]{0,5}((?:\d{1,2}[./-]\d{1,2}[./-]\d{2,4})|(?:\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s\d{1,2},?\s\d{2,4}\b))'
+
+id_pattern = r'\b(?:[A-Z]{2}\d{6}|\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{3,4})\b'
+
+# - context: words that must appear in the (lower-cased) line.
+#   None means the rule always applies.
+# - context_match: "word" (whole words, the default) or
+#   "substring" (anywhere in the line).
+# - requires (optional): cheap pre-check before any regex runs:
+#   "digit" (line must contain a digit) or a list of strings that
+#   must all be in the line. Only set it if every match needs it.
+REDACTION_RULES = [
+    {"label": "NRIC/FIN", "pattern": r'\b[STFGM]\d{7}[A-Z]\b', "ignore_case": True,
+     "context": ["nric", "fin", "passport"], "requires": "digit"},
+    # Simple pattern, relies on context filter
+    {"label": "MCR no.", "pattern": r'\b\d{6}\b', "ignore_case": False,
+     "context": ["mcr"], "context_match": "substring", "requires": "digit"},
+    {"label": "EMAIL", "pattern": r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+     "ignore_case": True, "context": None, "requires": ["@"]},
+    # --- THIS IS THE FIX (v24) ---
+    # REMOVED the context filter for PHONE
+    {"label": "PHONE", "pattern": phone_pattern, "ignore_case": False, "context": None,
+     "requires": "digit"},
+    {"label": "DATE", "pattern": date_pattern, "ignore_case": True,
+     "context": ["date", "birth", "dob"], "requires": "digit"},
+    {"label": "ID_NUMBER", "pattern": id_pattern, "ignore_case": True,
+     "context": ["med. number", "ihi", "id"], "requires": "digit"}
+]
+
+
+def load_rules_file(path):
+    """Reads extra rules (a JSON list in the REDACTION_RULES format)."""
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    for rule in rules:
+        if "label" not in rule or "pattern" not in rule:
+            raise ValueError(f"Rule in {path} needs a 'label' and a 'pattern': {rule}")
+        re.compile(rule["pattern"])  # fail early on a bad pattern
+    return rules
+
+
+# --- 1. BUILDING THE MATCHER ---
+
+WORD_RE = re.compile(r"\w+")
+DIGIT_RE = re.compile(r"\d")
+
+
+def _pattern_flags(rule):
+    return re.IGNORECASE if rule.get("ignore_case") else 0
+
+
+class RuleMatcher:
+    """
+    Runs all REDACTION_RULES over a line with as little work as possible:
+    - cheap pre-checks ("requires") drop rules that can't match,
+    - the context words of ALL rules are checked against ONE
+      tokenization of the line (a set lookup per line, not a
+      regex per rule),
+    - only the rules left over run their pattern.
+    Results are identical to looping over the rules with a context
+    re.search() and a finditer() each.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.labels = [rule["label"] for rule in self.rules]
+        self.patterns = [re.compile(rule["pattern"], _pattern_flags(rule)) for rule in self.rules]
+
+        # Context word -> indexes of the rules that need it, split by
+        # how the word can be checked:
+        # - single whole words: \bword\b <=> word is one of the line's
+        #   \w+ tokens, so one findall() covers all of them,
+        # - other whole-word phrases (e.g. "med. number"): substring
+        #   check first, then confirm the boundaries with a regex,
+        # - substring words: plain "in".
+        self._token_rules = {}
+        phrase_rules = {}
+        substring_rules = {}
+        for i, rule in enumerate(self.rules):
+            for word in rule.get("context") or []:
+                word = word.lower()
+                if rule.get("context_match", "word") == "substring":
+                    substring_rules.setdefault(word, set()).add(i)
+                elif WORD_RE.fullmatch(word):
+                    self._token_rules.setdefault(word, set()).add(i)
+                else:
+                    phrase_rules.setdefault(word, set()).add(i)
+
+        self._token_words = frozenset(self._token_rules)
+        self._phrase_checks = [
+            (word, re.compile(rf"\b{re.escape(word)}\b"), rules)
+            for word, rules in phrase_rules.items()
+        ]
+        self._substring_checks = list(substring_rules.items())
+        self._plans = {}
+
+    def _plan(self, categories_to_find):
+        """Per category selection: the rules to try and their pre-checks."""
+        key = frozenset(categories_to_find)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = []
+            for i, rule in enumerate(self.rules):
+                if rule["label"] not in key:
+                    continue
+                requires = rule.get("requires")
+                plan.append((
+                    i,
+                    requires == "digit",
+                    requires if isinstance(requires, list) else (),
+                    bool(rule.get("context"))
+                ))
+            self._plans[key] = plan
+        return plan
+
+    def _found_context_rules(self, lower_text):
+        """Indexes of rules whose context words appear in the line."""
+        found = set()
+        if self._token_words:
+            for word in self._token_words.intersection(WORD_RE.findall(lower_text)):
+                found |= self._token_rules[word]
+        for (word, regex, rules) in self._phrase_checks:
+            if word in lower_text and regex.search(lower_text):
+                found |= rules
+        for (word, rules) in self._substring_checks:
+            if word in lower_text:
+                found |= rules
+        return found
+
+    def active_rules(self, text, categories_to_find):
+        """
+        Indexes of rules that apply to this line: asked for, passing
+        the pre-check, and (if the rule has context words) with
+        context present.
+        """
+        plan = self._plan(categories_to_find)
+        if not plan:
+            return []
+
+        has_digit = None
+        context_rules = None
+        active = []
+        for (i, needs_digit, needs_strings, needs_context) in plan:
+            if needs_digit:
+                if has_digit is None:
+                    has_digit = DIGIT_RE.search(text) is not None
+                if not has_digit:
+                    continue
+            if needs_strings and not all(s in text for s in needs_strings):
+                continue
+            if needs_context:
+                if context_rules is None:
+                    context_rules = self._found_context_rules(text.lower())
+                if i not in context_rules:
+                    continue
+            active.append(i)
+        return active
+
+    def find_all(self, text, categories_to_find):
+        """
+        Returns [(label, start_char, end_char), ...] in the same order as
+        looping over the rules and calling finditer() for each.
+        """
+        return [
+            (self.labels[i], match.start(), match.end())
+            for i in self.active_rules(text, categories_to_find)
+            for match in self.patterns[i].finditer(text)
+        ]
+
+
+RULES_FILE = os.environ.get("REDACT_RULES_FILE")
+if RULES_FILE:
+    REDACTION_RULES = REDACTION_RULES + load_rules_file(RULES_FILE)
+
+RULE_MATCHER = RuleMatcher(REDACTION_RULES)
@@ -0,0 +1,180 @@
+# -----------------------------------------------------------------
+# sessions.py
+#
+# Review sessions for the two-phase API (POST /detect, then
+# POST /render).
+# - A session keeps what detection produced for one upload: the
+#   rendered pages (NumPy arrays), their OCR lines and the detected
+#   entities, each with a stable id ("p0-e3") the reviewer can
+#   reject. Rendering after a review only draws and encodes.
+# - Sessions expire SESSION_TTL seconds after their last use.
+# - The pages are big (about 11 MB per 200-DPI A4 page), so the
+#   store is capped at SESSION_MAX_BYTES. The least recently used
+#   sessions are dropped to make room, and a single document bigger
+#   than the cap raises MemoryBudgetError.
+# - Everything is in memory only (never on disk): it is PHI.
+# -----------------------------------------------------------------
+
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from engine import ALL_CATEGORIES
+from uploads import MemoryBudgetError
+
+SESSION_TTL = int(os.environ.get("REDACT_SESSION_TTL", 900))
+SESSION_MAX_BYTES = int(os.environ.get("REDACT_SESSION_MAX_MB", 1024)) * 1024 * 1024
+
+
+class ReviewError(Exception):
+    """The review sent to /render doesn't fit its session (bad id, page, label or box)."""
+
+
+class Session:
+    """One detected document waiting for its review."""
+
+    def __init__(self, filename, categories, pages):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.categories = categories
+        # [{"page": PageImage, "lines": [...], "entities": [(coords, label, conf), ...]}]
+        self.pages = pages
+        self.nbytes = sum(page["page"].array.nbytes for page in pages)
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.renders = 0
+
+    def entity_id(self, page_number, index):
+        return f"p{page_number}-e{index}"
+
+    def to_dict(self):
+        """Detection results as JSON: boxes in page pixels, labels without <>."""
+        pages = []
+        for page_number, detected in enumerate(self.pages):
+            page = detected["page"]
+            pages.append({
+                "page": page_number,
+                "width": page.width,
+                "height": page.height,
+                "dpi": page.dpi,
+                "entities": [
+                    {
+                        "id": self.entity_id(page_number, index),
+                        "label": label.strip("<>"),
+                        "box": [round(float(value), 1) for value in
+                                (coords[0][0], coords[0][1], coords[2][0], coords[2][1])],
+                        "confidence": round(float(conf), 4)
+                    }
+                    for index, (coords, label, conf) in enumerate(detected["entities"])
+                ]
+            })
+        return {
+            "session_id": self.id,
+            "filename": self.filename,
+            "categories": self.categories,
+            "expires_in": SESSION_TTL,
+            "pages": pages
+        }
+
+    def reviewed_pages(self, accepted=None, rejected=(), added=()):
+        """
+        Applies a review and returns [(PageImage, [(coords, label), ...])]
+        for pipeline.render_reviewed_pages().
+        - accepted: entity ids to keep (None keeps every detected one)
+        - rejected: entity ids to drop
+        - added: [{"page": n, "box": [x0, y0, x1, y1], "label": "PERSON"}],
+          the label one of engine.ALL_CATEGORIES
+        Raises ReviewError on unknown ids, pages, labels or malformed boxes.
+        """
+        known = {self.entity_id(page_number, index)
+                 for page_number, detected in enumerate(self.pages)
+                 for index in range(len(detected["entities"]))}
+        unknown = (set(accepted or ()) | set(rejected)) - known
+        if unknown:
+            raise ReviewError(f"Unknown entity id(s): {', '.join(sorted(unknown))}")
+        keep = known if accepted is None else set(accepted)
+        keep -= set(rejected)
+
+        reviewed = []
+        for page_number, detected in enumerate(self.pages):
+            entities = [(coords, label) for index, (coords, label, _) in enumerate(detected["entities"])
+                        if self.entity_id(page_number, index) in keep]
+            reviewed.append((detected["page"], entities))
+
+        for box in added:
+            try:
+                page_number = int(box["page"])
+                if page_number < 0:
+                    raise IndexError(page_number)
+                page, entities = reviewed[page_number]
+                x0, y0, x1, y1 = (float(value) for value in box["box"])
+                if not all(math.isfinite(value) for value in (x0, y0, x1, y1)) or x0 >= x1 or y0 >= y1:
+                    raise ValueError(box["box"])
+                label = box["label"]
+            except (KeyError, IndexError, TypeError, ValueError):
+                raise ReviewError(f"Bad added box: {box!r}")
+            # The label is drawn on the page: only known categories
+            if not isinstance(label, str) or label.strip("<>") not in ALL_CATEGORIES:
+                raise ReviewError(f"Unknown label {label!r} on added box, expected one of "
+                                  f"{', '.join(ALL_CATEGORIES)}")
+            label = f"<{label.strip('<>')}>"
+            entities.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], label))
+        return reviewed
+
+
+class SessionStore:
+    """Sessions by id, with a TTL and a total size cap (LRU)."""
+
+    def __init__(self, ttl=SESSION_TTL, max_bytes=SESSION_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, filename, categories, pages):
+        session = Session(filename, categories, pages)
+        if session.nbytes > self.max_bytes:
+            raise MemoryBudgetError(
+                f"This document's pages need about {session.nbytes / 2 ** 20:.0f} MB, more than the "
+                f"{self.max_bytes / 2 ** 20:.0f} MB review sessions may hold (REDACT_SESSION_MAX_MB).")
+        self._drop_expired()
+        with self._lock:
+            self._sessions[session.id] = session
+            # Oldest first: make room for the new one
+            while self.total_bytes() > self.max_bytes:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id):
+        """The session (refreshing its TTL), or None if unknown/expired."""
+        self._drop_expired()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.time()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def discard(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def total_bytes(self):
+        return sum(session.nbytes for session in self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _drop_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [session_id for session_id, session in self._sessions.items()
+                       if now - session.last_used > self.ttl]
+            for session_id in expired:
+                del self._sessions[session_id]
+
+
+SESSIONS = SessionStore()
@@ -0,0 +1,347 @@
+# -----------------------------------------------------------------
+# telemetry.py
+#
+# Logging, timing spans and Prometheus metrics, with no extra
+# dependencies.
+# - Logging: every record carries the current request ID, so all
+#   lines of one request (including its job thread or prefork
+#   worker) can be grepped together. REDACT_LOG_FORMAT=json writes
+#   one JSON object per line; "text" (default) is key=value style.
+# - span("ocr_detect") times a block into the
+#   redact_stage_seconds histogram and into the current request's
+#   span list; request_context() logs a per-stage summary when the
+#   request ends.
+# - METRICS renders everything in the Prometheus text format for
+#   GET /metrics. Gauges (queue depth, model state, ...) are read
+#   when scraped.
+# - Forked processes (prefork workers, the page pool) start from
+#   an empty registry and send drain() deltas back to the parent,
+#   which merge()s them, so /metrics covers all processes.
+# - REDACT_METRICS=0 turns spans into no-ops.
+# -----------------------------------------------------------------
+
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+LOG_FORMAT = os.environ.get("REDACT_LOG_FORMAT", "text")
+LOG_LEVEL = os.environ.get("REDACT_LOG_LEVEL", "INFO").upper()
+METRICS_ENABLED = os.environ.get("REDACT_METRICS", "1").lower() not in ("0", "false", "no")
+
+# Seconds; covers a fast regex pass up to OCR of a large group
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+REQUEST_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_spans = contextvars.ContextVar("spans", default=None)
+
+
+# --- 1. LOGGING ---
+
+class _RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get() or "-"
+        return True
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": record.request_id,
+            "msg": record.getMessage()
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s request_id=%(request_id)s %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def configure_logging(log_format=LOG_FORMAT, level=LOG_LEVEL):
+    """Sets up the "redact" loggers once: stderr, request IDs, text or JSON."""
+    root = logging.getLogger("redact")
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.addFilter(_RequestIdFilter())
+    handler.setFormatter(_JsonFormatter() if log_format == "json" else _TextFormatter())
+    root.addHandler(handler)
+    root.setLevel(level)
+    root.propagate = False
+
+
+def get_logger(name):
+    """Logger "redact.<name>". Pass structured fields as extra={"fields": {...}}."""
+    return logging.getLogger(f"redact.{name}")
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+@contextlib.contextmanager
+def request_context(request_id=None, log_summary=True):
+    """
+    Tags everything in this block (logs, spans) with 'request_id'
+    (a new one if None). On exit, logs the seconds per stage.
+    Yields the list of (stage, seconds) spans recorded so far.
+    """
+    request_id = request_id or uuid.uuid4().hex[:16]
+    id_token = _request_id.set(request_id)
+    spans = []
+    spans_token = _spans.set(spans)
+    start = time.perf_counter()
+    try:
+        yield spans
+    finally:
+        _spans.reset(spans_token)
+        if log_summary and spans:
+            get_logger("telemetry").info(
+                "request stages", extra={"fields": dict(
+                    summarize_spans(spans), total_s=round(time.perf_counter() - start, 3))})
+        _request_id.reset(id_token)
+
+
+def summarize_spans(spans):
+    """{stage: total seconds} for a list of (stage, seconds)."""
+    totals = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return {stage: round(seconds, 4) for stage, seconds in totals.items()}
+
+
+# --- 2. METRICS ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    """Monotonic counter, one value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with METRICS.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def _render(self):
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_label_text(self.labels, key)} {value}"
+
+    def _drain(self):
+        values, self.values = self.values, {}
+        return values
+
+    def _merge(self, delta):
+        for key, value in delta.items():
+            self.values[key] = self.values.get(key, 0) + value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}   # key -> [count per bucket (+Inf last), sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with METRICS.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _render(self):
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_label_text(self.labels + ('le',), key + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labels, key)} {round(total, 6)}"
+            yield f"{self.name}_count{_label_text(self.labels, key)} {cumulative}"
+
+    def _drain(self):
+        values, self.values = self.values, {}
+        return values
+
+    def _merge(self, delta):
+        for key, (counts, total) in delta.items():
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+
+
+class Gauge:
+    """Value read at scrape time: read() returns {label values tuple: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), read=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.read = read
+
+    def _render(self):
+        try:
+            values = self.read() if self.read is not None else {}
+        except Exception as e:
+            get_logger("telemetry").warning(f"gauge {self.name} failed: {e}")
+            return
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labels, key)} {value}"
+
+
+class MetricsRegistry:
+    """All metrics of this process, plus what forked children sent back."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=STAGE_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, labels=(), read=None):
+        return self._add(Gauge(name, help_text, labels, read))
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            for metric in self.metrics.values():
+                if isinstance(metric, Gauge):
+                    continue
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric._render())
+        # Gauges call back into other modules: outside the lock
+        for metric in self.metrics.values():
+            if isinstance(metric, Gauge):
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} gauge")
+                lines.extend(metric._render())
+        return "\n".join(lines) + "\n"
+
+    def drain(self):
+        """Counter/histogram values since the last drain (picklable), then zero."""
+        with self.lock:
+            return {name: metric._drain() for name, metric in self.metrics.items()
+                    if not isinstance(metric, Gauge)}
+
+    def merge(self, delta):
+        """Adds a drain() from another process."""
+        if not delta:
+            return
+        with self.lock:
+            for name, values in delta.items():
+                if name in self.metrics:
+                    self.metrics[name]._merge(values)
+
+    def reset(self):
+        """Forgets all values, e.g. in a freshly forked child."""
+        self.drain()
+
+
+METRICS = MetricsRegistry()
+
+STAGE_SECONDS = METRICS.histogram(
+    "redact_stage_seconds", "Seconds spent per pipeline stage.", ["stage"])
+REQUEST_SECONDS = METRICS.histogram(
+    "redact_document_seconds", "Seconds to redact one document.", ["file_type"],
+    buckets=REQUEST_BUCKETS)
+DOCUMENTS = METRICS.counter(
+    "redact_documents_total", "Documents redacted, by file type and outcome.",
+    ["file_type", "status"])
+ENTITIES = METRICS.counter(
+    "redact_entities_total", "Entities redacted, by category.", ["category"])
+CACHE_LOOKUPS = METRICS.counter(
+    "redact_cache_lookups_total", "Result cache lookups, by outcome.", ["result"])
+PREPROCESS_PAGES = METRICS.counter(
+    "redact_preprocess_pages_total", "Pages prepared for OCR, by preprocessing profile.", ["profile"])
+
+
+# --- 3. SPANS ---
+
+@contextlib.contextmanager
+def span(stage):
+    """Times the block as 'stage' (histogram + current request's spans)."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def traced(stage):
+    """Decorator form of span() for functions that are one stage."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+configure_logging()
@@ -0,0 +1,13 @@
+# -----------------------------------------------------------------
+# tests/conftest.py
+#
+# The backend modules import each other flat (run from backend/),
+# so the tests put the backend folder on sys.path.
+# Usage (from the backend folder):
+#   python -m pytest tests
+# -----------------------------------------------------------------
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
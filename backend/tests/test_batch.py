@@ -0,0 +1,46 @@
+import json
+import threading
+import zipfile
+from io import BytesIO
+
+from batch import stream_batch_zip
+from jobs import JobManager
+
+
+def fake_redact(file_bytes, filename, categories, all_pages=False, output_format="pdf",
+                progress=None, stats=None):
+    stats["timings"] = {"ocr_detect": 0.5, "encode_png": 0.25}
+    stats["entities"] = {"<PERSON>": 1}
+    return b"redacted " + file_bytes, "image/png", filename + ".png"
+
+
+def test_manifest_lists_stage_seconds():
+    manager = JobManager(workers=1, queue_size=4, result_ttl=60)
+    body = b"".join(stream_batch_zip([("a.txt", b"one"), ("b.txt", b"two")], ["PERSON"], manager,
+                                     redact=fake_redact))
+    with zipfile.ZipFile(BytesIO(body)) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        assert archive.read("a.png") == b"redacted one"
+    assert manifest["succeeded"] == 2
+    timings = manifest["files"][0]["timings"]
+    assert "ocr_seconds" not in timings
+    assert timings["stage_seconds"] == {"ocr_detect": 0.5, "encode_png": 0.25}
+    assert len(manager._jobs) == 0
+
+
+def test_abandoned_stream_drops_results():
+    manager = JobManager(workers=1, queue_size=4, result_ttl=3600)
+    release = threading.Event()
+
+    def slow_redact(file_bytes, *args, **kwargs):
+        if file_bytes != b"first":
+            release.wait(5)
+        return fake_redact(file_bytes, *args, **kwargs)
+
+    files = [("first.txt", b"first"), ("second.txt", b"second"), ("third.txt", b"third")]
+    stream = stream_batch_zip(files, ["PERSON"], manager, redact=slow_redact)
+    next(stream)  # the first file is in the ZIP, the others are still queued
+    assert len(manager._jobs) == 2
+    stream.close()  # the client went away
+    release.set()
+    assert len(manager._jobs) == 0
@@ -0,0 +1,58 @@
+import json
+import os
+
+from bulk import Manifest, redact_one, settings_id
+
+
+class FakePool:
+    def __init__(self):
+        self.calls = 0
+
+    def redact(self, upload, filename, categories, stats=None, block=False, **options):
+        self.calls += 1
+        stats["entities"] = {"<PERSON>": 2}
+        return b"redacted", "application/pdf", "REDACTED_" + filename
+
+
+def manifest_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_missing_file_is_recorded_as_failed(tmp_path):
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    manifest = Manifest(manifest_path)
+    pool = FakePool()
+    settings = settings_id(["PERSON"], False, "pdf")
+    status, size = redact_one(pool, manifest, str(tmp_path / "in"), str(tmp_path / "out"),
+                              "gone.png", "gone.pdf", ["PERSON"], False, "pdf", settings)
+    manifest.close()
+    assert (status, size) == ("failed", 0)
+    assert pool.calls == 0
+    [entry] = manifest_lines(manifest_path)
+    assert entry["status"] == "failed" and entry["input"] == "gone.png" and entry["error"]
+
+
+def test_done_then_skipped_then_copied(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    (input_dir / "a.png").write_bytes(b"scan")
+    (input_dir / "b.png").write_bytes(b"scan")
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    settings = settings_id(["PERSON"], False, "pdf")
+    pool = FakePool()
+
+    def run(name):
+        manifest = Manifest(manifest_path)
+        try:
+            return redact_one(pool, manifest, str(input_dir), str(output_dir), name,
+                              name.replace(".png", ".pdf"), ["PERSON"], False, "pdf", settings)
+        finally:
+            manifest.close()
+
+    assert run("a.png") == ("done", 4)
+    assert (output_dir / "a.pdf").read_bytes() == b"redacted"
+    assert run("a.png") == ("skipped", 4)
+    assert run("b.png") == ("copied", 4)  # same content, other name
+    assert pool.calls == 1
+    assert os.path.exists(output_dir / "b.pdf")
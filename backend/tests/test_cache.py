@@ -0,0 +1,95 @@
+import os
+import stat
+import subprocess
+import sys
+
+import numpy as np
+
+from cache import ResultCache, cache_key
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2, disk_dir=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_disk_tier_hit_after_memory_eviction(tmp_path):
+    cache = ResultCache(max_entries=1, disk_dir=str(tmp_path / "cache"))
+    cache.put("a", {"lines": ["x"]})
+    cache.put("b", {"lines": ["y"]})
+    assert cache.get("a") == {"lines": ["x"]}
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    value = ["x" * 100]
+    size = len('["' + "x" * 100 + '"]')
+    cache = ResultCache(max_entries=0, disk_dir=str(tmp_path), disk_max_bytes=size * 2)
+    cache.put("old", value)
+    cache.put("recent", value)
+    os.utime(cache._disk_path("old"), (1000, 1000))
+    os.utime(cache._disk_path("recent"), (2000, 2000))
+    cache.put("new", value)
+    assert not os.path.exists(cache._disk_path("old"))
+    assert cache.contains("recent") and cache.contains("new")
+    assert cache.stats()["disk_bytes"] == size * 2
+
+
+def test_disk_files_are_private(tmp_path):
+    folder = tmp_path / "cache"
+    cache = ResultCache(max_entries=0, disk_dir=str(folder))
+    cache.put("key", [1, 2])
+    assert stat.S_IMODE(os.stat(folder).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(cache._disk_path("key")).st_mode) == 0o600
+    assert [name for name in os.listdir(folder) if name.endswith(".tmp")] == []
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    ResultCache(max_entries=0, disk_dir=str(tmp_path)).put("key", [1])
+    reopened = ResultCache(max_entries=0, disk_dir=str(tmp_path))
+    assert reopened.get("key") == [1]
+    assert reopened.stats()["disk_bytes"] > 0
+
+
+def test_key_depends_on_content_and_params_only():
+    page = np.arange(60, dtype=np.uint8).reshape(5, 4, 3)
+    params = {"ocr": "easyocr-en", "ner": "trf"}
+    key = cache_key(page, params)
+    assert cache_key(page.copy(), dict(reversed(list(params.items())))) == key
+    # A non-contiguous view of the same pixels hashes the same
+    wide = np.zeros((5, 8, 3), dtype=np.uint8)
+    wide[:, ::2] = page
+    assert cache_key(wide[:, ::2], params) == key
+    assert cache_key(page, {**params, "ner": "sm"}) != key
+    assert cache_key(page.reshape(4, 5, 3), params) != key
+    assert cache_key("text", params) == cache_key(b"text", params)
+
+
+def test_key_is_stable_across_processes():
+    code = ("import numpy as np; from cache import cache_key; "
+            "print(cache_key(np.arange(12, dtype=np.uint8).reshape(2, 2, 3), {'b': 1, 'a': [2]}))")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), PYTHONHASHSEED="1")
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    expected = cache_key(np.arange(12, dtype=np.uint8).reshape(2, 2, 3), {"a": [2], "b": 1})
+    assert output.strip().splitlines()[-1] == expected
+
+
+def test_key_follows_tiling_and_word_lists(monkeypatch):
+    import pipeline
+
+    page = np.zeros((4, 4), dtype=np.uint8)
+    base = cache_key(page, pipeline._cache_params("ocr"))
+    monkeypatch.setattr(pipeline, "OCR_TILE_PX", 1024)
+    tiled = cache_key(page, pipeline._cache_params("ocr"))
+    monkeypatch.setattr(pipeline, "AI_BLOCK_LIST", pipeline.AI_BLOCK_LIST | {"ward"})
+    blocked = cache_key(page, pipeline._cache_params("ocr"))
+    assert len({base, tiled, blocked}) == 3
@@ -0,0 +1,130 @@
+import zipfile
+from io import BytesIO
+
+import docx
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+import document_redactor
+from document_redactor import _merge_spans, redact_docx_bytes, redact_run_texts
+
+
+def finding(start, end, label):
+    return {"start_char": start, "end_char": end, "label": label}
+
+
+def test_merge_spans_overlapping_and_nested():
+    spans = _merge_spans([finding(10, 20, "<B>"), finding(0, 12, "<A>"), finding(2, 5, "<C>")])
+    # The earliest finding's label wins, the span is the union
+    assert spans == [(0, 20, "<A>")]
+
+
+def test_merge_spans_keeps_adjacent_apart():
+    spans = _merge_spans([finding(5, 9, "<B>"), finding(0, 5, "<A>")])
+    assert spans == [(0, 5, "<A>"), (5, 9, "<B>")]
+
+
+def test_run_texts_finding_split_across_runs():
+    # "John Smith" is split over three runs
+    runs = ["Patient: Jo", "hn Sm", "ith, seen today"]
+    assert redact_run_texts(runs, [(9, 19, "<PERSON>")]) == ["Patient: <PERSON>", "", ", seen today"]
+
+
+def test_run_texts_span_ending_on_run_boundary():
+    runs = ["Call ", "555-1234", " now"]
+    assert redact_run_texts(runs, [(5, 13, "<PHONE>")]) == ["Call ", "<PHONE>", " now"]
+
+
+def test_run_texts_adjacent_spans():
+    text = "JohnSmith"
+    assert redact_run_texts([text], [(0, 4, "<A>"), (4, 9, "<B>")]) == ["<A><B>"]
+
+
+def test_run_texts_several_spans_in_one_run():
+    text = "A 1 B 2 C"
+    assert redact_run_texts([text], [(2, 3, "<N>"), (6, 7, "<N>")]) == ["A <N> B <N> C"]
+
+
+def fake_person_detection(monkeypatch):
+    """Finds "John Smith" and "S1234567D" wherever they appear."""
+    def fake_findings(lines, categories):
+        results = []
+        for (_, line, _) in lines:
+            found = []
+            for value, label in [("John Smith", "<PERSON>"), ("S1234567D", "<NRIC>")]:
+                if value in line:
+                    found.append(finding(line.index(value), line.index(value) + len(value), label))
+            results.append(found)
+        return results
+
+    class FakeModels:
+        def get(self, name):
+            return object()
+
+    monkeypatch.setattr(document_redactor, "find_line_findings", fake_findings)
+    monkeypatch.setattr(document_redactor, "MODELS", FakeModels())
+
+
+def test_docx_finding_split_across_runs(monkeypatch):
+    doc = docx.Document()
+    para = doc.add_paragraph("Patient: ")
+    para.add_run("Jo").bold = True
+    para.add_run("hn Smith")
+    para.add_run(" was seen.")
+    stream = BytesIO()
+    doc.save(stream)
+
+    fake_person_detection(monkeypatch)
+    redacted = docx.Document(BytesIO(redact_docx_bytes(stream.getvalue(), ["PERSON"])))
+    paragraph = redacted.paragraphs[0]
+    assert paragraph.text == "Patient: <PERSON> was seen."
+    assert "Jo" not in paragraph.text and "Smith" not in paragraph.text
+    # The runs (and their formatting) are kept
+    assert len(paragraph.runs) == 4 and paragraph.runs[1].bold
+
+
+TEXT_BOX = (
+    '<w:r %s><w:pict><v:shape><v:textbox><w:txbxContent>'
+    '<w:p><w:r><w:t>Box: John Smith</w:t></w:r></w:p>'
+    '</w:txbxContent></v:textbox></v:shape></w:pict></w:r>'
+) % (nsdecls("w") + ' xmlns:v="urn:schemas-microsoft-com:vml"')
+
+
+def test_docx_tables_headers_footers_and_text_boxes(monkeypatch):
+    doc = docx.Document()
+    doc.core_properties.author = "John Smith"
+    doc.core_properties.title = "Case notes S1234567D"
+    section = doc.sections[0]
+    section.header.paragraphs[0].text = "John Smith NRIC S1234567D"
+    section.footer.paragraphs[0].text = "Printed for John Smith"
+    section.different_first_page_header_footer = True
+    section.first_page_header.paragraphs[0].text = "First page: John Smith"
+
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "Name"
+    table.cell(0, 1).text = "John Smith"
+    nested = table.cell(0, 0).add_table(rows=1, cols=1)
+    nested.cell(0, 0).text = "NRIC S1234567D"
+    doc.add_paragraph("See box: ")._p.append(parse_xml(TEXT_BOX))
+    stream = BytesIO()
+    doc.save(stream)
+
+    fake_person_detection(monkeypatch)
+    data = redact_docx_bytes(stream.getvalue(), ["PERSON", "NRIC"])
+    redacted = docx.Document(BytesIO(data))
+
+    section = redacted.sections[0]
+    assert section.header.paragraphs[0].text == "<PERSON> NRIC <NRIC>"
+    assert section.footer.paragraphs[0].text == "Printed for <PERSON>"
+    assert section.first_page_header.paragraphs[0].text == "First page: <PERSON>"
+    cells = redacted.tables[0]
+    assert cells.cell(0, 1).text == "<PERSON>"
+    assert cells.cell(0, 0).tables[0].cell(0, 0).text == "NRIC <NRIC>"
+    assert redacted.core_properties.author == ""
+    assert redacted.core_properties.title == ""
+    # Nothing is left anywhere in the package (text box included)
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        for name in archive.namelist():
+            content = archive.read(name)
+            assert b"John Smith" not in content and b"S1234567D" not in content, name
+        assert b"Box: &lt;PERSON&gt;" in archive.read("word/document.xml")
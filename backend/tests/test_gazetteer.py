@@ -0,0 +1,124 @@
+import os
+import random
+import re
+import subprocess
+import sys
+
+from gazetteer import LABEL_BITS, Gazetteer, normalize
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = ["tan", "ah", "kow", "lee", "mei", "ling", "blk", "12", "road", "ang"]
+
+
+def brute_force(entries, text, categories, min_tokens=2):
+    """Every entry tried at every word of the line, then the longest kept."""
+    words = [(m.group().casefold(), m.start(), m.end()) for m in re.finditer(r"\w+", text)]
+    wanted = [(label, tuple(normalize(entry))) for label, entry in entries
+              if label in categories and len(normalize(entry)) >= min_tokens]
+    matches = set()
+    for label, key in wanted:
+        for i in range(len(words) - len(key) + 1):
+            if tuple(word for (word, _, _) in words[i:i + len(key)]) == key:
+                matches.add((label, words[i][1], words[i + len(key) - 1][2]))
+    kept = []
+    for label, start, end in sorted(matches, key=lambda m: (m[1], -m[2])):
+        if not any(k[0] == label and k[1] <= start and end <= k[2] for k in kept):
+            kept.append((label, start, end))
+    return kept
+
+
+def random_text(rng, count):
+    return " ".join(rng.choice(WORDS + ["x", "Ah", "TAN,"]) for _ in range(count))
+
+
+def test_matches_brute_force_on_random_lists():
+    rng = random.Random(11)
+    for _ in range(30):
+        entries = [(rng.choice(["PERSON", "ADDRESS"]), random_text(rng, rng.randint(1, 4)))
+                   for _ in range(rng.randint(1, 40))]
+        gazetteer = Gazetteer(entries, min_tokens=2)
+        for _ in range(40):
+            line = random_text(rng, rng.randint(0, 12))
+            for categories in (["PERSON", "ADDRESS"], ["PERSON"], ["ADDRESS"]):
+                assert sorted(gazetteer.find_all(line, categories)) == \
+                    sorted(brute_force(entries, line, categories)), (entries, line)
+
+
+def test_word_boundaries_case_and_punctuation():
+    gazetteer = Gazetteer([("PERSON", "Tan Ah Kow"), ("PERSON", "Ah Kow")])
+    assert gazetteer.find_all("Seen: TAN,  ah-kow today", ["PERSON"]) == [("PERSON", 6, 18)]
+    # "Ah Kow" inside "Tanah Kow" is not on word boundaries
+    assert gazetteer.find_all("Tanah Kow", ["PERSON"]) == []
+    assert gazetteer.find_all("Tanah Kowloon", ["PERSON"]) == []
+    assert gazetteer.find_all("Stan Ah Kows", ["PERSON"]) == []
+
+
+def test_short_and_blocked_entries_are_skipped():
+    gazetteer = Gazetteer([("PERSON", "Lee"), ("PERSON", "Hope Street"), ("PERSON", "Mei Ling")],
+                          blocked=["hope street"])
+    assert len(gazetteer) == 1
+    assert gazetteer.find_all("Lee at Hope Street with Mei Ling", ["PERSON"]) == [("PERSON", 24, 32)]
+    assert gazetteer.is_blocked("HOPE  street")
+
+
+def test_csr_layout():
+    rng = random.Random(2)
+    entries = [("PERSON", random_text(rng, rng.randint(2, 5))) for _ in range(200)]
+    gazetteer = Gazetteer(entries)
+    assert len(gazetteer.offsets) == gazetteer.states + 1
+    assert gazetteer.offsets[-1] == len(gazetteer.edge_words) == gazetteer.states - 1
+    for state in range(gazetteer.states):
+        run = gazetteer.edge_words[gazetteer.offsets[state]:gazetteer.offsets[state + 1]]
+        assert list(run) == sorted(set(run))  # sorted, no duplicate words per state
+    # Every entry is a path from the root ending in a state that outputs it
+    for _, text in entries:
+        state = 0
+        for word in normalize(text):
+            state = gazetteer._next(state, gazetteer.vocab[word])
+            assert state
+        assert gazetteer.out_len[state] == len(normalize(text))
+        assert gazetteer.out_labels[state] & LABEL_BITS["PERSON"]
+
+
+def test_save_load_round_trip(tmp_path):
+    gazetteer = Gazetteer([("PERSON", "Tan Ah Kow"), ("ADDRESS", "12 Harmony Road")], blocked=["x y"])
+    path = str(tmp_path / "g.pkl")
+    gazetteer.save(path)
+    loaded = Gazetteer.load(path)
+    line = "Tan Ah Kow lives at 12 Harmony Road"
+    assert loaded.find_all(line, ["PERSON", "ADDRESS"]) == gazetteer.find_all(line, ["PERSON", "ADDRESS"])
+    assert loaded.signature == gazetteer.signature and loaded.is_blocked("X Y")
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable] + args, cwd=BACKEND, capture_output=True, text=True,
+                          env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), **env))
+
+
+def test_precompiled_by_the_script_loads_in_another_process(tmp_path):
+    names = tmp_path / "names.txt"
+    names.write_text("Tan Ah Kow\nMei Ling Lee\n")
+    compiled = str(tmp_path / "g.pkl")
+    env = {"REDACT_GAZETTEER_PERSON": str(names), "REDACT_GAZETTEER_COMPILED": compiled}
+    built = run_python(["gazetteer.py", "--out", compiled], env)
+    assert built.returncode == 0, built.stderr
+
+    check = "from gazetteer import GAZETTEER; print(GAZETTEER.find_all('Dr Mei Ling Lee', ['PERSON']))"
+    loaded = run_python(["-c", check], env)
+    assert loaded.returncode == 0, loaded.stderr
+    assert loaded.stdout.strip() == "[('PERSON', 3, 15)]"
+    assert "Loaded gazetteer" in loaded.stderr
+
+
+def test_unreadable_pickle_is_rebuilt(tmp_path):
+    names = tmp_path / "names.txt"
+    names.write_text("Tan Ah Kow\n")
+    compiled = tmp_path / "g.pkl"
+    compiled.write_bytes(b"not a pickle")
+    env = {"REDACT_GAZETTEER_PERSON": str(names), "REDACT_GAZETTEER_COMPILED": str(compiled)}
+    check = "from gazetteer import GAZETTEER; print(len(GAZETTEER))"
+    result = run_python(["-c", check], env)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "1"
+    assert "Can't load" in result.stderr
+    assert Gazetteer.load(str(compiled)) is not None  # saved again
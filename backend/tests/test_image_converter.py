@@ -0,0 +1,45 @@
+import fitz  # PyMuPDF
+
+from image_converter import extract_text_layer_lines
+
+WORDS = " ".join(f"word{i}" for i in range(80))
+
+
+def text_page(image_rect=None):
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_textbox(fitz.Rect(50, 50, 545, 400), WORDS, fontsize=11)
+    if image_rect is not None:
+        pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 40), False)
+        pix.set_rect(pix.irect, (200, 200, 200))
+        page.insert_image(fitz.Rect(*image_rect), pixmap=pix)
+    return doc, page
+
+
+def test_text_page_uses_text_layer():
+    doc, page = text_page()
+    lines, word_boxes = extract_text_layer_lines(page)
+    assert " ".join(text for (_, text, _) in lines) == WORDS
+    assert len(word_boxes) == len(lines)
+    doc.close()
+
+
+def test_text_page_with_large_image_falls_back_to_ocr():
+    # 80 words of text plus a pasted photo: the photo is not in the
+    # text layer, so the page must be OCR'd.
+    doc, page = text_page((100, 450, 400, 650))
+    assert extract_text_layer_lines(page) is None
+    doc.close()
+
+
+def test_small_image_is_ignored():
+    doc, page = text_page((500, 780, 530, 810))
+    assert extract_text_layer_lines(page) is not None
+    doc.close()
+
+
+def test_rotated_page_falls_back_to_ocr():
+    doc, page = text_page()
+    page.set_rotation(90)
+    assert extract_text_layer_lines(page) is None
+    doc.close()
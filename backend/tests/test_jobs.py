@@ -0,0 +1,30 @@
+import time
+
+from jobs import JobManager
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_expired_results_are_swept_without_new_requests():
+    manager = JobManager(workers=1, queue_size=4, result_ttl=0.1, sweep_seconds=0.05)
+    job = manager.submit(lambda progress: (b"redacted", "image/png", "a.png"), "a.png")
+    assert job.done_event.wait(5) and job.status == "done"
+    # Nobody submits or polls: the idle worker drops it all the same
+    assert wait_for(lambda: not manager._jobs)
+
+
+def test_results_are_kept_until_their_ttl():
+    manager = JobManager(workers=1, queue_size=4, result_ttl=3600, sweep_seconds=0.05)
+    job = manager.submit(lambda progress: (b"redacted", "image/png", "a.png"), "a.png")
+    assert job.done_event.wait(5)
+    time.sleep(0.2)
+    assert manager.get(job.id) is job
+    manager.discard(job.id)
+    assert manager.get(job.id) is None
@@ -0,0 +1,80 @@
+import random
+
+from engine import build_page_document, findings_to_coordinates, project_span
+
+
+def line(x0, y0, x1, y1, text):
+    return ([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, 0.9)
+
+
+# Two columns on the first row, one line on the second, listed out of order
+OCR_RESULTS = [
+    line(0, 50, 100, 70, "Tan Ah Kow"),
+    line(200, 10, 290, 30, "Smith"),
+    line(0, 12, 120, 28, "Patient John"),
+]
+
+
+def test_reading_order_and_offsets():
+    text, offset_map = build_page_document(OCR_RESULTS, [0, 1, 2])
+    assert text == "Patient John Smith\nTan Ah Kow"
+    assert offset_map == [(0, 12, 2), (13, 18, 1), (19, 29, 0)]
+
+
+def brute_force_pieces(offset_map, start, end):
+    """Char by char: which line (and where in it) each doc char belongs to."""
+    owner = {}
+    for (doc_start, doc_end, line_index) in offset_map:
+        for position in range(doc_start, doc_end):
+            owner[position] = (line_index, position - doc_start)
+    pieces = []
+    for position in range(start, end):
+        if position not in owner:
+            continue
+        line_index, offset = owner[position]
+        if pieces and pieces[-1][0] == line_index and pieces[-1][2] == offset:
+            pieces[-1] = (line_index, pieces[-1][1], offset + 1)
+        else:
+            pieces.append((line_index, offset, offset + 1))
+    return pieces
+
+
+def test_project_span_matches_brute_force():
+    rng = random.Random(5)
+    for _ in range(50):
+        texts = ["".join(rng.choice("ab ") for _ in range(rng.randint(1, 6))) for _ in range(5)]
+        results = [line(rng.choice([0, 100]), 20 * row, 90 + rng.choice([0, 100]), 20 * row + 15, text)
+                   for row, text in enumerate(texts)]
+        text, offset_map = build_page_document(results, list(range(len(results))))
+        for start in range(len(text) + 1):
+            for end in range(start, len(text) + 1):
+                assert project_span(offset_map, start, end) == brute_force_pieces(offset_map, start, end)
+
+
+def test_span_across_a_line_join_maps_to_both_boxes():
+    text, offset_map = build_page_document(OCR_RESULTS, [0, 1, 2])
+    # "John Smith" crosses the space between two lines of the same row
+    start = text.index("John Smith")
+    pieces = project_span(offset_map, start, start + len("John Smith"))
+    assert pieces == [(2, 8, 12), (1, 0, 5)]
+    # "Smith\nTan" crosses a row break
+    start = text.index("Smith")
+    assert project_span(offset_map, start, start + len("Smith\nTan")) == [(1, 0, 5), (0, 0, 3)]
+
+    findings_per_line = [[] for _ in OCR_RESULTS]
+    for (line_index, line_start, line_end) in project_span(offset_map, text.index("John"), text.index("\n")):
+        findings_per_line[line_index].append({"start_char": line_start, "end_char": line_end,
+                                              "label": "<PERSON>"})
+    boxes = sorted(findings_to_coordinates(OCR_RESULTS, findings_per_line), key=lambda e: e[0][0][0])
+    # "John" is the last 4 of 12 chars of a 120 px line; "Smith" fills its line
+    assert [coords[0] + coords[2] for (coords, _) in boxes] == [[80.0, 12, 120.0, 28], [200.0, 10, 290.0, 30]]
+    assert {label for (_, label) in boxes} == {"<PERSON>"}
+
+
+def test_span_on_separators_or_boundaries():
+    text, offset_map = build_page_document(OCR_RESULTS, [0, 1, 2])
+    assert project_span(offset_map, 12, 13) == []  # just the space
+    assert project_span(offset_map, 12, 14) == [(1, 0, 1)]
+    assert project_span(offset_map, 0, 0) == []
+    assert project_span(offset_map, 17, 18) == [(1, 4, 5)]  # last char of a line
+    assert project_span(offset_map, 28, 40) == [(0, 9, 10)]  # past the end
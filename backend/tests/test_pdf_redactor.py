@@ -0,0 +1,84 @@
+import fitz  # PyMuPDF
+import pytest
+
+from pdf_redactor import add_redactions, apply_redactions, pixel_box_to_page_rect, verify_redactions
+
+DPI = 144
+
+
+def text_pdf(rotation=0):
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((72, 100), "Patient John Smith seen today", fontsize=12)
+    page.set_rotation(rotation)
+    return doc
+
+
+def word_rect(page, word):
+    """The word's rect in unrotated page coordinates."""
+    [rect] = page.search_for(word)
+    return rect
+
+
+def rendered_box(page, rect, dpi=DPI):
+    """The rect as a box in pixels of the page rendered at 'dpi'."""
+    box = (rect * page.rotation_matrix).normalize() * (dpi / 72.0)
+    return [[box.x0, box.y0], [box.x1, box.y0], [box.x1, box.y1], [box.x0, box.y1]]
+
+
+def redact(doc, rect):
+    page = doc.load_page(0)
+    add_redactions(page, [(rect, "<PERSON>")])
+    apply_redactions(page)
+    return doc.tobytes()
+
+
+@pytest.mark.parametrize("rotation", [0, 90, 180, 270])
+def test_pixel_box_maps_to_unrotated_rect(rotation):
+    doc = text_pdf(rotation)
+    page = doc.load_page(0)
+    expected = word_rect(page, "Smith")
+    box = rendered_box(page, expected)
+    # The box is where the word shows on the rendered (rotated) page
+    pix = page.get_pixmap(dpi=DPI, colorspace=fitz.csGRAY)
+    ink = [pix.pixel(x, y)[0]
+           for x in range(int(box[0][0]), int(box[2][0]))
+           for y in range(int(box[0][1]), int(box[2][1]))]
+    assert min(ink) < 128
+
+    rect = pixel_box_to_page_rect(page, box, DPI)
+    assert all(abs(a - b) < 0.01 for a, b in zip(rect, expected))
+    doc.close()
+
+
+def test_points_box_at_72_dpi_is_unchanged():
+    doc = text_pdf()
+    page = doc.load_page(0)
+    expected = word_rect(page, "Smith")
+    rect = pixel_box_to_page_rect(page, rendered_box(page, expected, dpi=72), 72)
+    assert all(abs(a - b) < 0.01 for a, b in zip(rect, expected))
+    doc.close()
+
+
+@pytest.mark.parametrize("rotation", [0, 90])
+def test_redacted_word_is_gone(rotation):
+    doc = text_pdf(rotation)
+    page = doc.load_page(0)
+    rect = pixel_box_to_page_rect(page, rendered_box(page, word_rect(page, "Smith")), DPI)
+    pdf_bytes = redact(doc, rect)
+    doc.close()
+
+    assert verify_redactions(pdf_bytes, {0: [rect]}, ["<PERSON>"]) == []
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as redacted:
+        text = redacted.load_page(0).get_text()
+    assert "Smith" not in text
+    assert "Patient" in text and "today" in text
+
+
+def test_verify_reports_text_left_in_a_box():
+    doc = text_pdf()
+    page = doc.load_page(0)
+    rect = word_rect(page, "Smith")
+    # Marked for redaction but never applied: the word is still there
+    assert verify_redactions(doc.tobytes(), {0: [rect]}, ["<PERSON>"]) == [(0, "Smith")]
+    doc.close()
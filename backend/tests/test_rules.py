@@ -0,0 +1,99 @@
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.regex_rules import ALL_LABELS, _random_line, legacy_find_all
+from rules import REDACTION_RULES, RULE_MATCHER, RuleMatcher, load_rules_file
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EDGE_LINES = [
+    "",
+    "NRIC S1234567D",                      # upper-case context word
+    "Final result S1234567D",              # "fin" only inside a word
+    "fin: s1234567d",                      # ignore_case pattern
+    "MCR123456 and MCR no 654321",         # substring context
+    "mcr 12345",                           # too short
+    "Med. Number 1234-5678-9012-345",      # context phrase with a dot
+    "Med.Number 1234-5678-9012-345",       # phrase boundary differs
+    "Patient ID: AB123456",
+    "Idris AB123456",                      # "id" only inside a word
+    "Email john.tan@example.com, no digits",
+    "DOB: 01/02/1980  Date of birth: March 3, 1980",
+    "Tel +65 (6123) 4567-89 or 8123 4567",
+    "Reference 123456 for FIN T7654321Z, MCR 123456",
+]
+
+
+def test_matcher_equals_legacy_loop_on_random_corpus():
+    rng = random.Random(7)
+    lines = [_random_line(rng, 0.5) for _ in range(3000)] + EDGE_LINES
+    selections = [ALL_LABELS, ["PHONE"], ["NRIC/FIN", "DATE"], ["MCR no.", "ID_NUMBER", "EMAIL"], []]
+    for line in lines:
+        for categories in selections:
+            assert RULE_MATCHER.find_all(line, categories) == legacy_find_all(line, categories), line
+
+
+def test_context_words():
+    assert RULE_MATCHER.find_all("Final S1234567D", ["NRIC/FIN"]) == []
+    assert RULE_MATCHER.find_all("nric: s1234567d", ["NRIC/FIN"]) == [("NRIC/FIN", 6, 15)]
+    assert RULE_MATCHER.find_all("MCR123456", ["MCR no."]) == []  # no \b before the digits
+    assert RULE_MATCHER.find_all("MCR: 123456", ["MCR no."]) == [("MCR no.", 5, 11)]
+    line = "Med. Number 1234-5678-9012-345"
+    assert RULE_MATCHER.find_all(line, ["ID_NUMBER"]) == [("ID_NUMBER", 12, 30)]
+    assert RULE_MATCHER.find_all("Med.Number 1234-5678-9012-345", ["ID_NUMBER"]) == []
+
+
+def test_requires_skips_rules_before_their_pattern_runs():
+    rules = [
+        {"label": "ANY", "pattern": r"x+", "requires": ["!"]},
+        {"label": "NUM", "pattern": r"\w+", "requires": "digit"},
+        {"label": "FREE", "pattern": r"x"}
+    ]
+    matcher = RuleMatcher(rules)
+    labels = ["ANY", "NUM", "FREE"]
+    assert matcher.active_rules("xx", labels) == [2]
+    assert matcher.active_rules("xx!", labels) == [0, 2]
+    assert matcher.active_rules("x1", labels) == [1, 2]
+    assert matcher.find_all("x1 x!", ["ANY", "NUM"]) == [("ANY", 0, 1), ("ANY", 3, 4),
+                                                         ("NUM", 0, 2), ("NUM", 3, 4)]
+
+
+def test_requires_never_drops_a_match():
+    # Every built-in pre-check must hold for every match of its rule
+    rng = random.Random(3)
+    for line in [_random_line(rng) for _ in range(2000)] + EDGE_LINES:
+        for rule in REDACTION_RULES:
+            requires = rule.get("requires")
+            pattern = re.compile(rule["pattern"], re.IGNORECASE if rule.get("ignore_case") else 0)
+            if pattern.search(line) and requires == "digit":
+                assert re.search(r"\d", line), (rule["label"], line)
+            elif pattern.search(line) and requires:
+                assert all(s in line for s in requires), (rule["label"], line)
+
+
+def test_rules_file_adds_rules(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([{"label": "PASSPORT", "pattern": r"\b[A-Z]\d{7}[A-Z]\b",
+                                 "ignore_case": True, "context": ["passport"]}]))
+    code = ("from rules import RULE_MATCHER; "
+            "print(RULE_MATCHER.find_all('Passport e1234567k, NRIC S1234567D', ['PASSPORT', 'NRIC/FIN']))")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path), REDACT_RULES_FILE=str(path))
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[('NRIC/FIN', 25, 34), ('PASSPORT', 9, 18), ('PASSPORT', 25, 34)]"
+
+
+def test_rules_file_is_checked(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([{"label": "NO_PATTERN"}]))
+    with pytest.raises(ValueError):
+        load_rules_file(str(path))
+    path.write_text(json.dumps([{"label": "BAD", "pattern": "("}]))
+    with pytest.raises(re.error):
+        load_rules_file(str(path))
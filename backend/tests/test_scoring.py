@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+
+from benchmarks.scoring import CategoryScores, covered_share, union_area
+
+TRUTH = ("PERSON", (0, 0, 100, 10))
+
+
+def test_duplicate_predictions_count_once():
+    scores = CategoryScores()
+    scores.add_page([TRUTH], [("PERSON", (0, 0, 50, 10))] * 2)
+    report = scores.report()["PERSON"]
+    assert report["recall"] == 0.0
+    assert report["precision"] == 1.0
+
+
+def test_overlapping_predictions_count_once():
+    assert covered_share(TRUTH[1], [(0, 0, 60, 10), (30, 0, 70, 10)]) == 0.7
+    assert covered_share(TRUTH[1], [(0, 0, 60, 10), (40, 0, 100, 10)]) == 1.0
+
+
+def test_prediction_outside_the_box_does_not_count():
+    assert covered_share(TRUTH[1], [(-50, -5, 10, 20), (200, 0, 300, 10)]) == 0.1
+
+
+def test_union_area_matches_a_pixel_mask():
+    rng = random.Random(0)
+    for _ in range(50):
+        boxes = []
+        for _ in range(rng.randint(0, 6)):
+            x0, y0 = rng.randint(0, 40), rng.randint(0, 40)
+            boxes.append((x0, y0, x0 + rng.randint(0, 20), y0 + rng.randint(0, 20)))
+        mask = np.zeros((60, 60), dtype=bool)
+        for (x0, y0, x1, y1) in boxes:
+            mask[y0:y1, x0:x1] = True
+        assert union_area(boxes) == mask.sum()
+
+
+def test_report_per_category_and_any_label():
+    scores = CategoryScores()
+    scores.add_page([TRUTH, ("PHONE", (0, 20, 40, 30))],
+                    [("PERSON", (0, 0, 100, 10)), ("NRIC", (0, 20, 40, 30))])
+    report = scores.report()
+    assert report["PERSON"]["recall"] == 1.0
+    assert report["PHONE"]["recall"] == 0.0 and report["PHONE"]["any_label_recall"] == 1.0
+    assert report["NRIC"]["precision"] == 0.0
+    assert report["_all"]["truth"] == 2 and report["_all"]["found"] == 1
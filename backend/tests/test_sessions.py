@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from image_converter import PageImage
+from sessions import ReviewError, Session, SessionStore
+from uploads import MemoryBudgetError
+
+
+def box(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def make_pages(count=2, height=40, width=30):
+    return [{"page": PageImage(np.zeros((height, width, 3), np.uint8), dpi=200, page_number=n),
+             "lines": [],
+             "entities": [(box(1, 1, 5, 5), "<PERSON>", 0.9), (box(6, 6, 9, 9), "<PHONE>", 0.8)]}
+            for n in range(count)]
+
+
+def labels(reviewed):
+    return [[label for (_, label) in entities] for (_, entities) in reviewed]
+
+
+def test_default_review_keeps_everything():
+    session = Session("a.pdf", ["PERSON", "PHONE"], make_pages())
+    assert labels(session.reviewed_pages()) == [["<PERSON>", "<PHONE>"]] * 2
+
+
+def test_accepted_rejected_and_added_are_merged():
+    session = Session("a.pdf", ["PERSON"], make_pages())
+    reviewed = session.reviewed_pages(
+        accepted=["p0-e0", "p0-e1", "p1-e1"], rejected=["p0-e1"],
+        added=[{"page": 1, "box": [2, 3, 12, 13], "label": "ADDRESS"},
+               {"page": 1, "box": [0, 0, 1, 1], "label": "<PERSON>"}])
+    assert labels(reviewed) == [["<PERSON>"], ["<PHONE>", "<ADDRESS>", "<PERSON>"]]
+    assert reviewed[1][1][1][0] == box(2.0, 3.0, 12.0, 13.0)
+    assert reviewed[0][0] is session.pages[0]["page"]
+
+
+def test_unknown_entity_id():
+    session = Session("a.pdf", ["PERSON"], make_pages())
+    with pytest.raises(ReviewError, match="p2-e0"):
+        session.reviewed_pages(rejected=["p2-e0"])
+    with pytest.raises(ReviewError, match="p0-e7"):
+        session.reviewed_pages(accepted=["p0-e7"])
+
+
+@pytest.mark.parametrize("added", [
+    {"page": 2, "box": [0, 0, 1, 1], "label": "PERSON"},
+    {"page": -1, "box": [0, 0, 1, 1], "label": "PERSON"},
+    {"page": "x", "box": [0, 0, 1, 1], "label": "PERSON"},
+    {"page": 0, "box": [0, 0, 1], "label": "PERSON"},
+    {"page": 0, "box": [5, 0, 1, 1], "label": "PERSON"},
+    {"page": 0, "box": [0, 0, "nan", 1], "label": "PERSON"},
+    {"page": 0, "box": [0, 0, 1, 1]},
+    {"page": 0, "box": [0, 0, 1, 1], "label": "SECRET"},
+    {"page": 0, "box": [0, 0, 1, 1], "label": "PERSON> <b>hi</b"},
+    {"page": 0, "box": [0, 0, 1, 1], "label": ["PERSON"]},
+])
+def test_bad_added_box(added):
+    session = Session("a.pdf", ["PERSON"], make_pages())
+    with pytest.raises(ReviewError):
+        session.reviewed_pages(added=[added])
+
+
+def test_store_evicts_least_recently_used_and_caps_size():
+    page_bytes = 40 * 30 * 3
+    store = SessionStore(ttl=60, max_bytes=page_bytes * 4)
+    first = store.create("a.pdf", [], make_pages())
+    second = store.create("b.pdf", [], make_pages())
+    assert store.get(first.id) is first  # "b" is now the oldest
+    store.create("c.pdf", [], make_pages())
+    assert store.get(second.id) is None and store.get(first.id) is first
+    with pytest.raises(MemoryBudgetError):
+        store.create("big.pdf", [], make_pages(count=5))
@@ -0,0 +1,90 @@
+import random
+
+from tiling import merge_tile_boxes, page_tiles
+
+
+def detect(tiles, truth, free=()):
+    """
+    Simulated detector: each tile sees the part of every box that
+    falls inside it, in tile coordinates (as CRAFT sees a cut line).
+    'free' boxes come back as 4-point polygons instead.
+    """
+    results = []
+    for tile in tiles:
+        horizontal, polygons = [], []
+        for rect in list(truth) + list(free):
+            x0, x1 = max(rect[0], tile.x0), min(rect[1], tile.x1)
+            y0, y1 = max(rect[2], tile.y0), min(rect[3], tile.y1)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            local = [x0 - tile.x0, x1 - tile.x0, y0 - tile.y0, y1 - tile.y0]
+            if rect in free:
+                polygons.append([[local[0], local[2]], [local[1], local[2]],
+                                 [local[1], local[3]], [local[0], local[3]]])
+            else:
+                horizontal.append(local)
+        results.append((tile, horizontal, polygons))
+    return results
+
+
+def merged(height, width, truth, free=(), size=600, overlap=200):
+    tiles = page_tiles(height, width, size, overlap)
+    horizontal, polygons = merge_tile_boxes(detect(tiles, truth, free))
+    return sorted(map(list, horizontal)), polygons
+
+
+def test_tiles_cover_the_page_with_owned_cores():
+    tiles = page_tiles(1000, 1000, 600, 200)
+    assert [(t.x0, t.x1, t.y0, t.y1) for t in tiles] == [
+        (0, 600, 0, 600), (400, 1000, 0, 600), (0, 600, 400, 1000), (400, 1000, 400, 1000)]
+    # Cores split each overlap in the middle and tile the page exactly
+    assert [t.core for t in tiles] == [(0, 0, 500, 500), (500, 0, 1000, 500),
+                                       (0, 500, 500, 1000), (500, 500, 1000, 1000)]
+    assert len(page_tiles(600, 600, 600, 200)) == 1
+    for height, width in [(16949, 1200), (4678, 3306), (2561, 2561), (9000, 100)]:
+        tiles = page_tiles(height, width, 2560, 160)
+        assert all(t.x1 - t.x0 <= 2560 and t.y1 - t.y0 <= 2560 for t in tiles)
+        assert sum((t.core[2] - t.core[0]) * (t.core[3] - t.core[1]) for t in tiles) == height * width
+
+
+def test_box_across_a_vertical_seam_is_one_box():
+    assert merged(1000, 1000, [[300, 700, 100, 120]])[0] == [[300, 700, 100, 120]]
+
+
+def test_box_across_a_horizontal_seam_is_one_box():
+    assert merged(1000, 1000, [[100, 150, 300, 700]])[0] == [[100, 150, 300, 700]]
+
+
+def test_box_across_a_corner_is_one_box():
+    assert merged(1000, 1000, [[300, 700, 300, 700]])[0] == [[300, 700, 300, 700]]
+
+
+def test_polygon_across_a_seam_is_one_box():
+    horizontal, polygons = merged(1000, 1000, [], free=[[300, 700, 100, 120]])
+    assert horizontal == [[300, 700, 100, 120]] and polygons == []
+
+
+def test_whole_box_in_the_overlap_is_kept_once():
+    assert merged(1000, 1000, [[450, 520, 100, 120]])[0] == [[450, 520, 100, 120]]
+
+
+def test_whole_box_wins_over_its_cut_piece():
+    # Whole in the left tile; the right tile (from x=400) only sees 400-560
+    assert merged(1000, 1000, [[380, 560, 100, 120]])[0] == [[380, 560, 100, 120]]
+    # Whole in the right tile; the left tile (to x=600) only sees 540-600
+    assert merged(1000, 1000, [[540, 620, 100, 120]])[0] == [[540, 620, 100, 120]]
+
+
+def test_every_line_comes_back_once_on_random_pages():
+    rng = random.Random(4)
+    for _ in range(40):
+        height, width = rng.choice([(3000, 1200), (1200, 5000), (3000, 3000)])
+        truth, y = [], 10
+        # One box per row, rows apart (lines of a page), anywhere across
+        while y + 40 < height:
+            x0 = rng.randrange(0, width - 50)
+            x1 = rng.randrange(x0 + 20, min(width, x0 + 2500))
+            line_height = rng.randint(12, 40)
+            truth.append([x0, x1, y, y + line_height])
+            y += line_height + rng.randint(8, 60)
+        assert merged(height, width, truth, size=1000, overlap=160)[0] == sorted(truth)
@@ -0,0 +1,107 @@
+import io
+import os
+import stat
+import subprocess
+import sys
+
+import pytest
+
+import uploads
+from uploads import (SPOOL_PREFIX, MemoryBudgetError, SpooledUpload, check_budget, discard_upload,
+                     pages_within_budget, receive_stream, spool_stream, wipe_file,
+                     wipe_orphaned_spool_files)
+
+
+def test_small_upload_stays_in_memory(tmp_path):
+    assert spool_stream(io.BytesIO(b"abc"), threshold=10, directory=str(tmp_path)) == b"abc"
+    assert os.listdir(tmp_path) == []
+
+
+def test_large_upload_is_spooled_privately(tmp_path):
+    data = os.urandom(3 * uploads.CHUNK_BYTES + 17)
+    upload = spool_stream(io.BytesIO(data), threshold=10, directory=str(tmp_path))
+    assert isinstance(upload, SpooledUpload) and upload.size == len(data)
+    name = os.path.basename(upload.path)
+    assert name.startswith(f"{SPOOL_PREFIX}{os.getpid()}-")
+    assert stat.S_IMODE(os.stat(upload.path).st_mode) == 0o600
+    assert upload.read() == data
+    discard_upload(upload)
+    assert os.listdir(tmp_path) == []
+
+
+def test_small_request_is_received_in_memory(tmp_path):
+    stream = receive_stream(100, threshold=100, directory=str(tmp_path))
+    assert isinstance(stream, io.BytesIO)
+    assert os.listdir(tmp_path) == []
+
+
+def test_received_file_is_taken_over_without_a_copy(tmp_path):
+    data = os.urandom(1000)
+    # Unknown request length (chunked): straight to the spool folder
+    stream = receive_stream(None, threshold=100, directory=str(tmp_path))
+    assert os.path.basename(stream.name).startswith(f"{SPOOL_PREFIX}{os.getpid()}-")
+    assert stat.S_IMODE(os.stat(stream.name).st_mode) == 0o600
+    stream.write(data)
+    stream.seek(0)
+
+    upload = spool_stream(stream, threshold=100)
+    assert isinstance(upload, SpooledUpload) and upload.size == len(data)
+    assert os.listdir(tmp_path) == [os.path.basename(upload.path)]
+    # The request's clean-up wipes the name it handed out: a no-op now
+    stream.close()
+    wipe_file(stream.name)
+    assert upload.read() == data
+    discard_upload(upload)
+    assert os.listdir(tmp_path) == []
+
+
+def test_small_received_file_is_read_and_left_to_the_request(tmp_path):
+    stream = receive_stream(None, threshold=100, directory=str(tmp_path))
+    stream.write(b"abc")
+    stream.seek(0)
+    assert spool_stream(stream, threshold=100) == b"abc"
+    stream.close()
+    wipe_file(stream.name)
+    assert os.listdir(tmp_path) == []
+
+
+def test_wipe_zeroes_and_syncs_before_unlinking(tmp_path, monkeypatch):
+    path = tmp_path / "phi.bin"
+    data = os.urandom(2 * uploads.CHUNK_BYTES + 5)
+    path.write_bytes(data)
+    seen_at_sync = []
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        real_fsync(fd)
+        seen_at_sync.append(path.read_bytes())
+
+    monkeypatch.setattr(uploads.os, "fsync", fsync)
+    wipe_file(str(path))
+    assert seen_at_sync == [bytes(len(data))]
+    assert not path.exists()
+    wipe_file(str(path))  # already gone: no error
+
+
+def test_orphan_sweep_only_wipes_files_of_dead_processes(tmp_path):
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    orphan = tmp_path / f"{SPOOL_PREFIX}{finished.pid}-abc"
+    ours = tmp_path / f"{SPOOL_PREFIX}{os.getpid()}-def"
+    unrelated = tmp_path / "other-file"
+    no_pid = tmp_path / f"{SPOOL_PREFIX}x-ghi"
+    for path in (orphan, ours, unrelated, no_pid):
+        path.write_bytes(b"PHI")
+    assert wipe_orphaned_spool_files(str(tmp_path)) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([ours.name, unrelated.name, no_pid.name])
+
+
+def test_budget():
+    check_budget(100, "x", budget=100)
+    check_budget(10 ** 12, "x", budget=0)  # 0 turns the check off
+    with pytest.raises(MemoryBudgetError, match="The upload needs"):
+        check_budget(101, "the upload", budget=100)
+    assert pages_within_budget(30, resident=10, budget=100) == 3
+    assert pages_within_budget(30, budget=0) is None
+    with pytest.raises(MemoryBudgetError):
+        pages_within_budget(95, resident=10, budget=100)
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+import workers
+from workers import WorkerPool
+
+
+def fake_worker_main(conn, threads):
+    """Stands in for _worker_main: ready at once, echoes the file name."""
+    conn.send(("ready", 0.0))
+    while True:
+        try:
+            options = conn.recv()
+        except EOFError:
+            return
+        conn.send(("done", options["filename"], None, {}))
+
+
+def failing_worker_main(conn, threads):
+    conn.send(("failed", "RuntimeError: no model"))
+
+
+def make_pool(monkeypatch, target, count):
+    monkeypatch.setattr(workers, "_worker_main", target)
+    pool = WorkerPool(workers=count, threads_per_worker=1, dispatch_timeout=2)
+    for index in range(count):
+        pool._handles.append(pool._spawn(index))
+    for handle in list(pool._handles):
+        pool._wait_ready(handle)
+    return pool
+
+
+def run_with_timeout(call, seconds=10):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = call()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "dispatch hung"
+    return outcome
+
+
+def test_worker_dead_while_idle_is_skipped(monkeypatch):
+    pool = make_pool(monkeypatch, fake_worker_main, 2)
+    first = pool._idle.queue[0]
+    first.process.kill()
+    first.process.join()
+    assert pool.redact(b"", "a.txt", []) == "a.txt"
+    assert pool.redact(b"", "b.txt", [], block=True) == "b.txt"
+    assert first.state in ("restarting", "dead")
+
+
+def test_no_ready_worker_raises_instead_of_blocking(monkeypatch):
+    pool = make_pool(monkeypatch, failing_worker_main, 2)
+    assert not pool.ready()
+    outcome = run_with_timeout(lambda: pool.redact(b"", "a.txt", [], block=True))
+    assert "failed to start" in str(outcome["error"])
+
+
+def test_replacement_failing_warmup_raises(monkeypatch):
+    pool = make_pool(monkeypatch, fake_worker_main, 1)
+    handle = pool._idle.queue[0]
+    monkeypatch.setattr(workers, "_worker_main", failing_worker_main)
+    handle.process.kill()
+    handle.process.join()
+    outcome = run_with_timeout(lambda: pool.redact(b"", "a.txt", [], block=True))
+    assert "failed to start" in str(outcome["error"])
+    assert [h.state for h in pool._handles] == ["failed"]
+
+
+def test_busy_pool_raises_queue_full(monkeypatch):
+    pool = make_pool(monkeypatch, fake_worker_main, 1)
+    pool.dispatch_timeout = 0.2
+    pool._idle.get()  # the only worker is busy
+    with pytest.raises(workers.QueueFullError):
+        pool.redact(b"", "a.txt", [])
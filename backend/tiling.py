@@ -0,0 +1,175 @@
+# -----------------------------------------------------------------
+# tiling.py
+#
+# Overlapping tiles for OCR text detection on oversized pages
+# (tall rasterized DOCX/TXT, large-format or high-DPI scans).
+# - A page longer than OCR_TILE_PX on either side is cut into tiles
+#   of at most OCR_TILE_PX, overlapping by OCR_TILE_OVERLAP_PX. The
+#   overlap must be taller than a text line, so every line is whole
+#   in at least one tile. CRAFT then runs per tile (engine.py, in
+#   OCR_TILE_WORKERS threads), so its memory follows the tile size,
+#   and EasyOCR no longer shrinks a giant page to its 2560 px canvas.
+# - Boxes are moved back to page coordinates. Each tile owns the
+#   part of the page up to the middle of its overlaps (its "core"):
+#   a whole box is kept only by the tile that owns its centre, so
+#   lines in an overlap are not read twice.
+# - A box touching an inner tile edge was cut by the seam. It is
+#   dropped if a whole copy from another tile covers it. Otherwise,
+#   e.g. a long line cut by a vertical seam, the pieces from both
+#   sides are merged into one box.
+# - Recognition still crops the boxes from the whole page, so a
+#   merged line is read in one piece.
+# -----------------------------------------------------------------
+
+import math
+import os
+
+OCR_TILE_PX = int(os.environ.get("REDACT_OCR_TILE_PX", 2560))
+OCR_TILE_OVERLAP_PX = int(os.environ.get("REDACT_OCR_TILE_OVERLAP_PX", 160))
+OCR_TILE_WORKERS = int(os.environ.get("REDACT_OCR_TILE_WORKERS", min(4, os.cpu_count() or 1)))
+
+# A box this close to an inner tile edge counts as cut by the seam
+SEAM_EDGE_PX = 4
+# A cut piece is dropped when a whole box covers this share of it
+SEAM_COVERED_SHARE = 0.8
+
+
+class Tile:
+    """One tile: its pixels (x0, y0, x1, y1) and the core it owns."""
+
+    def __init__(self, x0, y0, x1, y1, core, inner_edges):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.core = core  # (x0, y0, x1, y1)
+        # (left, top, right, bottom): True where a neighbour tile is
+        self.inner_edges = inner_edges
+
+    def __repr__(self):
+        return f"Tile({self.x0}, {self.y0}, {self.x1}, {self.y1})"
+
+    def is_cut(self, rect):
+        """rect (x_min, x_max, y_min, y_max) touches one of the tile's inner edges."""
+        left, top, right, bottom = self.inner_edges
+        x_min, x_max, y_min, y_max = rect
+        return ((left and x_min <= self.x0 + SEAM_EDGE_PX) or
+                (right and x_max >= self.x1 - SEAM_EDGE_PX) or
+                (top and y_min <= self.y0 + SEAM_EDGE_PX) or
+                (bottom and y_max >= self.y1 - SEAM_EDGE_PX))
+
+    def owns(self, rect):
+        x_min, x_max, y_min, y_max = rect
+        center_x, center_y = (x_min + x_max) / 2, (y_min + y_max) / 2
+        core_x0, core_y0, core_x1, core_y1 = self.core
+        return core_x0 <= center_x < core_x1 and core_y0 <= center_y < core_y1
+
+
+# --- 1. CUTTING A PAGE ---
+
+def _spans(length, size, overlap):
+    """[(start, end), ...] covering 0..length, each at most 'size' long."""
+    if length <= size:
+        return [(0, length)]
+    count = math.ceil((length - overlap) / (size - overlap))
+    tile_length = math.ceil((length + (count - 1) * overlap) / count)
+    spans = [(i * (tile_length - overlap), i * (tile_length - overlap) + tile_length) for i in range(count)]
+    spans[-1] = (length - tile_length, length)
+    return spans
+
+
+def _cores(spans, length):
+    """Owned part of each span: up to the middle of its overlaps."""
+    cores = []
+    for i, (start, end) in enumerate(spans):
+        core_start = 0 if i == 0 else (spans[i - 1][1] + start) // 2
+        core_end = length if i == len(spans) - 1 else (end + spans[i + 1][0]) // 2
+        cores.append((core_start, core_end))
+    return cores
+
+
+def page_tiles(height, width, size=None, overlap=None):
+    """The tiles of a height x width page (one tile if it is small enough)."""
+    size = OCR_TILE_PX if size is None else size
+    overlap = OCR_TILE_OVERLAP_PX if overlap is None else overlap
+    rows, columns = _spans(height, size, overlap), _spans(width, size, overlap)
+    row_cores, column_cores = _cores(rows, height), _cores(columns, width)
+    tiles = []
+    for (y0, y1), (core_y0, core_y1) in zip(rows, row_cores):
+        for (x0, x1), (core_x0, core_x1) in zip(columns, column_cores):
+            tiles.append(Tile(x0, y0, x1, y1, (core_x0, core_y0, core_x1, core_y1),
+                              (x0 > 0, y0 > 0, x1 < width, y1 < height)))
+    return tiles
+
+
+# --- 2. PUTTING THE BOXES BACK TOGETHER ---
+
+def _rect_of_polygon(points):
+    xs, ys = [x for (x, _) in points], [y for (_, y) in points]
+    return [min(xs), max(xs), min(ys), max(ys)]
+
+
+def _covered_share(rect, other):
+    x_min, x_max, y_min, y_max = rect
+    width = max(0, min(x_max, other[1]) - max(x_min, other[0]))
+    height = max(0, min(y_max, other[3]) - max(y_min, other[2]))
+    area = (x_max - x_min) * (y_max - y_min)
+    return width * height / area if area > 0 else 1.0
+
+
+def _overlaps(a, b):
+    return a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]
+
+
+def _same_line(a, b):
+    """Pieces that overlap, and by at least half the height of the shorter one."""
+    shared_height = min(a[3], b[3]) - max(a[2], b[2])
+    return (_overlaps(a, b) and
+            shared_height >= min(a[3] - a[2], b[3] - b[2]) / 2)
+
+
+def _merge_pieces(pieces):
+    """Unions of the cut pieces of each line (chains included)."""
+    merged = []
+    for piece in pieces:
+        piece = list(piece)
+        changed = True
+        while changed:
+            changed = False
+            for other in merged:
+                if _same_line(piece, other):
+                    merged.remove(other)
+                    piece = [min(piece[0], other[0]), max(piece[1], other[1]),
+                             min(piece[2], other[2]), max(piece[3], other[3])]
+                    changed = True
+                    break
+        merged.append(piece)
+    return merged
+
+
+def merge_tile_boxes(tile_results):
+    """
+    tile_results: [(Tile, horizontal_list, free_list), ...] from
+    EasyOCR's detect() per tile, in tile coordinates. Returns one
+    (horizontal_list, free_list) for the page, in page coordinates.
+    horizontal boxes are [x_min, x_max, y_min, y_max], free ones
+    4 points.
+    """
+    horizontal, free, pieces = [], [], []
+    for tile, tile_horizontal, tile_free in tile_results:
+        for (x_min, x_max, y_min, y_max) in tile_horizontal:
+            rect = [x_min + tile.x0, x_max + tile.x0, y_min + tile.y0, y_max + tile.y0]
+            if tile.is_cut(rect):
+                pieces.append(rect)
+            elif tile.owns(rect):
+                horizontal.append(rect)
+        for points in tile_free:
+            points = [[x + tile.x0, y + tile.y0] for (x, y) in points]
+            rect = _rect_of_polygon(points)
+            if tile.is_cut(rect):
+                pieces.append(rect)
+            elif tile.owns(rect):
+                free.append(points)
+
+    whole = horizontal + [_rect_of_polygon(points) for points in free]
+    pieces = [piece for piece in pieces
+              if not any(_covered_share(piece, rect) >= SEAM_COVERED_SHARE for rect in whole
+                         if _overlaps(piece, rect))]
+    return horizontal + _merge_pieces(pieces), free
@@ -0,0 +1,217 @@
+# -----------------------------------------------------------------
+# uploads.py
+#
+# Large uploads are kept on disk, and each request has a memory budget.
+# - An upload of up to SPOOL_THRESHOLD bytes stays in memory as
+#   bytes. A larger one is copied in chunks to a private file in
+#   SPOOL_DIR and passed on as a SpooledUpload (a path). PyMuPDF
+#   then reads the pages from disk as it needs them. Prefork
+#   workers get the path over their pipe, not the whole file.
+# - The API receives a large request body straight into a file in
+#   SPOOL_DIR (receive_stream), not into Werkzeug's own temp file,
+#   and spool_stream() then takes that file over without a copy.
+# - Spooled files hold PHI. wipe() overwrites them with zeros
+#   before unlinking. The API wipes each one when its request or
+#   job ends, and wipes files left by a crashed server at start-up.
+#   Point REDACT_SPOOL_DIR at an encrypted or tmpfs volume.
+# - MEMORY_BUDGET caps what one request may hold in memory: the
+#   upload if it was not spooled, plus the rendered pages in
+#   flight. The pipeline renders fewer pages at once to stay under
+#   it. If even one page doesn't fit, it raises MemoryBudgetError,
+#   and the API answers 413.
+# -----------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+SPOOL_THRESHOLD = int(os.environ.get("REDACT_SPOOL_THRESHOLD_MB", 16)) * 1024 * 1024
+SPOOL_DIR = os.environ.get("REDACT_SPOOL_DIR") or tempfile.gettempdir()
+SPOOL_PREFIX = "redact-upload-"
+# Per request; 0 turns the check off
+MEMORY_BUDGET = int(os.environ.get("REDACT_MEMORY_BUDGET_MB", 1024)) * 1024 * 1024
+
+# A page in flight is held about 3 times: the RGB render, its
+# preprocessed copy for OCR and the redacted copy being encoded
+PAGE_COPIES = 3
+CHUNK_BYTES = 1024 * 1024
+
+
+class MemoryBudgetError(Exception):
+    """The request would need more memory than MEMORY_BUDGET."""
+
+
+# --- 1. SPOOLING ---
+
+class SpooledUpload:
+    """An upload saved to disk; pass it wherever file bytes are accepted."""
+
+    def __init__(self, path, size=None):
+        self.path = path
+        self.size = os.path.getsize(path) if size is None else size
+
+    def read(self):
+        """The whole file as bytes (checked against the budget)."""
+        check_budget(self.size, "reading the upload into memory")
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def wipe(self):
+        wipe_file(self.path)
+
+    def __repr__(self):
+        return f"SpooledUpload({self.path!r}, {self.size} bytes)"
+
+
+def _new_spool_file(directory=None):
+    """(fd, path) of a new private file for an upload."""
+    # The PID in the name tells start-up which leftovers are orphans
+    return tempfile.mkstemp(prefix=f"{SPOOL_PREFIX}{os.getpid()}-", dir=directory or SPOOL_DIR)
+
+
+def _is_spool_file(stream):
+    name = getattr(stream, "name", None)
+    return isinstance(name, str) and os.path.basename(name).startswith(SPOOL_PREFIX)
+
+
+def receive_stream(total_content_length, threshold=None, directory=None):
+    """
+    Where an upload is written while the request body is parsed
+    (a Werkzeug stream factory). The whole request in memory if it
+    is small, else a file in SPOOL_DIR: the caller must wipe_file()
+    its .name once the request is over.
+    """
+    threshold = SPOOL_THRESHOLD if threshold is None else threshold
+    if total_content_length is not None and total_content_length <= threshold:
+        return BytesIO()
+    fd, path = _new_spool_file(directory)
+    os.close(fd)
+    return open(path, "w+b")
+
+
+def spool_stream(stream, size=None, threshold=None, directory=None):
+    """
+    Reads an upload stream (e.g. a Flask FileStorage's .stream).
+    Returns bytes if it is small, else a SpooledUpload.
+    """
+    threshold = SPOOL_THRESHOLD if threshold is None else threshold
+    if size is None:
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+    if size <= threshold:
+        return stream.read()
+
+    if _is_spool_file(stream):
+        # Already on disk (see receive_stream): take it over under a
+        # new name, so the request's own clean-up leaves it alone
+        stream.flush()
+        fd, path = _new_spool_file(os.path.dirname(stream.name))
+        os.close(fd)
+        os.replace(stream.name, path)
+        return SpooledUpload(path, size)
+
+    fd, path = _new_spool_file(directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(stream, f, CHUNK_BYTES)
+    except BaseException:
+        wipe_file(path)
+        raise
+    return SpooledUpload(path)
+
+
+def upload_size(source):
+    return source.size if isinstance(source, SpooledUpload) else len(source)
+
+
+def read_upload(source):
+    """bytes of an upload, whether it was spooled or not."""
+    return source.read() if isinstance(source, SpooledUpload) else source
+
+
+def resident_bytes(source):
+    """How much of the upload itself sits in this request's memory."""
+    return 0 if isinstance(source, SpooledUpload) else len(source)
+
+
+def discard_upload(source):
+    """Wipes a spooled upload once its request is over (no-op for bytes or None)."""
+    if isinstance(source, SpooledUpload):
+        source.wipe()
+
+
+def wipe_file(path):
+    """Overwrites a file with zeros, syncs it, then deletes it."""
+    try:
+        with open(path, "r+b") as f:
+            remaining = os.fstat(f.fileno()).st_size
+            zeros = bytes(CHUNK_BYTES)
+            while remaining > 0:
+                remaining -= f.write(zeros[:min(remaining, CHUNK_BYTES)])
+            f.flush()
+            os.fsync(f.fileno())
+    except FileNotFoundError:
+        return
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def wipe_orphaned_spool_files(directory=None):
+    """
+    Wipes spooled uploads whose server process is gone (crash,
+    kill -9). Returns how many were wiped.
+    """
+    directory = directory or SPOOL_DIR
+    wiped = 0
+    for name in os.listdir(directory):
+        if not name.startswith(SPOOL_PREFIX):
+            continue
+        pid = name[len(SPOOL_PREFIX):].split("-", 1)[0]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            wipe_file(os.path.join(directory, name))
+            wiped += 1
+    return wiped
+
+
+# --- 2. MEMORY BUDGET ---
+
+def page_memory_bytes(width_px, height_px):
+    """Estimated peak bytes of one page in flight."""
+    return width_px * height_px * 3 * PAGE_COPIES
+
+
+def check_budget(needed, what, budget=None):
+    """Raises MemoryBudgetError if 'needed' bytes don't fit in the budget."""
+    budget = MEMORY_BUDGET if budget is None else budget
+    if budget > 0 and needed > budget:
+        raise MemoryBudgetError(
+            f"{what[0].upper()}{what[1:]} needs about {needed / 2 ** 20:.0f} MB, more than the "
+            f"{budget / 2 ** 20:.0f} MB allowed per request (REDACT_MEMORY_BUDGET_MB).")
+
+
+def pages_within_budget(page_bytes, resident=0, budget=None):
+    """
+    How many pages of 'page_bytes' fit next to 'resident' bytes
+    (None if there is no budget). Raises MemoryBudgetError if not
+    even one does.
+    """
+    budget = MEMORY_BUDGET if budget is None else budget
+    if budget <= 0 or page_bytes <= 0:
+        return None
+    check_budget(resident + page_bytes, "the largest page", budget)
+    return max(1, (budget - resident) // page_bytes)
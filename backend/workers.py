@@ -0,0 +1,312 @@
+# -----------------------------------------------------------------
+# workers.py
+#
+# Pre-forked pipeline workers ("prefork" serving mode).
+# - The parent process loads the models once (models.py), then
+#   forks N worker processes. The model weights are shared
+#   copy-on-write, so each extra worker mostly costs its own
+#   activations and buffers, not another copy of the models.
+# - Each worker caps torch's intra-op threads so N workers don't
+#   oversubscribe the cores, then warms up on its own (torch's
+#   OpenMP pool is not safe to use across fork, so the parent
+#   never runs inference).
+# - WorkerPool.redact() takes the same arguments as
+#   pipeline.redact_file() and runs it on an idle worker. With
+#   no idle worker it waits up to DISPATCH_TIMEOUT seconds, then
+#   raises QueueFullError (back-pressure, the API answers 429).
+#   Job threads (jobs.py) pass block=True: their queue is already
+#   bounded. WorkerPool.detect() does the same for
+#   pipeline.detect_file() (phase 1 of a review).
+# - A worker that dies is replaced by a new fork. A worker found
+#   dead when a request is handed out is skipped (the request goes
+#   to another one); with no worker left that can serve, requests
+#   fail at once instead of waiting.
+# - spaCy's n_process is forced to 1 inside the workers: the workers
+#   are the parallelism, and daemonic processes can't have children.
+# - A spooled upload (uploads.py) reaches the worker as its path,
+#   not as bytes over the pipe.
+# - Workers run each request under its request ID and send the
+#   metrics it recorded back with the result (telemetry.py).
+# -----------------------------------------------------------------
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from jobs import QueueFullError
+from models import MODELS
+from telemetry import METRICS, current_request_id, get_logger, request_context
+from uploads import MemoryBudgetError
+
+log = get_logger("workers")
+
+# "threads": one process, the job threads share the models (default)
+# "prefork": models loaded once, N forked worker processes
+SERVING_MODE = os.environ.get("REDACT_SERVING", "threads")
+PREFORK_WORKERS = int(os.environ.get("REDACT_PREFORK_WORKERS", os.cpu_count() or 1))
+# torch intra-op threads per worker (default: cores / workers)
+WORKER_THREADS = int(os.environ.get("REDACT_WORKER_THREADS", 0))
+DISPATCH_TIMEOUT = float(os.environ.get("REDACT_DISPATCH_TIMEOUT", 30))
+
+
+# --- 1. INSIDE A WORKER ---
+
+def _set_thread_limits(threads):
+    """Caps torch (and OpenCV) threads in this process."""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+
+def _worker_main(conn, threads):
+    """
+    Loop of one forked worker: receives redact_file() keyword
+    arguments (or detect_file()'s, with task="detect"), sends back
+    ("progress", args), then ("done", result, stats, metrics) or
+    ("error", message, metrics).
+    """
+    _set_thread_limits(threads)
+
+    import engine
+    import pipeline
+
+    # Parallelism comes from the workers; no page pool or spaCy
+    # processes inside them (a daemonic worker can't start children)
+    pipeline.PIPELINE_WORKERS = 1
+    if engine.NER_N_PROCESS != 1:
+        log.warning(f"REDACT_NER_N_PROCESS={engine.NER_N_PROCESS} is ignored in prefork workers.")
+        engine.NER_N_PROCESS = 1
+
+    start = time.perf_counter()
+    try:
+        engine.warmup_models()
+        conn.send(("ready", round(time.perf_counter() - start, 3)))
+    except Exception as e:
+        log.exception("Worker warmup failed.")
+        conn.send(("failed", f"{type(e).__name__}: {e}"))
+        return
+
+    while True:
+        try:
+            options = conn.recv()
+        except EOFError:
+            return
+        # Only requests count, not the parent's values or the warmup
+        METRICS.reset()
+        request_id = options.pop("request_id", None)
+        task = pipeline.detect_file if options.pop("task", None) == "detect" else pipeline.redact_file
+        want_stats = options.pop("stats", None) is not None
+        stats = {} if want_stats else None
+        with request_context(request_id):
+            try:
+                result = task(
+                    progress=lambda *args: conn.send(("progress", args)),
+                    stats=stats,
+                    **options
+                )
+                message = ("done", result, stats)
+            except MemoryBudgetError as e:
+                # Sent as is, so the API can answer 413
+                log.warning(str(e))
+                message = ("error", e)
+            except Exception as e:
+                log.exception("Redaction failed in worker.")
+                message = ("error", str(e))
+        conn.send(message + (METRICS.drain(),))
+
+
+# --- 2. IN THE PARENT ---
+
+class WorkerHandle:
+    """The parent's view of one worker process."""
+
+    def __init__(self, index, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        # starting -> ready / failed; a dead one is "restarting" until
+        # its replacement is forked, then "dead"
+        self.state = "starting"
+        self.warmup_seconds = None
+        self.error = None
+        self.jobs_done = 0
+
+    def to_dict(self):
+        return {
+            "pid": self.process.pid,
+            "state": self.state,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+            "jobs_done": self.jobs_done
+        }
+
+
+class WorkerPool:
+    """N forked workers, handed out one request at a time."""
+
+    def __init__(self, workers=PREFORK_WORKERS, threads_per_worker=WORKER_THREADS,
+                 dispatch_timeout=DISPATCH_TIMEOUT):
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.dispatch_timeout = dispatch_timeout
+        self._context = multiprocessing.get_context("fork")
+        self._handles = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = None
+
+    def start(self):
+        """Loads the models in this process, then forks the workers."""
+        MODELS.load_required()
+        if not MODELS.required_ready():
+            log.error("Required models failed to load; not starting workers.")
+            return
+        for index in range(self.workers):
+            self._handles.append(self._spawn(index))
+        for handle in list(self._handles):
+            self._wait_ready(handle)
+
+    def start_background(self):
+        """start() in a thread, so the API can answer health checks meanwhile."""
+        with self._lock:
+            if self._started is None:
+                self._started = threading.Thread(target=self.start, name="worker-pool-start",
+                                                 daemon=True)
+                self._started.start()
+
+    def _spawn(self, index):
+        parent_conn, child_conn = self._context.Pipe()
+        # Daemon: exits with the server (workers never fork children:
+        # PIPELINE_WORKERS and NER_N_PROCESS are 1 inside them)
+        process = self._context.Process(target=_worker_main, args=(child_conn, self.threads_per_worker),
+                                        name=f"redact-worker-{index}", daemon=True)
+        process.start()
+        child_conn.close()
+        log.info(f"Forked worker {index} (pid {process.pid}, "
+                 f"{self.threads_per_worker} threads).")
+        return WorkerHandle(index, process, parent_conn)
+
+    def _wait_ready(self, handle):
+        try:
+            message = handle.conn.recv()
+        except EOFError:
+            message = ("failed", "Worker exited during warmup.")
+        if message[0] == "ready":
+            handle.state = "ready"
+            handle.warmup_seconds = message[1]
+            self._idle.put(handle)
+        else:
+            handle.state = "failed"
+            handle.error = message[1]
+            log.error(f"Worker {handle.index} failed to start: {handle.error}")
+
+    def _replace(self, handle):
+        """Forks a new worker in place of one that died."""
+        handle.process.join(timeout=1)
+        new_handle = self._spawn(handle.index)
+        with self._lock:
+            self._handles[handle.index] = new_handle
+        handle.state = "dead"
+        self._wait_ready(new_handle)
+
+    def _restart(self, handle):
+        handle.state = "restarting"
+        threading.Thread(target=self._replace, args=(handle,), daemon=True).start()
+
+    def _can_serve(self):
+        """False once no worker is ready or on its way (all failed to start)."""
+        if any(handle.state in ("ready", "starting", "restarting") for handle in self._handles):
+            return True
+        # Still loading the models before the first fork
+        return self._started is not None and self._started.is_alive()
+
+    def _take_idle(self, block):
+        """
+        An idle, live worker. Dead ones are replaced and skipped.
+        Raises QueueFullError after dispatch_timeout seconds (never,
+        with block=True), or at once if no worker can serve.
+        """
+        deadline = None if block else time.monotonic() + self.dispatch_timeout
+        while True:
+            if not self._can_serve():
+                raise Exception("No redaction worker is running (they failed to start).")
+            wait = 1.0 if deadline is None else min(1.0, deadline - time.monotonic())
+            if wait <= 0:
+                raise QueueFullError("All redaction workers are busy, please retry later.")
+            try:
+                handle = self._idle.get(timeout=wait)
+            except queue.Empty:
+                continue
+            if handle.process.is_alive():
+                return handle
+            log.error(f"Worker {handle.index} died while idle, replacing it.")
+            self._restart(handle)
+
+    def redact(self, file_bytes, filename, categories_to_find, progress=None, stats=None,
+               block=False, **options):
+        """
+        Same arguments and result as pipeline.redact_file(), run on
+        an idle worker. Raises QueueFullError if none frees up within
+        dispatch_timeout seconds (block=True waits as long as needed,
+        for callers that already queue, like the job workers).
+        """
+        return self._run(None, file_bytes, filename, categories_to_find, progress, stats,
+                         block, options)
+
+    def detect(self, file_bytes, filename, categories_to_find, progress=None, stats=None,
+               block=False, **options):
+        """pipeline.detect_file() on an idle worker (see redact())."""
+        return self._run("detect", file_bytes, filename, categories_to_find, progress, stats,
+                         block, options)
+
+    def _run(self, task, file_bytes, filename, categories_to_find, progress, stats, block,
+             options):
+        handle = self._take_idle(block)
+        options.update(file_bytes=file_bytes, filename=filename,
+                       categories_to_find=categories_to_find,
+                       stats={} if stats is not None else None,
+                       request_id=current_request_id(), task=task)
+        try:
+            handle.conn.send(options)
+            while True:
+                message = handle.conn.recv()
+                if message[0] == "progress":
+                    if progress is not None:
+                        progress(*message[1])
+                    continue
+                METRICS.merge(message[-1])
+                if message[0] == "error":
+                    error = message[1]
+                    raise error if isinstance(error, Exception) else Exception(error)
+                _, result, worker_stats, _ = message
+                if stats is not None and worker_stats:
+                    stats.update(worker_stats)
+                handle.jobs_done += 1
+                return result
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            log.error(f"Worker {handle.index} died, replacing it.")
+            self._restart(handle)
+            handle = None
+            raise Exception("Redaction worker crashed while processing this file.")
+        finally:
+            if handle is not None:
+                self._idle.put(handle)
+
+    def ready(self):
+        return any(handle.state == "ready" for handle in self._handles)
+
+    def health(self):
+        return {
+            "workers": [handle.to_dict() for handle in self._handles],
+            "idle": self._idle.qsize(),
+            "threads_per_worker": self.threads_per_worker
+        }
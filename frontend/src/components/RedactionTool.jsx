@@ -79,6 +79,7 @@ export default function RedactionTool() {
     const formData = new FormData();
     formData.append("file", file);
     formData.append("categories", JSON.stringify(mapped));
+    formData.append("all_pages", "true");
 
     try {
       const res = await fetch("http://127.0.0.1:5000/redact", {